@@ -0,0 +1,9 @@
+import os
+import tempfile
+
+# бенчмарки и стресс-тесты не пишут в logs/actions.log репозитория:
+# пакет импортируется раньше любого скрипта и настроек приложения
+os.environ.setdefault(
+    "VALUTATRADE_LOG_DIR",
+    tempfile.mkdtemp(prefix="vt-bench-logs-"),
+)
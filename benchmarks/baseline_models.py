@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+# Модели и преобразования до перехода на __slots__ и таблицу балансов —
+# точка отсчёта для bench_models. Только то, что нужно для сравнения.
+
+
+class BaselineUser:
+
+    def __init__(
+        self,
+        user_id: int,
+        username: str,
+        hashed_password: str,
+        salt: str,
+        registration_date: datetime,
+    ) -> None:
+        self._user_id = user_id
+        self.username = username
+        self._hashed_password = hashed_password
+        self._salt = salt
+        self._registration_date = registration_date
+
+    @property
+    def username(self) -> str:
+        return self._username
+
+    @username.setter
+    def username(self, value: str) -> None:
+        if not value or not value.strip():
+            raise ValueError("Имя пользователя не может быть пустым.")
+        self._username = value
+
+
+class BaselineWallet:
+
+    def __init__(self, currency_code: str, balance: float = 0.0) -> None:
+        self.currency_code = currency_code.upper()
+        self.balance = balance
+
+    @property
+    def balance(self) -> float:
+        return self._balance
+
+    @balance.setter
+    def balance(self, value: float) -> None:
+        if not isinstance(value, (int, float)):
+            raise ValueError("Баланс должен быть числом.")
+        if value < 0:
+            raise ValueError("Баланс не может быть отрицательным.")
+        self._balance = float(value)
+
+
+class BaselinePortfolio:
+
+    def __init__(
+        self,
+        user_id: int,
+        wallets: Optional[Dict[str, BaselineWallet]] = None,
+    ) -> None:
+        self._user_id = user_id
+        self._wallets: Dict[str, BaselineWallet] = wallets or {}
+
+    @property
+    def user_id(self) -> int:
+        return self._user_id
+
+    @property
+    def wallets(self) -> Dict[str, BaselineWallet]:
+        return dict(self._wallets)
+
+
+def user_from_record(record: Dict[str, Any]) -> BaselineUser:
+    return BaselineUser(
+        user_id=record["user_id"],
+        username=record["username"],
+        hashed_password=record["hashed_password"],
+        salt=record["salt"],
+        registration_date=datetime.fromisoformat(record["registration_date"]),
+    )
+
+
+def portfolio_from_record(record: Dict[str, Any]) -> BaselinePortfolio:
+    wallets: Dict[str, BaselineWallet] = {}
+    for code, w_data in record.get("wallets", {}).items():
+        balance = float(w_data.get("balance", 0.0))
+        wallets[code] = BaselineWallet(currency_code=code, balance=balance)
+    return BaselinePortfolio(user_id=record["user_id"], wallets=wallets)
+
+
+def portfolio_to_record(portfolio: BaselinePortfolio) -> Dict[str, Any]:
+    wallets_dict: Dict[str, Dict[str, Any]] = {}
+    for code, wallet in portfolio.wallets.items():
+        wallets_dict[code] = {
+            "currency_code": wallet.currency_code,
+            "balance": wallet.balance,
+        }
+    return {
+        "user_id": portfolio.user_id,
+        "wallets": wallets_dict,
+    }
@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from logging.handlers import RotatingFileHandler
+
+from valutatrade_hub.infra.audit import AuditIndex, parse_action_line
+from valutatrade_hub.infra.rates_snapshot import iso_to_micros
+
+LINES = 40_000
+USERS = 200
+BATCH = 1_000
+MAX_BYTES = 1_000_000
+BACKUPS = 3
+
+
+def make_logger(path: str) -> logging.Logger:
+    logger = logging.getLogger(f"bench-audit-{os.getpid()}")
+    logger.propagate = False
+    handler = RotatingFileHandler(
+        path,
+        maxBytes=MAX_BYTES,
+        backupCount=BACKUPS,
+        encoding="utf-8",
+    )
+    handler.setFormatter(
+        logging.Formatter(
+            "%(levelname)s %(asctime)s %(message)s",
+            datefmt="%Y-%m-%dT%H:%M:%S",
+        ),
+    )
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    return logger
+
+
+def write_lines(logger: logging.Logger, start: int, count: int) -> None:
+    # формат строк совпадает с декоратором log_action
+    moment = datetime(2025, 1, 1)
+    for idx in range(start, start + count):
+        timestamp = (moment + timedelta(seconds=idx)).isoformat()
+        user = f"user{idx % USERS}"
+        action = "BUY" if idx % 2 else "SELL"
+        if idx % 10 == 0:
+            logger.error(
+                "%s %s user=%r currency=%r amount=%r result=ERROR "
+                "error_type=%s error_message=%s",
+                action,
+                timestamp,
+                user,
+                "BTC",
+                0.01,
+                "InsufficientFundsError",
+                "Недостаточно средств",
+            )
+        else:
+            logger.info(
+                "%s %s user=%r currency=%r amount=%r result=OK",
+                action,
+                timestamp,
+                user,
+                "EUR",
+                10.0,
+            )
+        if idx % 7 == 0:
+            logger.info("Starting rates update...")
+
+
+def grep_scan(log_file: str, user: str) -> int:
+    # то, что раньше делали вручную: разбор всех файлов подряд
+    found = 0
+    for suffix in [f".{num}" for num in range(BACKUPS, 0, -1)] + [""]:
+        try:
+            with open(log_file + suffix, "r", encoding="utf-8") as file:
+                for line in file:
+                    record = parse_action_line(line)
+                    if (
+                        record is not None
+                        and record["user"] == user
+                        and record["result"] == "ERROR"
+                    ):
+                        found += 1
+        except FileNotFoundError:
+            continue
+    return found
+
+
+def main(lines: int = LINES) -> int:
+    root = tempfile.mkdtemp(prefix="vt-audit-")
+    log_file = os.path.join(root, "actions.log")
+    logger = make_logger(log_file)
+    index = AuditIndex(log_file, os.path.join(root, "audit"))
+
+    write_lines(logger, 0, lines)
+    started = time.perf_counter()
+    added = index.refresh()
+    elapsed = time.perf_counter() - started
+    print(f"Построение индекса: {added} записей за {elapsed:.2f} с")
+
+    # дописываем понемногу, с ротациями: индекс догоняет только новые строки
+    refresh_times = []
+    total = added
+    for batch_start in range(lines, lines + 5 * BATCH, BATCH):
+        write_lines(logger, batch_start, BATCH)
+        started = time.perf_counter()
+        total += index.refresh()
+        refresh_times.append(time.perf_counter() - started)
+    print(
+        f"Инкрементальное обновление ({BATCH} строк): "
+        f"{max(refresh_times) * 1000:.1f} мс в худшем случае",
+    )
+
+    user = "user10"
+    started = time.perf_counter()
+    expected = grep_scan(log_file, user)
+    grep_elapsed = time.perf_counter() - started
+    started = time.perf_counter()
+    entries = index.query(user=user, ok=False)
+    found = len(entries)
+    query_elapsed = time.perf_counter() - started
+    print(
+        f"Ошибки {user}: разбор логов {grep_elapsed * 1000:.1f} мс "
+        f"({expected} в текущих файлах), индекс {query_elapsed * 1000:.1f} мс "
+        f"({found}, включая удалённые ротацией)",
+    )
+
+    last_day = iso_to_micros(
+        (datetime(2025, 1, 1) + timedelta(seconds=lines)).isoformat(),
+    )
+    started = time.perf_counter()
+    recent = index.query(since=last_day)
+    print(
+        f"Записи за последний интервал: {len(recent)} "
+        f"за {(time.perf_counter() - started) * 1000:.1f} мс",
+    )
+
+    # индекс переживает ротацию: в нём остаются и удалённые строки
+    if found < expected:
+        print(f"Ошибка: индекс нашёл {found} записей, в логах {expected}.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else LINES))
@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import sys
+import time
+from typing import Any, Callable
+
+from valutatrade_hub.infra.codecs import CODECS, decode_auto
+
+from .bench_models import make_records
+
+USERS = 50_000
+REPEATS = 3
+
+
+def best_of(func: Callable[[], Any], repeats: int = REPEATS) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main(count: int = USERS) -> None:
+    users, portfolios = make_records(count)
+    datasets = (("users", users), ("portfolios", portfolios))
+
+    for label, data in datasets:
+        print(f"{label} ({count} записей):")
+        for name, codec in CODECS.items():
+            payload = codec.encode(data)
+            assert decode_auto(payload) == data
+            encode = best_of(lambda codec=codec: codec.encode(data))
+            decode = best_of(lambda codec=codec, payload=payload: codec.decode(payload))
+            print(
+                f"- {name:<13} {len(payload) / 1024:9.0f} КБ "
+                f"encode {encode * 1000:8.1f} мс  decode {decode * 1000:8.1f} мс",
+            )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else USERS)
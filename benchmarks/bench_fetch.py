@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import os
+import sys
+import tempfile
+import time
+
+from valutatrade_hub.core.exceptions import ApiRequestError
+from valutatrade_hub.parser_service.api_clients import (
+    CoinGeckoClient,
+    ExchangeRateApiClient,
+)
+from valutatrade_hub.parser_service.config import ParserConfig
+from valutatrade_hub.parser_service.storage import RatesStorage
+from valutatrade_hub.parser_service.stub_server import StubOptions, StubRatesServer
+from valutatrade_hub.parser_service.updater import RatesUpdater
+
+RUNS = 50
+SCENARIOS = (
+    ("без задержки", StubOptions()),
+    ("задержка 20 мс", StubOptions(latency=0.02)),
+    ("задержка 20 мс, 30% ошибок", StubOptions(latency=0.02, error_rate=0.3)),
+    ("ответ 256 КБ", StubOptions(payload_padding=256 * 1024)),
+)
+
+
+def make_config(tmp: str) -> ParserConfig:
+    return ParserConfig(
+        HTTP_MODE="live",
+        RATES_FILE_PATH=os.path.join(tmp, "rates.json"),
+        RATES_BINARY_PATH=os.path.join(tmp, "rates.bin"),
+        HISTORY_FILE_PATH=os.path.join(tmp, "exchange_rates.json"),
+        HEALTH_FILE_PATH=os.path.join(tmp, "source_health.json"),
+        QUOTA_FILE_PATH=os.path.join(tmp, "source_quota.json"),
+        SOURCE_QUOTAS={},
+        BREAKER_FAILURE_THRESHOLD=10**6,
+    )
+
+
+def run_scenario(label: str, options: StubOptions, runs: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp, StubRatesServer(options=options) as stub:
+        config = stub.configure(make_config(tmp))
+        clients = [CoinGeckoClient(config), ExchangeRateApiClient(config)]
+        updater = RatesUpdater(clients, RatesStorage(config), config)
+
+        failed = 0
+        started = time.perf_counter()
+        for _ in range(runs):
+            try:
+                message, _total, _refresh = updater.run_update(force=True)
+            except ApiRequestError:
+                failed += 1
+                continue
+            if "errors" in message:
+                failed += 1
+        elapsed = time.perf_counter() - started
+        print(
+            f"{label:<30} {runs / elapsed:8.1f} обновл./с "
+            f"{elapsed / runs * 1000:8.1f} мс/обновл. "
+            f"с ошибками: {failed}/{runs}, запросов: {stub.requests_served}",
+        )
+
+
+def main(runs: int = RUNS) -> None:
+    for label, options in SCENARIOS:
+        run_scenario(label, options, runs)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else RUNS)
@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from valutatrade_hub.infra.group_commit import MODES, GroupCommitter, write_file_atomic
+
+WRITES = 400
+THREADS = 16
+FILES = 4
+
+
+def run_unbatched(directory: str, writes: int) -> float:
+    payload = json.dumps({"user_id": 1, "wallets": {}}).encode("utf-8")
+    started = time.perf_counter()
+    for idx in range(writes):
+        path = os.path.join(directory, f"f{idx % FILES}.json")
+        write_file_atomic(path, payload, True)
+    return time.perf_counter() - started
+
+
+def run_mode(directory: str, mode: str, window_ms: float, writes: int) -> None:
+    committer = GroupCommitter(mode, window_ms)
+    payload = json.dumps({"user_id": 1, "wallets": {}}).encode("utf-8")
+
+    def worker(idx: int) -> None:
+        committer.write(os.path.join(directory, f"f{idx % FILES}.json"), payload)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        list(pool.map(worker, range(writes)))
+    committer.flush()
+    elapsed = time.perf_counter() - started
+    print(
+        f"{mode:<8} окно {window_ms:>4} мс: {writes / elapsed:9.0f} записей/с, "
+        f"групп: {committer.batches}, файлов записано: {committer.files_written}",
+    )
+
+
+def main(writes: int = WRITES) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        elapsed = run_unbatched(tmp, writes)
+        print(f"{'fsync на каждую запись':<25}: {writes / elapsed:9.0f} записей/с")
+        for mode in MODES:
+            for window_ms in (0, 5):
+                run_mode(tmp, mode, window_ms, writes)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else WRITES)
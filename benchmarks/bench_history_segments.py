@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterator, List
+
+from valutatrade_hub.parser_service.history_reader import iter_history
+from valutatrade_hub.parser_service.history_segments import (
+    CODECS,
+    HistorySegmentReader,
+    convert_history,
+)
+
+TICKS = 200_000
+PAIRS = (
+    ("BTC", "USD", "CoinGecko"),
+    ("ETH", "USD", "CoinGecko"),
+    ("SOL", "USD", "CoinGecko"),
+    ("EUR", "USD", "ExchangeRate-API"),
+    ("GBP", "USD", "ExchangeRate-API"),
+    ("RUB", "USD", "ExchangeRate-API"),
+)
+
+
+def make_history(count: int) -> List[Dict[str, Any]]:
+    random.seed(42)
+    moment = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    rates = {from_code: 100.0 for from_code, _to, _src in PAIRS}
+    history = []
+    for idx in range(count):
+        from_code, to_code, source = PAIRS[idx % len(PAIRS)]
+        if idx % len(PAIRS) == 0:
+            moment += timedelta(minutes=5)
+        # фиатные курсы меняются редко — как у реального ExchangeRate-API
+        if source == "CoinGecko" or random.random() < 0.05:
+            rates[from_code] = round(rates[from_code] * random.uniform(0.99, 1.01), 4)
+        now = moment.isoformat().replace("+00:00", "Z")
+        history.append(
+            {
+                "id": f"{from_code}_{to_code}_{now}",
+                "from_currency": from_code,
+                "to_currency": to_code,
+                "rate": rates[from_code],
+                "timestamp": now,
+                "source": source,
+                "meta": {"source_client": source},
+            },
+        )
+    return history
+
+
+def timed(label: str, func: Callable[[], Iterator[Any]]) -> None:
+    started = time.perf_counter()
+    count = sum(1 for _ in func())
+    elapsed = time.perf_counter() - started
+    print(f"{label:<44} {elapsed * 1000:10.1f} ms ({count} записей)")
+
+
+def main(count: int = TICKS) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, "exchange_rates.json")
+        with open(json_path, "w", encoding="utf-8") as file:
+            json.dump(make_history(count), file, ensure_ascii=False, indent=2)
+
+        print(f"{count} тиков истории")
+        print(f"{'exchange_rates.json':<44} {os.path.getsize(json_path):>10} байт")
+        for codec in CODECS:
+            seg_path = os.path.join(tmp, f"history.{codec}.seg")
+            started = time.perf_counter()
+            convert_history(json_path, seg_path, codec)
+            elapsed = time.perf_counter() - started
+            size = os.path.getsize(seg_path)
+            print(
+                f"{'сегмент ' + codec:<44} {size:>10} байт "
+                f"(x{os.path.getsize(json_path) / size:.0f}, "
+                f"конвертация {elapsed * 1000:.0f} ms)",
+            )
+
+        timed("JSON: полный проход (потоково)", lambda: iter_history(json_path))
+        timed(
+            "JSON: одна пара (потоково)",
+            lambda: iter_history(json_path, pair="BTC_USD"),
+        )
+        for codec in CODECS:
+            reader = HistorySegmentReader(os.path.join(tmp, f"history.{codec}.seg"))
+            timed(f"сегмент {codec}: полный проход", reader.iter_ticks)
+            timed(
+                f"сегмент {codec}: одна пара",
+                lambda: reader.iter_ticks(pair="BTC_USD"),
+            )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else TICKS)
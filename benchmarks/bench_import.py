@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import csv
+import logging
+import os
+import sys
+import tempfile
+import time
+
+USERS = 50_000
+ONE_BY_ONE = 500
+
+
+def write_csv(path: str, count: int, prefix: str) -> None:
+    with open(path, "w", encoding="utf-8", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["username", "password", "wallets"])
+        for idx in range(count):
+            writer.writerow([f"{prefix}{idx}", f"secret{idx}", "USD:100;BTC:0.5"])
+
+
+def main(count: int = USERS) -> None:
+    root = tempfile.mkdtemp(prefix="vt-import-")
+    # каталог данных задаётся до импорта приложения: пути читаются один раз
+    os.environ["VALUTATRADE_DATA_DIR"] = os.path.join(root, "data")
+    os.environ["VALUTATRADE_RATES_SHM"] = "0"
+
+    from valutatrade_hub.core.bulk import import_users
+    from valutatrade_hub.core.usecases import register_user
+    from valutatrade_hub.logging_config import get_logger
+
+    get_logger().setLevel(logging.CRITICAL)
+
+    started = time.perf_counter()
+    for idx in range(ONE_BY_ONE):
+        register_user(f"single{idx}", "secret")
+    single = (time.perf_counter() - started) / ONE_BY_ONE
+    print(
+        f"register_user по одному: {single * 1000:.2f} мс на пользователя "
+        f"(после {ONE_BY_ONE} уже растёт: файлы переписываются целиком)",
+    )
+
+    for workers in sorted({1, os.cpu_count() or 1}):
+        path = os.path.join(root, f"users-{workers}.csv")
+        write_csv(path, count, f"w{workers}_")
+        started = time.perf_counter()
+        report = import_users(path, workers=workers)
+        elapsed = time.perf_counter() - started
+        print(
+            f"import-users, {workers} процесс(ов): {report.imported} "
+            f"за {elapsed:.2f} с "
+            f"({elapsed / max(report.imported, 1) * 1000:.3f} мс на пользователя)",
+        )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else USERS)
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import gc
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Tuple
+
+from valutatrade_hub.core.balances import BalanceTable
+from valutatrade_hub.core.models import User
+from valutatrade_hub.core.utils import (
+    portfolio_from_record,
+    portfolio_to_record,
+    portfolios_from_records,
+    user_from_record,
+)
+
+from . import baseline_models as baseline
+
+USERS = 100_000
+RUNS = 3
+CODES = ("USD", "EUR", "BTC", "ETH")
+
+
+def make_records(count: int) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    registered = datetime(2025, 1, 1).isoformat()
+    users = []
+    portfolios = []
+    for user_id in range(1, count + 1):
+        users.append(
+            {
+                "user_id": user_id,
+                "username": f"user{user_id}",
+                "hashed_password": "0" * 64,
+                "salt": "0" * 16,
+                "registration_date": registered,
+            },
+        )
+        wallets = {
+            code: {"currency_code": code, "balance": (user_id % 97) / 4}
+            for code in CODES[: 1 + user_id % len(CODES)]
+        }
+        portfolios.append({"user_id": user_id, "wallets": wallets})
+    return users, portfolios
+
+
+def measure(label: str, func: Callable[[], Any]) -> Any:
+    # лучшее из RUNS: сборка мусора от предыдущего замера не попадает в этот
+    best = float("inf")
+    for _ in range(RUNS):
+        gc.collect()
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+
+    gc.collect()
+    tracemalloc.start()
+    result = func()
+    retained, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<44} {best * 1000:10.1f} ms {retained / 2**20:10.1f} MiB")
+    return result
+
+
+def shard_table_load(portfolios: List[Dict[str, Any]]) -> List[Any]:
+    # как UnitOfWork.get_portfolio: строки в общей таблице шарда
+    table = BalanceTable()
+    return [portfolio_from_record(record, table) for record in portfolios]
+
+
+def main(count: int = USERS) -> None:
+    users, portfolios = make_records(count)
+    print(f"{count} пользователей, лучший из {RUNS} запусков")
+    print(f"{'операция':<44} {'время':>13} {'память':>14}")
+
+    measure(
+        "[до] User из записи",
+        lambda: [baseline.user_from_record(r) for r in users],
+    )
+    measure(
+        "User(...) с валидацией",
+        lambda: [
+            User(
+                user_id=r["user_id"],
+                username=r["username"],
+                hashed_password=r["hashed_password"],
+                salt=r["salt"],
+                registration_date=datetime.fromisoformat(r["registration_date"]),
+            )
+            for r in users
+        ],
+    )
+    measure("user_from_record (trusted)", lambda: [user_from_record(r) for r in users])
+
+    baseline_loaded = measure(
+        "[до] portfolio_from_record",
+        lambda: [baseline.portfolio_from_record(r) for r in portfolios],
+    )
+    measure(
+        "portfolio_from_record, своя таблица",
+        lambda: [portfolio_from_record(r) for r in portfolios],
+    )
+    measure(
+        "portfolio_from_record, таблица шарда (UoW)",
+        lambda: shard_table_load(portfolios),
+    )
+    loaded = measure(
+        "portfolios_from_records (общая таблица)",
+        lambda: portfolios_from_records(portfolios),
+    )
+
+    measure(
+        "[до] portfolio_to_record",
+        lambda: [baseline.portfolio_to_record(p) for p in baseline_loaded],
+    )
+    measure(
+        "portfolio_to_record",
+        lambda: [portfolio_to_record(p) for p in loaded.values()],
+    )
+
+    for label, portfolio in (
+        ("[до] Portfolio.wallets", baseline_loaded[0]),
+        ("Portfolio.wallets", next(iter(loaded.values()))),
+    ):
+        started = time.perf_counter()
+        for _ in range(count):
+            portfolio.wallets
+        elapsed = time.perf_counter() - started
+        print(f"{label + ' x ' + str(count):<44} {elapsed * 1000:10.1f} ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else USERS)
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import json
+import os
+import sys
+import tempfile
+import time
+from multiprocessing import Pool
+from typing import Dict, Tuple
+
+from valutatrade_hub.infra.rates_shm import (
+    open_rates_shm,
+    publish_rates_snapshot,
+    unlink_rates_shm,
+)
+from valutatrade_hub.infra.rates_snapshot import (
+    encode_rates_snapshot,
+    iso_to_micros,
+    micros_to_iso,
+    open_rates_snapshot,
+    write_snapshot_payload,
+)
+
+PAIRS = 2_000
+LOOKUPS = 20_000
+WORKERS = 4
+# обновлятель публикует намного реже; здесь — с запасом
+PUBLISH_INTERVAL = 0.005
+SEGMENT = f"vt_rates_bench_{os.getpid()}"
+
+
+def make_pairs(count: int, generation: int) -> Dict[str, Tuple[float, str]]:
+    # курс и время обновления связаны: по ним видно «разорванное» чтение
+    updated = micros_to_iso(generation * 1_000_000)
+    return {f"C{idx:05d}_USD": (float(generation), updated) for idx in range(count)}
+
+
+def lookup_json(path: str, keys: list) -> float:
+    started = time.perf_counter()
+    with open(path, "r", encoding="utf-8") as file:
+        pairs = json.load(file)["pairs"]
+    for key in keys:
+        pairs[key]["rate"]
+    return time.perf_counter() - started
+
+
+def lookup_mmap(path: str, keys: list) -> float:
+    started = time.perf_counter()
+    snapshot = open_rates_snapshot(path)
+    for key in keys:
+        snapshot.get(key)
+    elapsed = time.perf_counter() - started
+    snapshot.close()
+    return elapsed
+
+
+def lookup_shm(name: str, keys: list) -> float:
+    started = time.perf_counter()
+    snapshot = open_rates_shm(name)
+    for key in keys:
+        snapshot.get(key)
+    elapsed = time.perf_counter() - started
+    snapshot.close()
+    return elapsed
+
+
+def reader_worker(args: Tuple[str, int, int]) -> Tuple[int, int]:
+    name, pairs, lookups = args
+    snapshot = open_rates_shm(name)
+    torn = 0
+    for idx in range(lookups):
+        rate, updated = snapshot.get(f"C{idx % pairs:05d}_USD")
+        if iso_to_micros(updated) != int(rate) * 1_000_000:
+            torn += 1
+    snapshot.close()
+    return lookups, torn
+
+
+def concurrent_readers(pairs: int, lookups: int) -> int:
+    generation = 1
+    with Pool(WORKERS) as pool:
+        pending = pool.map_async(
+            reader_worker,
+            [(SEGMENT, pairs, lookups)] * WORKERS,
+        )
+        started = time.perf_counter()
+        while not pending.ready():
+            generation += 1
+            publish_rates_snapshot(
+                SEGMENT,
+                encode_rates_snapshot(make_pairs(pairs, generation), ""),
+            )
+            time.sleep(PUBLISH_INTERVAL)
+        elapsed = time.perf_counter() - started
+        results = pending.get()
+    total = sum(done for done, _ in results)
+    torn = sum(bad for _, bad in results)
+    print(
+        f"{WORKERS} процесса-читателя: {total / elapsed:,.0f} чтений/с "
+        f"при {generation - 1} публикациях, разорванных чтений: {torn}",
+    )
+    return torn
+
+
+def main(pairs: int = PAIRS, lookups: int = LOOKUPS) -> int:
+    root = tempfile.mkdtemp(prefix="vt-shm-")
+    json_path = os.path.join(root, "rates.json")
+    bin_path = os.path.join(root, "rates.bin")
+
+    data = make_pairs(pairs, 1)
+    with open(json_path, "w", encoding="utf-8") as file:
+        json.dump(
+            {
+                "pairs": {
+                    pair: {"rate": rate, "updated_at": updated}
+                    for pair, (rate, updated) in data.items()
+                },
+            },
+            file,
+        )
+    payload = encode_rates_snapshot(data, "")
+    write_snapshot_payload(bin_path, payload)
+    publish_rates_snapshot(SEGMENT, payload)
+
+    keys = [f"C{idx % pairs:05d}_USD" for idx in range(100)]
+    try:
+        print(f"Открытие снимка и 100 поисков ({pairs} пар):")
+        for label, func, target in (
+            ("rates.json", lookup_json, json_path),
+            ("rates.bin mmap", lookup_mmap, bin_path),
+            ("shared memory", lookup_shm, SEGMENT),
+        ):
+            best = min(func(target, keys) for _ in range(5))
+            print(f"- {label:<15} {best * 1000:8.2f} мс")
+        torn = concurrent_readers(pairs, lookups)
+    finally:
+        unlink_rates_shm(SEGMENT)
+    return 1 if torn else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(*(int(arg) for arg in sys.argv[1:3])))
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import os
+import sys
+import tempfile
+import time
+
+from valutatrade_hub.infra.sharding import HashRing
+
+USERS = 20_000
+SHARDS = 4
+
+
+def ring_stats(count: int) -> None:
+    keys = range(1, count + 1)
+    before = HashRing([f"node{idx}" for idx in range(SHARDS)])
+    after = HashRing([f"node{idx}" for idx in range(SHARDS + 1)])
+    counts = before.distribution(keys)
+    moved = sum(1 for key in keys if before.shard_for(key) != after.shard_for(key))
+    spread = ", ".join(f"{count / len(keys):.1%}" for count in counts.values())
+    print(f"Кольцо {SHARDS} шарда: доли {spread}")
+    print(
+        f"Добавление шарда {SHARDS + 1}: перенесено {moved / count:.1%} ключей "
+        f"(идеал {1 / (SHARDS + 1):.1%})",
+    )
+
+
+def rebalance_files(count: int) -> int:
+    root = tempfile.mkdtemp(prefix="vt-shards-")
+    # каталог данных задаётся до импорта приложения: пути читаются один раз
+    os.environ["VALUTATRADE_DATA_DIR"] = os.path.join(root, "main")
+
+    from valutatrade_hub.core.utils import (
+        load_portfolios,
+        rebalance_shards,
+        save_portfolios,
+        shard_distribution,
+    )
+
+    records = [
+        {
+            "user_id": user_id,
+            "wallets": {"USD": {"currency_code": "USD", "balance": float(user_id)}},
+        }
+        for user_id in range(1, count + 1)
+    ]
+    save_portfolios(records)
+
+    nodes = [os.path.join(root, f"node{idx}") for idx in range(SHARDS + 1)]
+    for shards in (nodes[:SHARDS], nodes):
+        started = time.perf_counter()
+        moved, total = rebalance_shards(shards)
+        elapsed = time.perf_counter() - started
+        sizes = ", ".join(str(size) for size in shard_distribution().values())
+        print(
+            f"Ребалансировка на {len(shards)} шардов: перенесено {moved}/{total} "
+            f"за {elapsed * 1000:.0f} мс, размеры: {sizes}",
+        )
+
+    restored = sorted(load_portfolios(), key=lambda record: record["user_id"])
+    if restored != records:
+        print("Ошибка: после ребалансировки портфели не совпадают.")
+        return 1
+    print("Все портфели на месте после ребалансировки.")
+    return 0
+
+
+def main(count: int = USERS) -> int:
+    ring_stats(count)
+    return rebalance_files(count)
+
+
+if __name__ == "__main__":
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else USERS))
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import json
+import os
+import sys
+import tempfile
+import time
+
+from valutatrade_hub.infra.users_store import JsonLinesUsersStore
+
+from .bench_models import make_records
+
+USERS = 100_000
+LOOKUPS = 1_000
+
+
+def main(count: int = USERS) -> None:
+    users, _portfolios = make_records(count)
+    root = tempfile.mkdtemp(prefix="vt-users-")
+    json_path = os.path.join(root, "users.json")
+    with open(json_path, "w", encoding="utf-8") as file:
+        json.dump(users, file, ensure_ascii=False, indent=2)
+
+    jsonl_path = os.path.join(root, "users.jsonl")
+    started = time.perf_counter()
+    JsonLinesUsersStore(jsonl_path, durable=False).append(users)
+    elapsed = time.perf_counter() - started
+    print(f"Перенос {count} пользователей в users.jsonl: {elapsed:.2f} с")
+
+    target = users[-1]["username"]
+
+    # прежний login: разбор всего users.json ради одной записи
+    started = time.perf_counter()
+    with open(json_path, "r", encoding="utf-8") as file:
+        record = next(user for user in json.load(file) if user["username"] == target)
+    json_elapsed = time.perf_counter() - started
+    assert record["username"] == target
+
+    # новый процесс: индекс читается целиком, запись — одним seek
+    started = time.perf_counter()
+    store = JsonLinesUsersStore(jsonl_path, durable=False)
+    record = store.find_by_username(target)
+    cold_elapsed = time.perf_counter() - started
+    assert record is not None and record["username"] == target
+
+    names = [users[idx * count // LOOKUPS]["username"] for idx in range(LOOKUPS)]
+    started = time.perf_counter()
+    for name in names:
+        store.find_by_username(name)
+    warm_elapsed = (time.perf_counter() - started) / LOOKUPS
+
+    started = time.perf_counter()
+    store.append([{**users[0], "user_id": count + 1, "username": "new_user"}])
+    append_elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    rebuilt = store.rebuild_index()
+    rebuild_elapsed = time.perf_counter() - started
+
+    print(f"login через users.json:        {json_elapsed * 1000:8.1f} мс")
+    print(f"login через индекс (холодный): {cold_elapsed * 1000:8.1f} мс")
+    print(f"login через индекс (тёплый):   {warm_elapsed * 1000:8.3f} мс")
+    print(f"регистрация (одна строка):     {append_elapsed * 1000:8.3f} мс")
+    print(f"перестройка индекса ({rebuilt}): {rebuild_elapsed:.2f} с")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else USERS)
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from valutatrade_hub.core.models import hash_password
+
+from .bench_models import make_records
+
+USERS = 100_000
+RUNS = 3
+
+# разовый сценарий скрипта: запуск, вход, портфель — и выход
+SCRIPT = """
+import time
+started = time.perf_counter()
+from valutatrade_hub.core.usecases import login_user, show_portfolio
+user, message = login_user({username!r}, "secret")
+assert user is not None, message
+show_portfolio(user)
+print(time.perf_counter() - started)
+"""
+
+
+def run_once(env: dict, username: str) -> float:
+    output = subprocess.run(
+        [sys.executable, "-c", SCRIPT.format(username=username)],
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def best_of(env: dict, username: str) -> float:
+    return min(run_once(env, username) for _ in range(RUNS))
+
+
+def main(count: int = USERS) -> None:
+    users, portfolios = make_records(count)
+    root = tempfile.mkdtemp(prefix="vt-warm-")
+    data_dir = os.path.join(root, "data")
+    os.makedirs(data_dir)
+    env = {
+        **os.environ,
+        "VALUTATRADE_DATA_DIR": data_dir,
+        "VALUTATRADE_RATES_SHM": "0",
+    }
+
+    # у последнего пользователя настоящий пароль: вход проверяет хэш
+    users[-1]["hashed_password"] = hash_password("secret", users[-1]["salt"])
+    username = users[-1]["username"]
+    for name, records in (("users.json", users), ("portfolios.json", portfolios)):
+        with open(os.path.join(data_dir, name), "w", encoding="utf-8") as file:
+            json.dump(records, file, ensure_ascii=False, indent=2)
+
+    print(
+        f"{count} пользователей, лучший из {RUNS} запусков "
+        "(импорт + вход + портфель)",
+    )
+    cold = best_of(env, username)
+    print(f"без снимка:               {cold * 1000:8.1f} мс")
+
+    started = time.perf_counter()
+    subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "from valutatrade_hub.core.usecases import warm_start\n"
+            "print(warm_start())",
+        ],
+        env=env,
+        check=True,
+        capture_output=True,
+    )
+    elapsed = time.perf_counter() - started
+    print(f"сборка снимка:            {elapsed * 1000:8.1f} мс")
+
+    warm = best_of(env, username)
+    print(f"со снимком:               {warm * 1000:8.1f} мс ({cold / warm:.1f}x)")
+
+    # portfolios.json изменился после снимка: он разбирается заново,
+    # users.json по-прежнему берётся из снимка
+    path = os.path.join(data_dir, "portfolios.json")
+    tmp_path = path + ".tmp"
+    with open(path, "rb") as src, open(tmp_path, "wb") as dst:
+        dst.write(src.read())
+    os.replace(tmp_path, path)
+    stale = best_of(env, username)
+    print(f"снимок устарел частично:  {stale * 1000:8.1f} мс")
+
+    disabled = best_of({**env, "VALUTATRADE_WARM_START": "0"}, username)
+    print(f"чтение снимка отключено:  {disabled * 1000:8.1f} мс")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else USERS)
@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import secrets
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from valutatrade_hub.server.app import MAX_BODY_BYTES
+
+OPERATIONS = (
+    ("rate", 0.5),
+    ("portfolio", 0.2),
+    ("buy", 0.2),
+    ("sell", 0.1),
+)
+# только зарегистрированные коды: иначе сделки отвечают 400 и мерят не то
+CURRENCIES = ("BTC", "ETH", "EUR", "RUB")
+
+
+class ApiConnection:
+
+    def __init__(self, host: str, port: int) -> None:
+        self.host = host
+        self.port = port
+        self.token: Optional[str] = None
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    async def open(self) -> None:
+        self._reader, self._writer = await asyncio.open_connection(
+            self.host,
+            self.port,
+        )
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            await self._writer.wait_closed()
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        payload: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[int, Dict[str, Any]]:
+        assert self._reader is not None and self._writer is not None
+        body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+        headers = [
+            f"{method} {path} HTTP/1.1",
+            f"Host: {self.host}",
+            f"Content-Length: {len(body)}",
+        ]
+        if self.token:
+            headers.append(f"Authorization: Bearer {self.token}")
+        self._writer.write(("\r\n".join(headers) + "\r\n\r\n").encode() + body)
+        await self._writer.drain()
+
+        head = await self._reader.readuntil(b"\r\n\r\n")
+        lines = head.decode("latin-1").split("\r\n")
+        status = int(lines[0].split(" ", 2)[1])
+        length = 0
+        for line in lines[1:]:
+            if line.lower().startswith("content-length:"):
+                length = int(line.split(":", 1)[1])
+        if length > MAX_BODY_BYTES * 16:
+            raise ValueError("слишком большой ответ сервера")
+        raw = await self._reader.readexactly(length)
+        return status, json.loads(raw) if raw else {}
+
+
+class Stats:
+
+    def __init__(self) -> None:
+        self.latencies: Dict[str, List[float]] = {}
+        self.statuses: Dict[int, int] = {}
+
+    def add(self, operation: str, status: int, latency: float) -> None:
+        self.latencies.setdefault(operation, []).append(latency)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    def report(self, elapsed: float) -> None:
+        total = sum(len(values) for values in self.latencies.values())
+        print(f"Запросов: {total} за {elapsed:.2f} с ({total / elapsed:.1f} RPS)")
+        for operation in sorted(self.latencies):
+            values = sorted(self.latencies[operation])
+            p50 = values[len(values) // 2] * 1000
+            p95 = values[min(len(values) - 1, int(len(values) * 0.95))] * 1000
+            print(
+                f"- {operation:<10} n={len(values):<6} "
+                f"p50={p50:7.2f} мс p95={p95:7.2f} мс",
+            )
+        codes = ", ".join(f"{code}: {n}" for code, n in sorted(self.statuses.items()))
+        print(f"Коды ответов: {codes}")
+
+
+def pick_operation() -> str:
+    roll = random.random()
+    for operation, weight in OPERATIONS:
+        if roll < weight:
+            return operation
+        roll -= weight
+    return OPERATIONS[0][0]
+
+
+async def run_operation(conn: ApiConnection, operation: str) -> int:
+    currency = random.choice(CURRENCIES)
+    if operation == "rate":
+        status, _ = await conn.request("GET", f"/rate?from={currency}&to=USD")
+    elif operation == "portfolio":
+        status, _ = await conn.request("GET", "/portfolio?base=USD")
+    elif operation == "buy":
+        status, _ = await conn.request(
+            "POST",
+            "/buy",
+            {"currency": currency, "amount": 0.01},
+        )
+    else:
+        status, _ = await conn.request(
+            "POST",
+            "/sell",
+            {"currency": currency, "amount": 0.01},
+        )
+    return status
+
+
+async def virtual_user(
+    host: str,
+    port: int,
+    index: int,
+    run_id: str,
+    requests: int,
+    stats: Stats,
+) -> None:
+    conn = ApiConnection(host, port)
+    await conn.open()
+    try:
+        credentials = {"username": f"load-{run_id}-{index}", "password": "load-test"}
+        await conn.request("POST", "/register", credentials)
+        status, body = await conn.request("POST", "/login", credentials)
+        if status != 200:
+            stats.add("login", status, 0.0)
+            return
+        conn.token = body["token"]
+
+        for _ in range(requests):
+            operation = pick_operation()
+            started = time.perf_counter()
+            status = await run_operation(conn, operation)
+            stats.add(operation, status, time.perf_counter() - started)
+    finally:
+        await conn.close()
+
+
+async def run_load(host: str, port: int, users: int, requests: int) -> None:
+    stats = Stats()
+    run_id = secrets.token_hex(3)
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(
+            virtual_user(host, port, index, run_id, requests, stats)
+            for index in range(users)
+        ),
+    )
+    stats.report(time.perf_counter() - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Нагрузочный клиент JSON API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(run_load(args.host, args.port, args.users, args.requests))
+
+
+if __name__ == "__main__":
+    main()
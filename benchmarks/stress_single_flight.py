@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import json
+import os
+import sys
+import tempfile
+import time
+from multiprocessing import Pool
+from typing import Dict, Tuple
+
+from valutatrade_hub.parser_service.api_clients import BaseApiClient
+from valutatrade_hub.parser_service.config import ParserConfig
+from valutatrade_hub.parser_service.storage import RatesStorage
+from valutatrade_hub.parser_service.updater import RatesUpdater
+
+PROCESSES = 8
+FETCH_SECONDS = 1.0
+
+
+class SlowClient(BaseApiClient):
+
+    @property
+    def name(self) -> str:
+        return "Stub"
+
+    def fetch_rates(self) -> Dict[str, float]:
+        # каждый настоящий запрос к «API» оставляет строку в журнале
+        with open(os.path.join(self.config.FIXTURES_DIR, "calls.log"), "a") as file:
+            file.write(f"{os.getpid()}\n")
+        time.sleep(FETCH_SECONDS)
+        return {"BTC_USD": 100000.0, "EUR_USD": 1.1}
+
+
+def make_config(root: str) -> ParserConfig:
+    return ParserConfig(
+        HTTP_MODE="replay",
+        FIXTURES_DIR=root,
+        RATES_SHM_ENABLED=False,
+        RATES_FILE_PATH=os.path.join(root, "rates.json"),
+        RATES_BINARY_PATH=os.path.join(root, "rates.bin"),
+        HISTORY_FILE_PATH=os.path.join(root, "exchange_rates.json"),
+        HEALTH_FILE_PATH=os.path.join(root, "source_health.json"),
+        QUOTA_FILE_PATH=os.path.join(root, "source_quota.json"),
+        UPDATE_LOCK_PATH=os.path.join(root, "update.lock"),
+        UPDATE_RESULT_PATH=os.path.join(root, "update_result.json"),
+        UPDATE_LEASE_SECONDS=2.0,
+        UPDATE_HEARTBEAT_SECONDS=0.3,
+        UPDATE_POLL_SECONDS=0.05,
+    )
+
+
+def worker(root: str) -> Tuple[str, int, str]:
+    config = make_config(root)
+    updater = RatesUpdater([SlowClient(config)], RatesStorage(config), config)
+    return updater.run_update(force=True)
+
+
+def count_calls(root: str) -> int:
+    try:
+        with open(os.path.join(root, "calls.log")) as file:
+            return len(file.readlines())
+    except FileNotFoundError:
+        return 0
+
+
+def concurrent_updates(root: str) -> bool:
+    started = time.perf_counter()
+    with Pool(PROCESSES) as pool:
+        results = pool.map(worker, [root] * PROCESSES)
+    elapsed = time.perf_counter() - started
+    calls = count_calls(root)
+    refreshes = {last_refresh for _message, _total, last_refresh in results}
+    print(
+        f"{PROCESSES} параллельных update-rates: запросов к API {calls}, "
+        f"разных результатов {len(refreshes)}, {elapsed:.2f} с",
+    )
+    return calls == 1 and len(refreshes) == 1
+
+
+def expired_lease(root: str) -> bool:
+    config = make_config(root)
+    # аренда «упавшего» процесса: продлевалась давно
+    stale = time.time() - 10 * config.UPDATE_LEASE_SECONDS
+    with open(config.UPDATE_LOCK_PATH, "w", encoding="utf-8") as file:
+        json.dump(
+            {
+                "token": "crashed",
+                "owner": "crashed-host:1",
+                "started_at": stale,
+                "heartbeat_at": stale,
+            },
+            file,
+        )
+    before = count_calls(root)
+    started = time.perf_counter()
+    worker(root)
+    elapsed = time.perf_counter() - started
+    recovered = count_calls(root) == before + 1
+    released = not os.path.exists(config.UPDATE_LOCK_PATH)
+    print(
+        f"Просроченная аренда: перехвачена за {elapsed:.2f} с, "
+        f"lock-файл снят: {'да' if released else 'нет'}",
+    )
+    return recovered and released
+
+
+def main() -> int:
+    root = tempfile.mkdtemp(prefix="vt-single-flight-")
+    ok = concurrent_updates(root) and expired_lease(root)
+    if not ok:
+        print("Ошибка: обновления курсов не объединились.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
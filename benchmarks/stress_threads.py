@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+USERS = 8
+THREADS = 16
+OPERATIONS = 2_000
+RATES = {"BTC_USD": 60_000.0, "EUR_USD": 1.08, "ETH_USD": 3_000.0}
+AMOUNTS = (0.01, 0.1, 0.5)
+
+Expected = Dict[Tuple[int, str], int]
+
+
+def main(operations: int = OPERATIONS) -> int:
+    # каталог данных задаётся до первого импорта приложения: настройки
+    # и пути к файлам читаются один раз при загрузке модулей
+    os.environ["VALUTATRADE_DATA_DIR"] = tempfile.mkdtemp(prefix="vt-stress-")
+
+    from valutatrade_hub.core.balances import to_minor
+    from valutatrade_hub.core.currencies import get_precision
+    from valutatrade_hub.core.exceptions import InsufficientFundsError
+    from valutatrade_hub.core.usecases import (
+        buy_currency,
+        login_user,
+        register_user,
+        sell_currency,
+    )
+    from valutatrade_hub.core.utils import get_ledger, load_portfolios, save_rates
+    from valutatrade_hub.logging_config import get_logger
+
+    get_logger().setLevel(logging.CRITICAL)
+    now = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    save_rates(
+        {
+            "pairs": {
+                pair: {"rate": rate, "updated_at": now, "source": "stress"}
+                for pair, rate in RATES.items()
+            },
+            "last_refresh": now,
+        },
+    )
+
+    users = []
+    for index in range(USERS):
+        register_user(f"stress{index}", "stress")
+        user, _message = login_user(f"stress{index}", "stress")
+        assert user is not None
+        users.append(user)
+    codes = [pair.split("_")[0] for pair in RATES]
+
+    expected: Expected = {}
+    expected_lock = threading.Lock()
+    rejected: List[int] = []
+
+    def worker(seed: int, count: int) -> None:
+        rng = random.Random(seed)
+        local: Expected = {}
+        local_rejected = 0
+        for _ in range(count):
+            user = rng.choice(users)
+            code = rng.choice(codes)
+            amount = rng.choice(AMOUNTS)
+            delta = to_minor(amount, get_precision(code))
+            try:
+                if rng.random() < 0.6:
+                    buy_currency(user, code, amount)
+                else:
+                    message = sell_currency(user, code, amount)
+                    delta = -delta
+                    if not message.startswith("Продажа выполнена"):
+                        local_rejected += 1
+                        continue
+            except InsufficientFundsError:
+                local_rejected += 1
+                continue
+            key = (user.user_id, code)
+            local[key] = local.get(key, 0) + delta
+        with expected_lock:
+            for key, delta in local.items():
+                expected[key] = expected.get(key, 0) + delta
+            rejected.append(local_rejected)
+
+    per_thread = operations // THREADS
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        futures = [pool.submit(worker, seed, per_thread) for seed in range(THREADS)]
+        for future in futures:
+            future.result()
+    elapsed = time.perf_counter() - started
+
+    actual: Expected = {}
+    for record in load_portfolios():
+        for code, wallet in record["wallets"].items():
+            minor = to_minor(float(wallet["balance"]), get_precision(code))
+            if minor:
+                actual[(record["user_id"], code)] = minor
+    expected = {key: value for key, value in expected.items() if value}
+
+    _seq, ledger_balances = get_ledger().replay()
+    from_ledger = {
+        (user_id, code): minor
+        for user_id, wallets in ledger_balances.items()
+        for code, minor in wallets.items()
+        if minor
+    }
+
+    total = per_thread * THREADS
+    print(
+        f"{total} операций в {THREADS} потоках за {elapsed:.2f} с "
+        f"({total / elapsed:.0f} оп./с), отклонено: {sum(rejected)}",
+    )
+    ok = actual == expected and from_ledger == expected
+    if ok:
+        print("Балансы сохранены: портфели и журнал сделок совпадают с ожиданием.")
+        return 0
+
+    for key in sorted(set(actual) | set(expected) | set(from_ledger)):
+        values = (expected.get(key), actual.get(key), from_ledger.get(key))
+        if len(set(values)) > 1:
+            print(f"- user={key[0]} {key[1]}: ожидалось / портфель / журнал = {values}")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else OPERATIONS))
@@ -1,27 +1,47 @@
 from __future__ import annotations
 
 import shlex
+import time
+from datetime import datetime, timezone
 from typing import Optional
 
+from valutatrade_hub.core.bulk import export_state, import_users
 from valutatrade_hub.core.exceptions import (
     ApiRequestError,
     CurrencyNotFoundError,
     InsufficientFundsError,
+    InvalidAmountError,
 )
 from valutatrade_hub.core.usecases import (
     buy_currency,
     get_rate_pair,
+    get_trade_history,
     login_user,
+    query_audit,
+    rebalance_portfolio_shards,
+    rebuild_portfolios,
+    rebuild_users_index,
     register_user,
     sell_currency,
     show_portfolio,
+    show_shards,
+    warm_start,
 )
-from valutatrade_hub.core.utils import load_rates
+from valutatrade_hub.core.utils import convert_state_files, load_rates
+from valutatrade_hub.infra.codecs import CODECS as STATE_CODECS
 from valutatrade_hub.parser_service.api_clients import (
     CoinGeckoClient,
     ExchangeRateApiClient,
 )
 from valutatrade_hub.parser_service.config import ParserConfig
+from valutatrade_hub.parser_service.history import (
+    RESOLUTION_SECONDS,
+    RatesHistory,
+)
+from valutatrade_hub.parser_service.history_segments import (
+    CODECS,
+    convert_history,
+)
 from valutatrade_hub.parser_service.storage import RatesStorage
 from valutatrade_hub.parser_service.updater import RatesUpdater
 
@@ -35,14 +55,55 @@ def _print_help() -> None:
     print("  buy --currency <str> --amount <float>")
     print("  sell --currency <str> --amount <float>")
     print("  get-rate --from <str> --to <str>")
+    print("  history [--limit <int>] - история сделок")
+    print(
+        "  rebuild-portfolios "
+        "- восстановить портфели из журнала сделок",
+    )
     print(
-        "  update-rates [--source <coingecko|exchangerate>] "
-        "- обновить курсы",
+        "  update-rates [--source <coingecko|exchangerate>] [--force] "
+        "- обновить устаревшие курсы",
     )
     print(
         "  show-rates [--currency <str>] [--top <int>] "
         "[--base <str>] - показать кеш курсов",
     )
+    print(
+        "  rate-history --from <str> --to <str> [--days <int>] "
+        "[--step <1m|1h|1d>] - история курса",
+    )
+    print("  compact-history - свернуть старые тики в OHLC-бары")
+    print(
+        "  convert-history [--out <path>] [--codec <zlib|lzma>] "
+        "- сжать историю в сегмент",
+    )
+    print(
+        "  convert-state --codec <json|json-compact|marshal> "
+        "- перевести файлы состояния в другой формат",
+    )
+    print(
+        "  audit [--user <str>] [--action <BUY|SELL>] [--currency <str>] "
+        "[--result <ok|error>] [--since <iso>] [--until <iso>] [--days <float>] "
+        "[--limit <int>] [--rebuild] - журнал операций",
+    )
+    print(
+        "  rebuild-users-index "
+        "- перестроить индекс users.jsonl по файлу данных",
+    )
+    print(
+        "  import-users --file <path> [--format <csv|jsonl>] [--chunk <int>] "
+        "[--workers <int>] - массовая загрузка пользователей",
+    )
+    print("  export-state --out <path> - выгрузить пользователей и портфели (JSONL)")
+    print(
+        "  warm-start [--drop] "
+        "- снимок состояния для быстрого запуска (или удалить его)",
+    )
+    print("  shards - распределение портфелей по шардам")
+    print(
+        "  rebalance-shards [--add <dir>] [--remove <dir>] "
+        "- перераспределить портфели",
+    )
     print("  help")
     print("  exit\n")
 
@@ -78,11 +139,15 @@ def run_cli() -> None:
 
             if command == "update-rates":
                 source_filter: Optional[str] = None
+                force = False
                 i = 1
                 while i < len(tokens):
                     if tokens[i] == "--source" and i + 1 < len(tokens):
                         source_filter = tokens[i + 1].lower()
                         i += 2
+                    elif tokens[i] == "--force":
+                        force = True
+                        i += 1
                     else:
                         i += 1
 
@@ -102,12 +167,14 @@ def run_cli() -> None:
                     )
                     continue
 
-                updater = RatesUpdater(clients, storage)
-                message, total, last_refresh = updater.run_update()
+                updater = RatesUpdater(clients, storage, config)
+                message, total, last_refresh = updater.run_update(force=force)
                 print(
                     f"{message} Total rates updated: {total}. "
                     f"Last refresh: {last_refresh}",
                 )
+                for line in updater.health_report():
+                    print(f"  {line}")
                 continue
 
 
@@ -188,6 +255,132 @@ def run_cli() -> None:
                 continue
 
 
+            if command == "compact-history":
+                history = RatesHistory(ParserConfig())
+                stats = history.compact()
+                details = ", ".join(f"{key}={value}" for key, value in stats.items())
+                print(f"Компактация истории завершена: {details}")
+                continue
+
+
+            if command == "convert-history":
+                config = ParserConfig()
+                target = config.HISTORY_SEGMENT_PATH
+                codec = "zlib"
+
+                i = 1
+                while i < len(tokens):
+                    if tokens[i] == "--out" and i + 1 < len(tokens):
+                        target = tokens[i + 1]
+                        i += 2
+                    elif tokens[i] == "--codec" and i + 1 < len(tokens):
+                        codec = tokens[i + 1].lower()
+                        i += 2
+                    else:
+                        i += 1
+
+                if codec not in CODECS:
+                    print("'--codec' должен быть одним из: zlib, lzma")
+                    continue
+
+                try:
+                    written = convert_history(
+                        config.HISTORY_FILE_PATH,
+                        target,
+                        codec,
+                    )
+                except ValueError as exc:
+                    print(f"Не удалось прочитать историю курсов: {exc}")
+                    continue
+                print(f"Записано {written} записей истории в {target} ({codec}).")
+                continue
+
+
+            if command == "convert-state":
+                codec = None
+                i = 1
+                while i < len(tokens):
+                    if tokens[i] == "--codec" and i + 1 < len(tokens):
+                        codec = tokens[i + 1].lower()
+                        i += 2
+                    else:
+                        i += 1
+
+                if codec not in STATE_CODECS:
+                    print(
+                        "'--codec' должен быть одним из: "
+                        f"{', '.join(STATE_CODECS)}",
+                    )
+                    continue
+
+                converted = convert_state_files(codec)
+                if not converted:
+                    print("Файлы состояния не найдены.")
+                    continue
+                print(f"Переведено в формат {codec}: {len(converted)} файл(ов).")
+                for path in converted:
+                    print(f"- {path}")
+                print(
+                    "Чтобы новые записи сохранялись в том же формате, "
+                    f"укажите DB_CODEC={codec} в config.json.",
+                )
+                continue
+
+
+            if command == "rate-history":
+                from_code = None
+                to_code = None
+                days = 1.0
+                step = "1h"
+
+                i = 1
+                while i < len(tokens):
+                    if tokens[i] == "--from" and i + 1 < len(tokens):
+                        from_code = tokens[i + 1].upper()
+                        i += 2
+                    elif tokens[i] == "--to" and i + 1 < len(tokens):
+                        to_code = tokens[i + 1].upper()
+                        i += 2
+                    elif tokens[i] == "--days" and i + 1 < len(tokens):
+                        try:
+                            days = float(tokens[i + 1])
+                        except ValueError:
+                            print("'--days' должно быть числом")
+                        i += 2
+                    elif tokens[i] == "--step" and i + 1 < len(tokens):
+                        step = tokens[i + 1]
+                        i += 2
+                    else:
+                        i += 1
+
+                if from_code is None or to_code is None:
+                    print("Укажите --from и --to для истории курса.")
+                    continue
+                if step not in RESOLUTION_SECONDS:
+                    print("'--step' должен быть одним из: 1m, 1h, 1d")
+                    continue
+
+                end = time.time()
+                resolution, bars = RatesHistory(ParserConfig()).query_range(
+                    f"{from_code}_{to_code}",
+                    end - days * 86400,
+                    end,
+                    RESOLUTION_SECONDS[step],
+                )
+                if not bars:
+                    print(f"История курса {from_code}→{to_code} пуста.")
+                    continue
+
+                print(f"История {from_code}→{to_code} (шаг {resolution}):")
+                for start, open_, high, low, close, count in bars:
+                    moment = datetime.fromtimestamp(start, tz=timezone.utc)
+                    print(
+                        f"- {moment:%Y-%m-%d %H:%M} O={open_} H={high} "
+                        f"L={low} C={close} (n={count})",
+                    )
+                continue
+
+
             if command == "register":
                 username: Optional[str] = None
                 password: Optional[str] = None
@@ -364,10 +557,220 @@ def run_cli() -> None:
                 continue
 
 
+            if command == "history":
+                if current_user is None:
+                    print("Сначала выполните login.")
+                    continue
+
+                limit: Optional[int] = 20
+                i = 1
+                while i < len(tokens):
+                    if tokens[i] == "--limit" and i + 1 < len(tokens):
+                        try:
+                            limit = int(tokens[i + 1])
+                        except ValueError:
+                            print("'--limit' должно быть целым числом")
+                        i += 2
+                    else:
+                        i += 1
+
+                message = get_trade_history(current_user, limit)
+                print(message)
+                continue
+
+
+            if command == "audit":
+                options = {}
+                days_filter: Optional[float] = None
+                audit_limit: Optional[int] = 50
+                rebuild = False
+                i = 1
+                while i < len(tokens):
+                    flag = tokens[i]
+                    if flag == "--rebuild":
+                        rebuild = True
+                        i += 1
+                    elif flag == "--days" and i + 1 < len(tokens):
+                        try:
+                            days_filter = float(tokens[i + 1])
+                        except ValueError:
+                            print("'--days' должно быть числом")
+                        i += 2
+                    elif flag == "--limit" and i + 1 < len(tokens):
+                        try:
+                            audit_limit = int(tokens[i + 1])
+                        except ValueError:
+                            print("'--limit' должно быть целым числом")
+                        i += 2
+                    elif (
+                        flag in (
+                            "--user",
+                            "--action",
+                            "--currency",
+                            "--result",
+                            "--since",
+                            "--until",
+                        )
+                        and i + 1 < len(tokens)
+                    ):
+                        options[flag[2:]] = tokens[i + 1]
+                        i += 2
+                    else:
+                        i += 1
+
+                try:
+                    message = query_audit(
+                        username=options.get("user"),
+                        action=options.get("action"),
+                        currency=options.get("currency"),
+                        result=options.get("result"),
+                        since=options.get("since"),
+                        until=options.get("until"),
+                        days=days_filter,
+                        limit=audit_limit,
+                        rebuild=rebuild,
+                    )
+                except ValueError as exc:
+                    print(str(exc))
+                    continue
+                print(message)
+                continue
+
+
+            if command == "import-users":
+                source = None
+                source_format = None
+                chunk_size = 1000
+                workers = None
+                i = 1
+                while i < len(tokens):
+                    if tokens[i] == "--file" and i + 1 < len(tokens):
+                        source = tokens[i + 1]
+                        i += 2
+                    elif tokens[i] == "--format" and i + 1 < len(tokens):
+                        source_format = tokens[i + 1].lower()
+                        i += 2
+                    elif tokens[i] in ("--chunk", "--workers") and i + 1 < len(tokens):
+                        try:
+                            value = int(tokens[i + 1])
+                        except ValueError:
+                            print(f"'{tokens[i]}' должно быть целым числом")
+                            value = None
+                        if value is not None and value > 0:
+                            if tokens[i] == "--chunk":
+                                chunk_size = value
+                            else:
+                                workers = value
+                        i += 2
+                    else:
+                        i += 1
+
+                if source is None:
+                    print("Укажите --file с пользователями (CSV или JSON Lines).")
+                    continue
+
+                def show_progress(processed: int, imported: int, rejected: int) -> None:
+                    print(
+                        f"\rОбработано {processed}, импортировано {imported}, "
+                        f"отклонено {rejected}",
+                        end="",
+                        flush=True,
+                    )
+
+                try:
+                    report = import_users(
+                        source,
+                        source_format,
+                        chunk_size,
+                        workers,
+                        show_progress,
+                    )
+                except FileNotFoundError:
+                    print(f"Файл '{source}' не найден.")
+                    continue
+                except ValueError as exc:
+                    print(str(exc))
+                    continue
+                print()
+                print(
+                    f"Импорт завершён: {report.imported} из {report.processed}, "
+                    f"отклонено {report.rejected}.",
+                )
+                for error in report.errors:
+                    print(f"- {error}")
+                if report.rejected > len(report.errors):
+                    print(f"... и ещё {report.rejected - len(report.errors)}")
+                continue
+
+
+            if command == "export-state":
+                target = None
+                i = 1
+                while i < len(tokens):
+                    if tokens[i] == "--out" and i + 1 < len(tokens):
+                        target = tokens[i + 1]
+                        i += 2
+                    else:
+                        i += 1
+
+                if target is None:
+                    print("Укажите --out для файла выгрузки.")
+                    continue
+
+                exported = export_state(
+                    target,
+                    lambda count: print(f"\rВыгружено {count}", end="", flush=True),
+                )
+                print(f"\rВыгружено пользователей: {exported} → {target}")
+                continue
+
+
+            if command == "shards":
+                print(show_shards())
+                continue
+
+
+            if command == "rebalance-shards":
+                add_dirs = []
+                remove_dirs = []
+                i = 1
+                while i < len(tokens):
+                    if tokens[i] == "--add" and i + 1 < len(tokens):
+                        add_dirs.append(tokens[i + 1])
+                        i += 2
+                    elif tokens[i] == "--remove" and i + 1 < len(tokens):
+                        remove_dirs.append(tokens[i + 1])
+                        i += 2
+                    else:
+                        i += 1
+
+                message = rebalance_portfolio_shards(add_dirs, remove_dirs)
+                print(message)
+                continue
+
+
+            if command == "rebuild-users-index":
+                print(rebuild_users_index())
+                continue
+
+
+            if command == "warm-start":
+                print(warm_start(drop="--drop" in tokens[1:]))
+                continue
+
+
+            if command == "rebuild-portfolios":
+                message = rebuild_portfolios()
+                print(message)
+                continue
+
+
             print(f"Неизвестная команда '{command}'. Введите 'help'.")
 
         except InsufficientFundsError as exc:
             print(str(exc))
+        except InvalidAmountError as exc:
+            print(str(exc))
         except CurrencyNotFoundError as exc:
             print(str(exc))
         except ApiRequestError as exc:
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import math
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .currencies import get_precision
+
+# -1 в колонке означает, что у пользователя нет кошелька в этой валюте
+NO_WALLET = -1
+
+
+# колонки — array('q'): баланс в минорных единицах обязан влезать в int64
+MAX_MINOR = 2**63 - 1
+
+
+def to_minor(amount: float, precision: int) -> int:
+    value = float(amount) * 10**precision
+    minor = round(value) if math.isfinite(value) else None
+    if minor is None or not -MAX_MINOR <= minor <= MAX_MINOR:
+        raise ValueError(f"сумма {amount} вне допустимого диапазона")
+    return minor
+
+
+def from_minor(value: int, precision: int) -> float:
+    return value / 10**precision
+
+
+class BalanceTable:
+
+    __slots__ = ("_codes", "_precisions", "_index", "_columns", "_rows")
+
+    def __init__(self) -> None:
+        self._codes: List[str] = []
+        self._precisions: List[int] = []
+        self._index: Dict[str, int] = {}
+        self._columns: List[array] = []
+        self._rows = 0
+
+    @property
+    def rows(self) -> int:
+        return self._rows
+
+    def add_row(self) -> int:
+        for column in self._columns:
+            column.append(NO_WALLET)
+        self._rows += 1
+        return self._rows - 1
+
+    def column(self, code: str) -> int:
+        normalized = code.upper()
+        idx = self._index.get(normalized)
+        if idx is None:
+            idx = len(self._codes)
+            self._codes.append(normalized)
+            self._precisions.append(get_precision(normalized))
+            self._columns.append(array("q", [NO_WALLET]) * self._rows)
+            self._index[normalized] = idx
+        return idx
+
+    def find_column(self, code: str) -> Optional[int]:
+        return self._index.get(code.upper())
+
+    def code(self, col: int) -> str:
+        return self._codes[col]
+
+    def precision(self, col: int) -> int:
+        return self._precisions[col]
+
+    def get_minor(self, row: int, col: int) -> int:
+        return self._columns[col][row]
+
+    def set_minor(self, row: int, col: int, value: int) -> None:
+        self._columns[col][row] = value
+
+    def row_columns(self, row: int) -> Iterator[int]:
+        for col, column in enumerate(self._columns):
+            if column[row] != NO_WALLET:
+                yield col
+
+    def row_balances(self, row: int) -> Iterator[Tuple[str, int]]:
+        for col in self.row_columns(row):
+            yield self._codes[col], self._columns[col][row]
+
+    def row_amounts(self, row: int) -> Iterator[Tuple[str, float]]:
+        # без промежуточного генератора колонок: это путь сохранения портфеля
+        for code, precision, column in zip(
+            self._codes,
+            self._precisions,
+            self._columns,
+        ):
+            value = column[row]
+            if value != NO_WALLET:
+                yield code, value / 10**precision
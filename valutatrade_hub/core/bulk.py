@@ -0,0 +1,403 @@
+from __future__ import annotations
+
+import csv
+import json
+import math
+import os
+import secrets
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from itertools import islice
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from valutatrade_hub.infra.ledger import TradeLedger
+from valutatrade_hub.infra.settings import SettingsLoader
+from valutatrade_hub.infra.users_store import JsonLinesUsersStore
+
+from .balances import to_minor
+from .currencies import get_currency, get_precision
+from .exceptions import CurrencyNotFoundError
+from .models import hash_password
+from .utils import (
+    USERS_FILE,
+    db,
+    get_ledger,
+    get_router,
+    get_users_store,
+    load_users,
+    next_user_id,
+    portfolios_file,
+    portfolios_locked,
+    users_lock,
+    wait_durable,
+)
+
+settings = SettingsLoader()
+
+FORMATS = ("csv", "jsonl")
+MAX_REPORTED_ERRORS = 20
+
+# (обработано строк, импортировано, отклонено)
+ImportProgress = Callable[[int, int, int], None]
+ExportProgress = Callable[[int], None]
+
+
+@dataclass
+class ImportReport:
+
+    processed: int = 0
+    imported: int = 0
+    rejected: int = 0
+    errors: List[str] = field(default_factory=list)
+
+    def reject(self, line_no: int, reason: str) -> None:
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"строка {line_no}: {reason}")
+
+
+def detect_format(path: str, fmt: Optional[str] = None) -> str:
+    fmt = (fmt or ("csv" if path.lower().endswith(".csv") else "jsonl")).lower()
+    if fmt not in FORMATS:
+        raise ValueError(f"Формат должен быть одним из: {', '.join(FORMATS)}")
+    return fmt
+
+
+# ---------- чтение входного файла ----------
+
+
+def _parse_wallets(value: Any) -> Dict[str, float]:
+    # CSV: "USD:100;BTC:0.5", JSON Lines: {"USD": 100} или записи портфеля
+    if not value:
+        return {}
+    if isinstance(value, str):
+        items = []
+        for part in value.split(";"):
+            if not part.strip():
+                continue
+            code, _sep, amount = part.partition(":")
+            items.append((code.strip(), amount.strip()))
+    elif isinstance(value, dict):
+        items = [
+            (code, amount.get("balance") if isinstance(amount, dict) else amount)
+            for code, amount in value.items()
+        ]
+    else:
+        raise ValueError("кошельки должны быть объектом или строкой 'USD:100;BTC:1'")
+
+    wallets: Dict[str, float] = {}
+    for code, amount in items:
+        currency = get_currency(code)
+        try:
+            balance = float(amount)
+        except (TypeError, ValueError) as exc:
+            raise ValueError(f"некорректная сумма для {currency.code}") from exc
+        if not math.isfinite(balance):
+            raise ValueError(f"некорректная сумма для {currency.code}")
+        if balance < 0:
+            raise ValueError(f"отрицательный баланс {currency.code}")
+        try:
+            # таблица балансов хранит int64 в минорных единицах
+            to_minor(balance, currency.precision)
+        except ValueError as exc:
+            raise ValueError(f"слишком большой баланс {currency.code}") from exc
+        wallets[currency.code] = balance
+    return wallets
+
+
+def iter_rows(path: str, fmt: str) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    with open(path, "r", encoding="utf-8", newline="") as file:
+        if fmt == "csv":
+            for line_no, row in enumerate(csv.DictReader(file), start=2):
+                yield line_no, row
+            return
+        for line_no, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                yield line_no, {}
+                continue
+            yield line_no, row if isinstance(row, dict) else {}
+
+
+def _chunks(items: Iterator[Any], size: int) -> Iterator[List[Any]]:
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class _Spool:
+    # проверенные записи до записи в хранилище: JSON Lines во временном
+    # каталоге, по файлу на получателя (пользователи, шард портфелей)
+
+    def __init__(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory(prefix="vt-spool-")
+        self._files: Dict[str, Any] = {}
+
+    def __enter__(self) -> "_Spool":
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        for file in self._files.values():
+            file.close()
+        self._tmp.cleanup()
+
+    def write(self, name: str, record: Any) -> None:
+        file = self._files.get(name)
+        if file is None:
+            spool_path = os.path.join(self._tmp.name, f"{len(self._files)}.jsonl")
+            file = open(spool_path, "w", encoding="utf-8")
+            self._files[name] = file
+        file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def names(self) -> List[str]:
+        return list(self._files)
+
+    def read(self, name: str) -> Iterator[Any]:
+        file = self._files.get(name)
+        if file is None:
+            return
+        file.flush()
+        with open(file.name, "r", encoding="utf-8") as reader:
+            for line in reader:
+                yield json.loads(line)
+
+
+def _hash_batch(pairs: List[Tuple[str, str]]) -> List[str]:
+    return [hash_password(password, salt) for password, salt in pairs]
+
+
+# ---------- импорт ----------
+
+
+def _validate(
+    row: Dict[str, Any],
+    is_taken: Callable[[str], bool],
+) -> Dict[str, Any]:
+    username = str(row.get("username") or "").strip()
+    if not username:
+        raise ValueError("не указано имя пользователя")
+    if is_taken(username):
+        raise ValueError(f"имя '{username}' уже занято")
+
+    password = row.get("password")
+    hashed = row.get("hashed_password")
+    salt = row.get("salt")
+    if password:
+        if len(str(password)) < 4:
+            raise ValueError("пароль короче 4 символов")
+        salt = secrets.token_hex(8)
+    elif not (hashed and salt):
+        # готовые хэш и соль — перенос из выгрузки export-state
+        raise ValueError("нужен password или hashed_password и salt")
+
+    registered = row.get("registration_date")
+    registration_date = (
+        datetime.fromisoformat(registered) if registered else datetime.now()
+    )
+    return {
+        "username": username,
+        "password": str(password) if password else None,
+        "hashed_password": hashed,
+        "salt": str(salt),
+        "registration_date": registration_date.isoformat(),
+        "wallets": _parse_wallets(row.get("wallets")),
+    }
+
+
+USERS_SPOOL = "users"
+
+
+def _commit_import(
+    store: Optional[JsonLinesUsersStore],
+    ledger: TradeLedger,
+    users: List[Dict[str, Any]],
+    spool: _Spool,
+    batch: int,
+) -> None:
+    # каждый файл пишется один раз, порядок как при регистрации и сделках:
+    # пользователи -> журнал -> портфели. Сбой после журнала оставляет
+    # пустые портфели, а начальные балансы восстановит rebuild-portfolios
+    if store is None:
+        users.extend(row["user"] for row in spool.read(USERS_SPOOL))
+        wait_durable(db.submit_many({USERS_FILE: users}))
+    else:
+        for rows in _chunks(spool.read(USERS_SPOOL), batch):
+            store.append([row["user"] for row in rows])
+
+    ledger.extend(
+        {
+            "user_id": row["user"]["user_id"],
+            "action": "IMPORT",
+            "currency": code,
+            "amount_minor": amount_minor,
+            "precision": get_precision(code),
+            "rate": 0.0,
+            "balance_after_minor": amount_minor,
+        }
+        for row in spool.read(USERS_SPOOL)
+        for code, amount_minor in row["balances"].items()
+    )
+
+    # в памяти — один шард за раз
+    for shard_path in spool.names():
+        if shard_path == USERS_SPOOL:
+            continue
+        records = list(db.load_json(shard_path, default=[]))
+        records.extend(spool.read(shard_path))
+        wait_durable(db.submit_many({shard_path: records}))
+
+
+def import_users(
+    path: str,
+    fmt: Optional[str] = None,
+    chunk_size: int = 1000,
+    workers: Optional[int] = None,
+    progress: Optional[ImportProgress] = None,
+) -> ImportReport:
+    fmt = detect_format(path, fmt)
+    workers = workers or int(
+        settings.get("IMPORT_HASH_WORKERS") or os.cpu_count() or 1,
+    )
+    report = ImportReport()
+    store = get_users_store()
+    ledger = get_ledger()
+
+    with users_lock(), portfolios_locked(), _Spool() as spool:
+        if store is None:
+            users = load_users()
+            existing = {user["username"] for user in users}
+            user_id = next_user_id(users)
+        else:
+            # имена проверяются по индексу users.jsonl — в памяти только новые
+            users = []
+            existing = set()
+            user_id = store.next_user_id()
+        imported_names = set()
+
+        def is_taken(username: str) -> bool:
+            if username in existing or username in imported_names:
+                return True
+            return store is not None and store.find_by_username(username) is not None
+
+        pool = ProcessPoolExecutor(workers) if workers > 1 else None
+        try:
+            for chunk in _chunks(iter_rows(path, fmt), chunk_size):
+                valid = []
+                for line_no, row in chunk:
+                    report.processed += 1
+                    try:
+                        record = _validate(row, is_taken)
+                    except (ValueError, CurrencyNotFoundError) as exc:
+                        report.reject(line_no, str(exc))
+                        continue
+                    imported_names.add(record["username"])
+                    valid.append(record)
+
+                # хэширование — единственная работа на CPU: в пул процессов
+                pairs = [
+                    (record["password"], record["salt"])
+                    for record in valid
+                    if record["password"] is not None
+                ]
+                if pool is not None and len(pairs) > workers:
+                    step = -(-len(pairs) // workers)
+                    batches = [pairs[i:i + step] for i in range(0, len(pairs), step)]
+                    hashes = iter(
+                        [
+                            value
+                            for batch in pool.map(_hash_batch, batches)
+                            for value in batch
+                        ],
+                    )
+                else:
+                    hashes = iter(_hash_batch(pairs))
+
+                for record in valid:
+                    if record["password"] is not None:
+                        record["hashed_password"] = next(hashes)
+                    user = {
+                        "user_id": user_id,
+                        "username": record["username"],
+                        "hashed_password": record["hashed_password"],
+                        "salt": record["salt"],
+                        "registration_date": record["registration_date"],
+                    }
+                    balances = {
+                        code: to_minor(balance, get_precision(code))
+                        for code, balance in record["wallets"].items()
+                    }
+                    spool.write(USERS_SPOOL, {"user": user, "balances": balances})
+                    wallets = {
+                        code: {"currency_code": code, "balance": balance}
+                        for code, balance in record["wallets"].items()
+                    }
+                    spool.write(
+                        portfolios_file(user_id),
+                        {"user_id": user_id, "wallets": wallets},
+                    )
+                    user_id += 1
+                    report.imported += 1
+
+                if progress is not None:
+                    progress(report.processed, report.imported, report.rejected)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        # один потоковый проход прочитал вход целиком — теперь запись
+        if report.imported:
+            _commit_import(store, ledger, users, spool, chunk_size)
+    return report
+
+
+# ---------- выгрузка ----------
+
+
+def _iter_users() -> Iterator[Dict[str, Any]]:
+    store = get_users_store()
+    if store is not None:
+        yield from store.iter_records()
+    else:
+        yield from load_users()
+
+
+def export_state(path: str, progress: Optional[ExportProgress] = None) -> int:
+    # пользователи читаются один раз и раскладываются по шардам во временные
+    # файлы; затем по шарду за проход — в памяти портфели одного шарда
+    router = get_router()
+    exported = 0
+    tmp_path = path + ".tmp"
+    with users_lock(), portfolios_locked(), _Spool() as spool:
+        for user in _iter_users():
+            spool.write(router.portfolios_path(user["user_id"]), user)
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            for shard_path in router.portfolios_paths():
+                wallets_by_user = {
+                    record["user_id"]: record.get("wallets", {})
+                    for record in db.load_json(shard_path, default=[])
+                }
+                for user in spool.read(shard_path):
+                    wallets = wallets_by_user.get(user["user_id"], {})
+                    row = {
+                        "username": user["username"],
+                        "hashed_password": user["hashed_password"],
+                        "salt": user["salt"],
+                        "registration_date": user["registration_date"],
+                        "wallets": {
+                            code: wallet.get("balance", 0.0)
+                            for code, wallet in wallets.items()
+                        },
+                    }
+                    file.write(json.dumps(row, ensure_ascii=False) + "\n")
+                    exported += 1
+                    if progress is not None and exported % 10_000 == 0:
+                        progress(exported)
+        os.replace(tmp_path, path)
+    return exported
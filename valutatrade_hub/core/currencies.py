@@ -3,14 +3,16 @@ from __future__ import annotations
 
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from typing import Dict
+from typing import ClassVar, Dict
 
 from .exceptions import CurrencyNotFoundError
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Currency(ABC):
 
+    precision: ClassVar[int] = 8
+
     name: str
     code: str
 
@@ -20,16 +22,18 @@ class Currency(ABC):
         normalized = self.code.upper()
         if not (2 <= len(normalized) <= 5) or " " in normalized:
             raise ValueError("Код валюты должен быть 2–5 символов без пробелов.")
-        self.code = normalized
+        object.__setattr__(self, "code", normalized)
 
     @abstractmethod
     def get_display_info(self) -> str:
         raise NotImplementedError
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class FiatCurrency(Currency):
 
+    precision: ClassVar[int] = 4
+
     issuing_country: str
 
     def get_display_info(self) -> str:
@@ -39,9 +43,11 @@ class FiatCurrency(Currency):
         )
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class CryptoCurrency(Currency):
 
+    precision: ClassVar[int] = 8
+
     algorithm: str
     market_cap: float
 
@@ -81,3 +87,9 @@ def get_currency(code: str) -> Currency:
     except KeyError:
         raise CurrencyNotFoundError(normalized)
 
+
+def get_precision(code: str) -> int:
+    currency = _CURRENCY_REGISTRY.get(code.upper())
+    if currency is None:
+        return Currency.precision
+    return currency.precision
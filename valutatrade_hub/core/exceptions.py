@@ -13,6 +13,13 @@ class InsufficientFundsError(Exception):
         super().__init__(message)
 
 
+class InvalidAmountError(ValueError):
+
+    def __init__(self, reason: str) -> None:
+        self.reason = reason
+        super().__init__(f"Некорректная сумма: {reason}")
+
+
 class CurrencyNotFoundError(Exception):
 
     def __init__(self, code: str) -> None:
@@ -3,13 +3,28 @@ from __future__ import annotations
 
 import hashlib
 from datetime import datetime
-from typing import Dict, Optional
+from types import MappingProxyType
+from typing import Dict, Iterator, Mapping, Optional, Tuple
 
-from .exceptions import InsufficientFundsError
+from .balances import MAX_MINOR, BalanceTable, from_minor, to_minor
+from .exceptions import InsufficientFundsError, InvalidAmountError
+
+
+def hash_password(password: str, salt: str) -> str:
+    value = f"{password}{salt}".encode("utf-8")
+    return hashlib.sha256(value).hexdigest()
 
 
 class User:
 
+    __slots__ = (
+        "_user_id",
+        "_username",
+        "_hashed_password",
+        "_salt",
+        "_registration_date",
+    )
+
     def __init__(
         self,
         user_id: int,
@@ -24,11 +39,28 @@ class User:
         self._salt = salt
         self._registration_date = registration_date
 
+    @classmethod
+    def from_trusted(
+        cls,
+        user_id: int,
+        username: str,
+        hashed_password: str,
+        salt: str,
+        registration_date: datetime,
+    ) -> "User":
+        # данные из хранилища уже прошли проверку при регистрации
+        user = cls.__new__(cls)
+        user._user_id = user_id
+        user._username = username
+        user._hashed_password = hashed_password
+        user._salt = salt
+        user._registration_date = registration_date
+        return user
+
 
     @staticmethod
     def _hash_password(password: str, salt: str) -> str:
-        value = f"{password}{salt}".encode("utf-8")
-        return hashlib.sha256(value).hexdigest()
+        return hash_password(password, salt)
 
 
     @property
@@ -77,13 +109,30 @@ class User:
 
 class Wallet:
 
+    __slots__ = ("_table", "_row", "_col", "currency_code", "_precision")
+
     def __init__(self, currency_code: str, balance: float = 0.0) -> None:
-        self.currency_code = currency_code.upper()
+        table = BalanceTable()
+        row = table.add_row()
+        self._bind(table, row, table.column(currency_code))
         self.balance = balance
 
+    def _bind(self, table: BalanceTable, row: int, col: int) -> None:
+        self._table = table
+        self._row = row
+        self._col = col
+        self.currency_code = table.code(col)
+        self._precision = table.precision(col)
+
+    @classmethod
+    def view(cls, table: BalanceTable, row: int, col: int) -> "Wallet":
+        wallet = cls.__new__(cls)
+        wallet._bind(table, row, col)
+        return wallet
+
     @property
     def balance(self) -> float:
-        return self._balance
+        return from_minor(self.balance_minor, self._precision)
 
     @balance.setter
     def balance(self, value: float) -> None:
@@ -91,38 +140,96 @@ class Wallet:
             raise ValueError("Баланс должен быть числом.")
         if value < 0:
             raise ValueError("Баланс не может быть отрицательным.")
-        self._balance = float(value)
+        self._table.set_minor(
+            self._row,
+            self._col,
+            to_minor(value, self._precision),
+        )
 
+    @property
+    def balance_minor(self) -> int:
+        return self._table.get_minor(self._row, self._col)
 
-    def deposit(self, amount: float) -> None:
+    @property
+    def precision(self) -> int:
+        return self._precision
+
+    def _amount_to_minor(self, amount: float) -> int:
         if amount <= 0:
             raise ValueError("'amount' должен быть положительным числом")
-        self._balance += float(amount)
+        minor = to_minor(amount, self._precision)
+        if minor == 0:
+            raise ValueError(
+                f"'amount' меньше минимальной единицы {self.currency_code} "
+                f"(10^-{self._precision})",
+            )
+        return minor
+
+
+    def deposit(self, amount: float) -> None:
+        minor = self._amount_to_minor(amount)
+        total = self.balance_minor + minor
+        if total > MAX_MINOR:
+            raise InvalidAmountError(
+                f"баланс {self.currency_code} превысит допустимый максимум",
+            )
+        self._table.set_minor(self._row, self._col, total)
 
     def withdraw(self, amount: float) -> None:
-        if amount <= 0:
-            raise ValueError("'amount' должен быть положительным числом")
-        if amount > self._balance:
+        minor = self._amount_to_minor(amount)
+        available = self.balance_minor
+        if minor > available:
             raise InsufficientFundsError(
-                available=self._balance,
+                available=self.balance,
                 required=amount,
                 code=self.currency_code,
             )
-        self._balance -= float(amount)
+        self._table.set_minor(self._row, self._col, available - minor)
 
     def get_balance_info(self) -> str:
-        return f"{self.currency_code}: {self._balance:.4f}"
+        return f"{self.currency_code}: {self.balance:.4f}"
 
 
 class Portfolio:
 
+    __slots__ = ("_user_id", "_table", "_row", "_wallets", "_wallets_view")
+
     def __init__(
         self,
         user_id: int,
         wallets: Optional[Dict[str, Wallet]] = None,
+        table: Optional[BalanceTable] = None,
+        row: Optional[int] = None,
     ) -> None:
         self._user_id = user_id
-        self._wallets: Dict[str, Wallet] = wallets or {}
+        if table is None or row is None:
+            table = BalanceTable()
+            row = table.add_row()
+        self._table = table
+        self._row = row
+        self._wallets: Optional[Dict[str, Wallet]] = None
+        self._wallets_view: Optional[Mapping[str, Wallet]] = None
+        for code, wallet in (wallets or {}).items():
+            col = table.column(code)
+            table.set_minor(row, col, to_minor(wallet.balance, table.precision(col)))
+
+    @classmethod
+    def from_table(cls, user_id: int, table: BalanceTable, row: int) -> "Portfolio":
+        portfolio = cls.__new__(cls)
+        portfolio._user_id = user_id
+        portfolio._table = table
+        portfolio._row = row
+        portfolio._wallets = None
+        portfolio._wallets_view = None
+        return portfolio
+
+    def _wallet_views(self) -> Dict[str, Wallet]:
+        if self._wallets is None:
+            self._wallets = {
+                self._table.code(col): Wallet.view(self._table, self._row, col)
+                for col in self._table.row_columns(self._row)
+            }
+        return self._wallets
 
 
     @property
@@ -130,20 +237,30 @@ class Portfolio:
         return self._user_id
 
     @property
-    def wallets(self) -> Dict[str, Wallet]:
-        return dict(self._wallets)
+    def wallets(self) -> Mapping[str, Wallet]:
+        # представление только для чтения создаётся один раз и видит
+        # кошельки, добавленные позже через add_currency
+        if self._wallets_view is None:
+            self._wallets_view = MappingProxyType(self._wallet_views())
+        return self._wallets_view
 
 
     def add_currency(self, currency_code: str) -> Wallet:
         code = currency_code.upper()
-        if code in self._wallets:
+        wallets = self._wallet_views()
+        if code in wallets:
             raise ValueError(f"Кошелёк '{code}' уже существует.")
-        wallet = Wallet(code, 0.0)
-        self._wallets[code] = wallet
+        col = self._table.column(code)
+        self._table.set_minor(self._row, col, 0)
+        wallet = Wallet.view(self._table, self._row, col)
+        wallets[code] = wallet
         return wallet
 
     def get_wallet(self, currency_code: str) -> Optional[Wallet]:
-        return self._wallets.get(currency_code.upper())
+        return self._wallet_views().get(currency_code.upper())
+
+    def iter_balances(self) -> Iterator[Tuple[str, float]]:
+        return self._table.row_amounts(self._row)
 
     def get_total_value(
         self,
@@ -155,14 +272,14 @@ class Portfolio:
             raise ValueError(f"Неизвестная базовая валюта '{base}'")
 
         total = 0.0
-        for code, wallet in self._wallets.items():
+        for code, balance in self.iter_balances():
             if code == base:
-                total += wallet.balance
+                total += balance
             else:
                 pair = f"{code}_{base}"
                 rate = exchange_rates.get(pair)
                 if rate is None:
                     continue
-                total += wallet.balance * rate
+                total += balance * rate
         return total
 
@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass, replace
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from valutatrade_hub.infra.rates_shm import (
+    SharedRatesSnapshot,
+    SharedRatesUnavailable,
+    open_rates_shm,
+    segment_name_for,
+)
+from valutatrade_hub.infra.rates_snapshot import (
+    MappedRatesSnapshot,
+    open_rates_snapshot,
+)
+from valutatrade_hub.infra.settings import SettingsLoader
+from valutatrade_hub.logging_config import get_logger
+
+from .utils import RATES_BINARY_FILE, load_rates
+
+settings = SettingsLoader()
+
+
+@dataclass(frozen=True)
+class RatesView:
+
+    last_refresh: str
+    pairs: Any
+    loaded_at: float
+
+    def get(self, pair: str) -> Optional[Tuple[float, str]]:
+        return self.pairs.get(pair)
+
+    def items(self) -> Iterable[Tuple[str, Tuple[float, str]]]:
+        return self.pairs.items()
+
+    def age_seconds(self) -> Optional[float]:
+        if not self.last_refresh:
+            return None
+        try:
+            last_refresh = datetime.fromisoformat(
+                self.last_refresh.replace("Z", "+00:00"),
+            )
+        except ValueError:
+            return None
+        return (datetime.now(timezone.utc) - last_refresh).total_seconds()
+
+
+_shared: Optional[SharedRatesSnapshot] = None
+_shared_lock = threading.Lock()
+# после сбоя чтения общая память не используется до этого момента
+_shared_retry_at = 0.0
+SHARED_RETRY_SECONDS = 30.0
+
+
+def _shared_snapshot() -> Optional[SharedRatesSnapshot]:
+    global _shared
+    if not settings.get("RATES_SHM_ENABLED", True):
+        return None
+    if _shared is None:
+        if time.monotonic() < _shared_retry_at:
+            return None
+        with _shared_lock:
+            if _shared is None:
+                _shared = open_rates_shm(segment_name_for(RATES_BINARY_FILE))
+    return _shared
+
+
+def _drop_shared() -> None:
+    # писатель упал посреди записи: сегмент остаётся «недописанным»,
+    # пока обновлятель не опубликует курсы заново
+    global _shared, _shared_retry_at
+    with _shared_lock:
+        if _shared is not None:
+            _shared.close()
+            _shared = None
+        _shared_retry_at = time.monotonic() + SHARED_RETRY_SECONDS
+    get_logger().warning("Shared rates segment is unreadable, using rates files")
+
+
+def _load_view() -> RatesView:
+    # общая память: курсы копируются за одно согласованное чтение — вид
+    # не меняется, пока его держат, даже если обновлятель перепишет сегмент
+    shared = _shared_snapshot()
+    if shared is not None:
+        try:
+            last_refresh, pairs = shared.copy()
+            return RatesView(last_refresh, pairs, time.monotonic())
+        except SharedRatesUnavailable:
+            _drop_shared()
+    return _load_file_view()
+
+
+def _load_file_view() -> RatesView:
+    snapshot = open_rates_snapshot(RATES_BINARY_FILE)
+    if snapshot is not None:
+        return RatesView(snapshot.last_refresh, snapshot, time.monotonic())
+
+    rates = load_rates()
+    pairs: Dict[str, Tuple[float, str]] = {}
+    for pair, record in rates.get("pairs", {}).items():
+        if isinstance(record, dict) and "rate" in record:
+            pairs[pair] = (float(record["rate"]), record.get("updated_at", ""))
+    return RatesView(rates.get("last_refresh", ""), pairs, time.monotonic())
+
+
+def _run_default_update() -> None:
+    # импорт внутри функции: parser_service сам зависит от core
+    from valutatrade_hub.parser_service.updater import build_default_updater
+
+    build_default_updater().run_update()
+
+
+class RateCache:
+
+    def __init__(
+        self,
+        loader: Callable[[], RatesView] = _load_view,
+        refresher: Callable[[], None] = _run_default_update,
+    ) -> None:
+        self._loader = loader
+        self._refresher = refresher
+        self._view: Optional[RatesView] = None
+        self._lock = threading.Lock()
+        self._refresh_thread: Optional[threading.Thread] = None
+        self._last_attempt: Optional[float] = None
+
+    def invalidate(self) -> None:
+        self._view = None
+
+    def get_view(self) -> RatesView:
+        view = self._view
+        cache_ttl = float(settings.get("RATES_CACHE_TTL_SECONDS", 5))
+        if view is None or time.monotonic() - view.loaded_at > cache_ttl:
+            view = self._reload(view)
+            self._view = view
+        return view
+
+    def _reload(self, view: Optional[RatesView]) -> RatesView:
+        # rates.bin не переписывался: прежний mmap верен, хватает заголовка
+        if (
+            view is not None
+            and isinstance(view.pairs, MappedRatesSnapshot)
+            and view.pairs.is_current()
+        ):
+            return replace(view, loaded_at=time.monotonic())
+        return self._loader()
+
+    def is_stale(self, view: RatesView) -> bool:
+        age = view.age_seconds()
+        if age is None:
+            return False
+        return age > float(settings.get("RATES_TTL_SECONDS", 31536000))
+
+    def trigger_refresh(self) -> bool:
+        with self._lock:
+            thread = self._refresh_thread
+            if thread is not None and thread.is_alive():
+                return False
+            retry_after = float(settings.get("RATES_REFRESH_RETRY_SECONDS", 60))
+            now = time.monotonic()
+            if (
+                self._last_attempt is not None
+                and now - self._last_attempt < retry_after
+            ):
+                return False
+            self._last_attempt = now
+            thread = threading.Thread(
+                target=self._refresh_in_background,
+                name="rates-refresh",
+                daemon=True,
+            )
+            self._refresh_thread = thread
+        thread.start()
+        return True
+
+    def wait_refresh(self, timeout: Optional[float] = None) -> None:
+        thread = self._refresh_thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def _refresh_in_background(self) -> None:
+        logger = get_logger()
+        try:
+            self._refresher()
+        except Exception as exc:  # noqa: BLE001
+            logger.error("Background rates refresh failed: %s", exc)
+            return
+        self.invalidate()
+
+
+rate_cache = RateCache()
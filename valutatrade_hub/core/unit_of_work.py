@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+from contextlib import ExitStack
+from typing import Any, Dict, List, Optional, Tuple
+
+from valutatrade_hub.infra.warm_start import Index
+
+from .balances import BalanceTable
+from .models import Portfolio, User
+from .rate_cache import RatesView, rate_cache
+from .utils import (
+    USERS_FILE,
+    db,
+    find_portfolio_record,
+    find_user_by_username,
+    get_users_store,
+    load_users,
+    load_users_indexed,
+    next_user_id,
+    portfolio_from_record,
+    portfolio_to_record,
+    portfolios_file,
+    portfolios_locked,
+    user_from_record,
+    user_to_record,
+    users_lock,
+    wait_durable,
+)
+
+Records = List[Dict[str, Any]]
+
+
+class UnitOfWork:
+
+    def __init__(self) -> None:
+        self._users: Optional[Records] = None
+        self._users_version = 0
+        # индексы позиций из снимка warm-start: только для записей, прочитанных
+        # из него, после фиксации не нужны
+        self._users_index: Optional[Index] = None
+        # записи и версия каждого загруженного файла-шарда портфелей
+        self._shards: Dict[str, Tuple[Records, int]] = {}
+        self._shard_indexes: Dict[str, Index] = {}
+        # одна таблица балансов на шард: портфели — её строки, а не
+        # отдельная таблица на каждого пользователя
+        self._tables: Dict[str, BalanceTable] = {}
+        # карта идентичности: один объект на пользователя/портфель за операцию
+        self._user_objects: Dict[str, User] = {}
+        self._portfolios: Dict[int, Tuple[Portfolio, Optional[Dict[str, Any]]]] = {}
+        self._new_users: Records = []
+        self._rates: Optional[RatesView] = None
+
+    def __enter__(self) -> "UnitOfWork":
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        if exc_type is None:
+            self.commit()
+
+    # ---------- пользователи ----------
+
+    def _user_records(self) -> Records:
+        if self._users is None:
+            self._users_version = db.version(USERS_FILE)
+            self._users, self._users_index = load_users_indexed()
+        return self._users
+
+    def get_user(self, username: str) -> Optional[User]:
+        user = self._user_objects.get(username)
+        if user is not None:
+            return user
+        store = get_users_store()
+        if store is not None:
+            # строка одного пользователя по индексу, без чтения всех
+            record = store.find_by_username(username)
+        else:
+            records = self._user_records()
+            record = find_user_by_username(records, username, self._users_index)
+        if record is None:
+            record = find_user_by_username(self._new_users, username)
+        if record is None:
+            return None
+        user = user_from_record(record)
+        self._user_objects[username] = user
+        return user
+
+    def next_user_id(self) -> int:
+        store = get_users_store()
+        if store is not None:
+            return max(store.next_user_id(), next_user_id(self._new_users))
+        return next_user_id(self._user_records() + self._new_users)
+
+    def add_user(self, user: User) -> None:
+        self._new_users.append(user_to_record(user))
+        self._user_objects[user.username] = user
+
+    # ---------- портфели ----------
+
+    def _records(self, path: str) -> Tuple[Records, int]:
+        loaded = self._shards.get(path)
+        if loaded is None:
+            version = db.version(path)
+            records, index = db.load_indexed(path, default=[])
+            loaded = (records, version)
+            self._shards[path] = loaded
+            if index is not None:
+                self._shard_indexes[path] = index
+        return loaded
+
+    def get_portfolio(self, user_id: int) -> Portfolio:
+        cached = self._portfolios.get(user_id)
+        if cached is not None:
+            return cached[0]
+        path = portfolios_file(user_id)
+        records, _version = self._records(path)
+        record = find_portfolio_record(
+            records,
+            user_id,
+            self._shard_indexes.get(path),
+        )
+        table = self._tables.get(path)
+        if table is None:
+            table = self._tables[path] = BalanceTable()
+        if record is None:
+            portfolio = Portfolio.from_table(user_id, table, table.add_row())
+        else:
+            portfolio = portfolio_from_record(record, table)
+        self._portfolios[user_id] = (portfolio, record)
+        return portfolio
+
+    def add_portfolio(self, portfolio: Portfolio) -> None:
+        self._portfolios[portfolio.user_id] = (portfolio, None)
+
+    # ---------- курсы ----------
+
+    @property
+    def rates(self) -> RatesView:
+        # один снимок курсов на всю операцию
+        if self._rates is None:
+            self._rates = rate_cache.get_view()
+        return self._rates
+
+    # ---------- фиксация ----------
+
+    def _dirty_portfolios(self) -> Records:
+        dirty = []
+        for portfolio, original in self._portfolios.values():
+            record = portfolio_to_record(portfolio)
+            if original is None or record != original:
+                dirty.append(record)
+        return dirty
+
+    def commit(self) -> None:
+        dirty = self._dirty_portfolios()
+        if not dirty and not self._new_users:
+            return
+
+        by_shard: Dict[str, Records] = {}
+        for record in dirty:
+            by_shard.setdefault(portfolios_file(record["user_id"]), []).append(record)
+
+        files: Dict[str, Any] = {}
+        with ExitStack() as stack:
+            # порядок блокировок: users → шарды портфелей (как в use cases)
+            if self._new_users:
+                stack.enter_context(users_lock())
+                store = get_users_store()
+                if store is not None:
+                    # строки пользователей дописываются до портфелей: при сбое
+                    # между ними у пользователя просто пустой портфель
+                    store.append(self._new_users)
+                else:
+                    users = self._user_records()
+                    if db.version(USERS_FILE) != self._users_version:
+                        users = load_users()
+                    files[USERS_FILE] = users + self._new_users
+
+            stack.enter_context(portfolios_locked(by_shard))
+            for path, shard_dirty in by_shard.items():
+                records, version = self._records(path)
+                if db.version(path) != version:
+                    # файл успел измениться: применяем свои записи поверх свежих
+                    records = db.load_json(path, default=[])
+                merged = list(records)
+                positions = {
+                    record["user_id"]: idx for idx, record in enumerate(merged)
+                }
+                for record in shard_dirty:
+                    idx = positions.get(record["user_id"])
+                    if idx is None:
+                        merged.append(record)
+                    else:
+                        merged[idx] = record
+                files[path] = merged
+
+            ticket = db.submit_many(files)
+        wait_durable(ticket)
+
+        if USERS_FILE in files:
+            self._users = files[USERS_FILE]
+            self._users_version = ticket
+            self._users_index = None
+        self._new_users = []
+        for path in by_shard:
+            self._shards[path] = (files[path], ticket)
+            self._shard_indexes.pop(path, None)
+        self._portfolios = {
+            user_id: (portfolio, portfolio_to_record(portfolio))
+            for user_id, (portfolio, _original) in self._portfolios.items()
+        }
@@ -1,28 +1,38 @@
 
 from __future__ import annotations
 
+import math
+import os
 import secrets
-from datetime import datetime, timezone
-from typing import Dict, Optional, Tuple
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
 
 from valutatrade_hub.decorators import log_action
+from valutatrade_hub.infra.audit import AuditIndex
+from valutatrade_hub.infra.ledger import TradeLedger
+from valutatrade_hub.infra.rates_snapshot import iso_to_micros, micros_to_iso
 from valutatrade_hub.infra.settings import SettingsLoader
 
-from .currencies import get_currency
-from .exceptions import ApiRequestError
+from .balances import from_minor, to_minor
+from .currencies import get_currency, get_precision
+from .exceptions import ApiRequestError, InvalidAmountError
 from .models import Portfolio, User
+from .rate_cache import RatesView, rate_cache
+from .unit_of_work import UnitOfWork
 from .utils import (
-    find_portfolio_record,
-    find_user_by_username,
+    build_warm_start,
+    configured_router,
+    drop_warm_start,
+    get_ledger,
+    get_router,
+    get_users_store,
     load_portfolios,
-    load_rates,
-    load_users,
-    next_user_id,
-    portfolio_from_record,
-    portfolio_to_record,
+    portfolios_locked,
+    rebalance_shards,
     save_portfolios,
-    save_users,
-    user_from_record,
+    shard_distribution,
+    user_lock,
+    users_lock,
 )
 
 settings = SettingsLoader()
@@ -33,38 +43,23 @@ def register_user(username: str, password: str) -> str:
     if len(password) < 4:
         return "Пароль должен быть не короче 4 символов"
 
-    users = load_users()
-    if find_user_by_username(users, username) is not None:
-        return f"Имя пользователя '{username}' уже занято"
-
-    user_id = next_user_id(users)
-    salt = secrets.token_hex(8)
-    tmp_user = User(
-        user_id=user_id,
-        username=username,
-        hashed_password="",
-        salt=salt,
-        registration_date=datetime.now(),
-    )
-    tmp_user.change_password(password)
-
-    record = {
-        "user_id": user_id,
-        "username": username,
-        "hashed_password": tmp_user.hashed_password,
-        "salt": salt,
-        "registration_date": tmp_user.registration_date.isoformat(),
-    }
-    users.append(record)
-    save_users(users)
-
-    portfolios = load_portfolios()
-    portfolio_record = {
-        "user_id": user_id,
-        "wallets": {},
-    }
-    portfolios.append(portfolio_record)
-    save_portfolios(portfolios)
+    # users.json и portfolios.json фиксируются одной атомарной группой;
+    # с USERS_STORE=jsonl строка пользователя дописывается перед портфелем
+    with users_lock(), UnitOfWork() as uow:
+        if uow.get_user(username) is not None:
+            return f"Имя пользователя '{username}' уже занято"
+
+        user_id = uow.next_user_id()
+        user = User(
+            user_id=user_id,
+            username=username,
+            hashed_password="",
+            salt=secrets.token_hex(8),
+            registration_date=datetime.now(),
+        )
+        user.change_password(password)
+        uow.add_user(user)
+        uow.add_portfolio(Portfolio(user_id=user_id, wallets={}))
 
     return (
         f"Пользователь '{username}' зарегистрирован (id={user_id}). "
@@ -73,12 +68,10 @@ def register_user(username: str, password: str) -> str:
 
 
 def login_user(username: str, password: str) -> Tuple[Optional[User], str]:
-    users = load_users()
-    record = find_user_by_username(users, username)
-    if record is None:
+    user = UnitOfWork().get_user(username)
+    if user is None:
         return None, f"Пользователь '{username}' не найден"
 
-    user = user_from_record(record)
     if not user.verify_password(password):
         return None, "Неверный пароль"
 
@@ -86,45 +79,28 @@ def login_user(username: str, password: str) -> Tuple[Optional[User], str]:
 
 
 def load_user_portfolio(user: User) -> Portfolio:
-    portfolios = load_portfolios()
-    record = find_portfolio_record(portfolios, user.user_id)
-    if record is None:
-        portfolio = Portfolio(user_id=user.user_id, wallets={})
-        portfolios.append(portfolio_to_record(portfolio))
-        save_portfolios(portfolios)
-        return portfolio
-    return portfolio_from_record(record)
+    with UnitOfWork() as uow:
+        return uow.get_portfolio(user.user_id)
 
 
 def save_user_portfolio(portfolio: Portfolio) -> None:
-    portfolios = load_portfolios()
-    record = find_portfolio_record(portfolios, portfolio.user_id)
-    new_record = portfolio_to_record(portfolio)
-
-    if record is None:
-        portfolios.append(new_record)
-    else:
-        idx = portfolios.index(record)
-        portfolios[idx] = new_record
-
-    save_portfolios(portfolios)
+    with UnitOfWork() as uow:
+        uow.add_portfolio(portfolio)
 
 
 def show_portfolio(user: User, base_currency: str = "USD") -> str:
-    portfolio = load_user_portfolio(user)
+    with UnitOfWork() as uow:
+        portfolio = uow.get_portfolio(user.user_id)
     wallets = portfolio.wallets
 
     if not wallets:
         return f"Портфель пользователя '{user.username}' пуст."
 
     base = base_currency.upper()
-    rates = load_rates()
     exchange_rates: Dict[str, float] = {}
-    for key, value in rates.items():
-        if key.endswith("_USD") and isinstance(value, dict):
-            rate = value.get("rate")
-            if isinstance(rate, (int, float)):
-                exchange_rates[key] = float(rate)
+    for key, (rate, _updated_at) in uow.rates.items():
+        if key.endswith("_USD"):
+            exchange_rates[key] = rate
 
     try:
         total = portfolio.get_total_value(exchange_rates, base_currency=base)
@@ -152,88 +128,113 @@ def show_portfolio(user: User, base_currency: str = "USD") -> str:
     return "\n".join(lines)
 
 
-def get_rate_pair(from_code: str, to_code: str) -> Tuple[Optional[float], str]:
+def get_rate_pair(
+    from_code: str,
+    to_code: str,
+    view: Optional[RatesView] = None,
+) -> Tuple[Optional[float], str]:
     get_currency(from_code)
     get_currency(to_code)
 
     from_c = from_code.upper()
     to_c = to_code.upper()
 
-    rates = load_rates()
-    ttl = settings.get("RATES_TTL_SECONDS", 31536000)
+    view = view if view is not None else rate_cache.get_view()
+    stale = rate_cache.is_stale(view)
+    if stale:
+        rate_cache.trigger_refresh()
+    note = ", кеш устарел — идёт обновление" if stale else ""
 
-    last_refresh_str = rates.get("last_refresh")
-    if last_refresh_str:
-        try:
-            last_refresh = datetime.fromisoformat(
-                last_refresh_str.replace("Z", "+00:00"),
-            )
-            now_utc = datetime.now(timezone.utc)
-            age_seconds = (now_utc - last_refresh).total_seconds()
-            if age_seconds > float(ttl):
-                raise ApiRequestError("источник курсов недоступен (кеш устарел)")
-        except ValueError:
-            pass
-
-    pairs = rates.get("pairs", {})
-
-    direct_key = f"{from_c}_{to_c}"
-    record = pairs.get(direct_key)
-    if isinstance(record, dict) and "rate" in record:
-        rate = float(record["rate"])
-        updated_at = record.get("updated_at", "")
+    direct = view.get(f"{from_c}_{to_c}")
+    if direct is not None:
+        rate, updated_at = direct
         msg = (
             f"Курс {from_c}→{to_c}: {rate:.8f} "
-            f"(обновлено: {updated_at})"
+            f"(обновлено: {updated_at}{note})"
         )
         return rate, msg
 
-    reverse_key = f"{to_c}_{from_c}"
-    record = pairs.get(reverse_key)
-    if isinstance(record, dict) and "rate" in record:
-        rev_rate = float(record["rate"])
+    reverse = view.get(f"{to_c}_{from_c}")
+    if reverse is not None:
+        rev_rate, updated_at = reverse
         if rev_rate == 0:
             raise ApiRequestError("получен нулевой курс из кеша")
         rate = 1.0 / rev_rate
-        updated_at = record.get("updated_at", "")
         msg = (
             f"Курс {from_c}→{to_c}: {rate:.8f} "
-            f"(обновлено: {updated_at})"
+            f"(обновлено: {updated_at}{note})"
         )
         return rate, msg
 
     return None, f"Курс {from_c}→{to_c} недоступен. Повторите попытку позже."
 
 
-    
+def quantize_amount(amount: float, code: str) -> float:
+    # сумма приводится к точности валюты до расчёта цены: в кошелёк,
+    # журнал и сообщение попадает одно и то же число
+    if not math.isfinite(amount) or amount <= 0:
+        raise InvalidAmountError("'amount' должен быть положительным числом")
+    precision = get_precision(code)
+    try:
+        minor = to_minor(amount, precision)
+    except ValueError as exc:
+        # больше int64 в минорных единицах таблица балансов не хранит
+        raise InvalidAmountError(f"'amount' слишком велик для {code}") from exc
+    if minor == 0:
+        raise InvalidAmountError(
+            f"'amount' меньше минимальной единицы {code} (10^-{precision})",
+        )
+    return from_minor(minor, precision)
+
+
+def _commit_trade(uow: UnitOfWork, ledger: TradeLedger, entry: Dict[str, Any]) -> None:
+    try:
+        uow.commit()
+    except BaseException:
+        # портфель не записан — сделка отменяется сторно в журнале
+        ledger.void(entry)
+        raise
+
+
 @log_action("BUY")
 def buy_currency(
     user: User,
     currency_code: str,
     amount: float,
 ) -> str:
-    if amount <= 0:
-        raise ValueError("'amount' должен быть положительным числом")
-
-    get_currency(currency_code)
-
-    code = currency_code.upper()
-    portfolio = load_user_portfolio(user)
-    wallet = portfolio.get_wallet(code)
-    if wallet is None:
-        wallet = portfolio.add_currency(code)
-
-    rate, _msg = get_rate_pair(code, "USD")
-    if rate is None:
-        raise ApiRequestError(f"Не удалось получить курс для {code}→USD")
-
-    before = wallet.balance
-    wallet.deposit(amount)
-    after = wallet.balance
+    code = get_currency(currency_code).code
+    amount = quantize_amount(amount, code)
+    ledger = get_ledger()
+    with user_lock(user.user_id):
+        uow = UnitOfWork()
+        rate, _msg = get_rate_pair(code, "USD", uow.rates)
+        if rate is None:
+            raise ApiRequestError(f"Не удалось получить курс для {code}→USD")
+
+        portfolio = uow.get_portfolio(user.user_id)
+        wallet = portfolio.get_wallet(code)
+        if wallet is None:
+            wallet = portfolio.add_currency(code)
+
+        before_minor = wallet.balance_minor
+        before = wallet.balance
+        wallet.deposit(amount)
+        after = wallet.balance
+
+        # журнал пишется раньше портфеля: после сбоя между ними
+        # rebuild-portfolios досчитает сделку, а не потеряет её
+        entry = ledger.append(
+            user_id=user.user_id,
+            action="BUY",
+            currency=code,
+            amount_minor=wallet.balance_minor - before_minor,
+            precision=wallet.precision,
+            rate=rate,
+            balance_after_minor=wallet.balance_minor,
+        )
+        _commit_trade(uow, ledger, entry)
     estimated_cost = amount * rate
 
-    save_user_portfolio(portfolio)
-
     return (
         f"Покупка выполнена: {amount:.4f} {code} по курсу {rate:.2f} USD/{code}\n"
         f"Изменения в портфеле:\n"
@@ -251,31 +252,40 @@ def sell_currency(
     currency_code: str,
     amount: float,
 ) -> str:
-    if amount <= 0:
-        raise ValueError("'amount' должен быть положительным числом")
-
-    get_currency(currency_code)
-
-    code = currency_code.upper()
-    portfolio = load_user_portfolio(user)
-    wallet = portfolio.get_wallet(code)
-    if wallet is None:
-        return (
-            f"У вас нет кошелька '{code}'. Добавьте валюту: "
-            "она создаётся автоматически при первой покупке."
-        )
-
-    rate, _msg = get_rate_pair(code, "USD")
-    if rate is None:
-        raise ApiRequestError(f"Не удалось получить курс для {code}→USD")
+    code = get_currency(currency_code).code
+    amount = quantize_amount(amount, code)
+    ledger = get_ledger()
+    with user_lock(user.user_id):
+        uow = UnitOfWork()
+        portfolio = uow.get_portfolio(user.user_id)
+        wallet = portfolio.get_wallet(code)
+        if wallet is None:
+            return (
+                f"У вас нет кошелька '{code}'. Добавьте валюту: "
+                "она создаётся автоматически при первой покупке."
+            )
 
-    before = wallet.balance
-    wallet.withdraw(amount)
-    after = wallet.balance
+        rate, _msg = get_rate_pair(code, "USD", uow.rates)
+        if rate is None:
+            raise ApiRequestError(f"Не удалось получить курс для {code}→USD")
+
+        before_minor = wallet.balance_minor
+        before = wallet.balance
+        wallet.withdraw(amount)
+        after = wallet.balance
+
+        entry = ledger.append(
+            user_id=user.user_id,
+            action="SELL",
+            currency=code,
+            amount_minor=before_minor - wallet.balance_minor,
+            precision=wallet.precision,
+            rate=rate,
+            balance_after_minor=wallet.balance_minor,
+        )
+        _commit_trade(uow, ledger, entry)
     revenue = amount * rate
 
-    save_user_portfolio(portfolio)
-
     return (
         f"Продажа выполнена: {amount:.4f} {code} по курсу {rate:.2f} USD/{code}\n"
         f"Изменения в портфеле:\n"
@@ -283,3 +293,161 @@ def sell_currency(
         f"Оценочная выручка: {revenue:,.2f} USD".replace(",", " ")
     )
 
+
+def get_trade_history(user: User, limit: Optional[int] = 20) -> str:
+    entries = get_ledger().user_entries(user.user_id, limit=limit)
+    if not entries:
+        return f"История сделок пользователя '{user.username}' пуста."
+
+    lines = [f"История сделок пользователя '{user.username}':"]
+    for entry in entries:
+        precision = entry["precision"]
+        amount = from_minor(entry["amount_minor"], precision)
+        balance = from_minor(entry["balance_after_minor"], precision)
+        lines.append(
+            f"#{entry['seq']} {entry['timestamp']} {entry['action']} "
+            f"{amount:.4f} {entry['currency']} по курсу {entry['rate']:.2f} USD "
+            f"(баланс: {balance:.4f})",
+        )
+    return "\n".join(lines)
+
+
+def rebuild_portfolios() -> str:
+    with portfolios_locked():
+        return _rebuild_portfolios_locked()
+
+
+def _rebuild_portfolios_locked() -> str:
+    seq, balances = get_ledger().replay()
+    portfolios = load_portfolios()
+    known = {record["user_id"] for record in portfolios}
+    for user_id in balances:
+        if user_id not in known:
+            portfolios.append({"user_id": user_id, "wallets": {}})
+
+    for record in portfolios:
+        wallets = balances.get(record["user_id"], {})
+        record["wallets"] = {
+            code: {
+                "currency_code": code,
+                "balance": from_minor(minor, get_precision(code)),
+            }
+            for code, minor in wallets.items()
+        }
+    save_portfolios(portfolios)
+    return (
+        f"Портфели восстановлены из журнала сделок "
+        f"(seq={seq}, пользователей: {len(portfolios)})."
+    )
+
+
+def _audit_time(value: Optional[str]) -> Optional[int]:
+    if not value:
+        return None
+    try:
+        return iso_to_micros(value)
+    except ValueError as exc:
+        raise ValueError(f"Некорректная дата '{value}', ожидается ISO 8601") from exc
+
+
+def query_audit(
+    username: Optional[str] = None,
+    action: Optional[str] = None,
+    currency: Optional[str] = None,
+    result: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    days: Optional[float] = None,
+    limit: Optional[int] = 50,
+    rebuild: bool = False,
+) -> str:
+    index = AuditIndex()
+    if rebuild:
+        index.rebuild()
+
+    if result is not None and result.lower() not in ("ok", "error"):
+        raise ValueError("'--result' должен быть ok или error")
+    if days is not None and since is None:
+        # время в логе записывается локальное, без часового пояса
+        since = (datetime.now() - timedelta(days=days)).isoformat()
+
+    entries = index.query(
+        user=username,
+        action=action,
+        currency=currency,
+        ok=None if result is None else result.lower() == "ok",
+        since=_audit_time(since),
+        until=_audit_time(until),
+        limit=limit,
+    )
+    if not entries:
+        return "Записей аудита не найдено."
+
+    lines = [f"Записи аудита ({len(entries)}):"]
+    details = index.read_lines([entry for entry in entries if not entry.ok])
+    errors = iter(details)
+    for entry in entries:
+        amount = "-" if entry.amount is None else f"{entry.amount:.4f}"
+        line = (
+            f"{micros_to_iso(entry.timestamp).removesuffix('Z')} {entry.action} "
+            f"user={entry.user or '-'} {amount} {entry.currency or '-'} "
+            f"{'OK' if entry.ok else 'ERROR'}"
+        )
+        if not entry.ok:
+            detail = next(errors)
+            if detail is not None and detail["error"]:
+                line += f": {detail['error_type']}: {detail['error']}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def rebuild_users_index() -> str:
+    store = get_users_store()
+    if store is None:
+        return "Пользователи хранятся в users.json — индекс не используется."
+    with users_lock():
+        count = store.rebuild_index()
+    return f"Индекс пользователей перестроен: {count} записей."
+
+
+def warm_start(drop: bool = False) -> str:
+    if drop:
+        if drop_warm_start():
+            return "Снимок для быстрого запуска удалён."
+        return "Снимка для быстрого запуска нет."
+    count = build_warm_start()
+    message = f"Снимок для быстрого запуска записан: файлов {count}."
+    if not settings.get("WARM_START_ENABLED", True):
+        message += " Чтение снимка отключено (VALUTATRADE_WARM_START=0)."
+    return message
+
+
+def show_shards() -> str:
+    distribution = shard_distribution()
+    total = sum(distribution.values())
+    lines = [f"Шарды портфелей ({len(distribution)}, портфелей: {total}):"]
+    for path, count in distribution.items():
+        share = count / total if total else 0.0
+        lines.append(f"- {path}: {count} ({share:.0%})")
+    return "\n".join(lines)
+
+
+def rebalance_portfolio_shards(
+    add: Optional[List[str]] = None,
+    remove: Optional[List[str]] = None,
+) -> str:
+    if add or remove:
+        shards = list(get_router().shards)
+        shards.extend(os.path.abspath(path) for path in add or [])
+        removed = {os.path.abspath(path) for path in remove or []}
+        shards = [shard for shard in shards if shard not in removed]
+    else:
+        shards = list(configured_router().shards)
+    if not shards:
+        return "Нельзя удалить все шарды."
+
+    moved, total = rebalance_shards(shards)
+    return (
+        f"Ребалансировка завершена: перенесено {moved} из {total} портфелей, "
+        f"шардов: {len(dict.fromkeys(shards))}."
+    )
@@ -1,29 +1,126 @@
 from __future__ import annotations
 
+import threading
+from contextlib import ExitStack, contextmanager
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 from valutatrade_hub.infra.database import DatabaseManager
+from valutatrade_hub.infra.ledger import Balances, TradeLedger
 from valutatrade_hub.infra.settings import SettingsLoader
+from valutatrade_hub.infra.sharding import ShardRouter, layout_record, load_layout
+from valutatrade_hub.infra.users_store import JsonLinesUsersStore
+from valutatrade_hub.infra.warm_start import (
+    Index,
+    remove_warm_start,
+    write_warm_start,
+)
 
-from .models import Portfolio, User, Wallet
+from .balances import BalanceTable, to_minor
+from .models import Portfolio, User
 
 settings = SettingsLoader()
 db = DatabaseManager()
 
 DATA_DIR = settings.get("DATA_DIR")
 USERS_FILE = f"{DATA_DIR}/users.json"
-PORTFOLIOS_FILE = f"{DATA_DIR}/portfolios.json"
+USERS_JSONL_FILE = f"{DATA_DIR}/users.jsonl"
 RATES_FILE = f"{DATA_DIR}/rates.json"
+RATES_BINARY_FILE = f"{DATA_DIR}/rates.bin"
+SHARD_LAYOUT_FILE = f"{DATA_DIR}/shards.json"
+WARM_START_FILE = settings.get("WARM_START_FILE")
 
+_ledger: Optional[TradeLedger] = None
+_ledger_lock = threading.Lock()
+_users_store: Optional[JsonLinesUsersStore] = None
+_users_store_lock = threading.Lock()
 
 
 
+
+def configured_router() -> ShardRouter:
+    shards = settings.get("DATA_SHARDS") or [DATA_DIR]
+    return ShardRouter(shards, int(settings.get("SHARD_VNODES", 128)))
+
+
+# раскладка из shards.json важнее настроек: она меняется только ребалансировкой
+_router = load_layout(SHARD_LAYOUT_FILE) or configured_router()
+
+
+def get_router() -> ShardRouter:
+    return _router
+
+
+def portfolios_file(user_id: int) -> str:
+    return _router.portfolios_path(user_id)
+
+
+
+
+def users_lock() -> threading.RLock:
+    return db.lock(USERS_FILE)
+
+
+def portfolios_lock(path: str) -> threading.RLock:
+    return db.lock(path)
+
+
+@contextmanager
+def portfolios_locked(paths: Optional[Iterable[str]] = None) -> Iterator[None]:
+    # несколько шардов блокируются в одном порядке — без взаимных блокировок
+    paths = _router.portfolios_paths() if paths is None else paths
+    with ExitStack() as stack:
+        for path in sorted(set(paths)):
+            stack.enter_context(db.lock(path))
+        yield
+
+
+def user_lock(user_id: int) -> threading.RLock:
+    return db.lock(f"user:{user_id}")
+
+
+
+
+def get_users_store() -> Optional[JsonLinesUsersStore]:
+    # USERS_STORE=jsonl: пользователи по строке в users.jsonl с индексом
+    # смещений; json — прежний массив в users.json
+    global _users_store
+    if settings.get("USERS_STORE", "json") != "jsonl":
+        return None
+    if _users_store is None:
+        with _users_store_lock:
+            if _users_store is None:
+                store = JsonLinesUsersStore(
+                    USERS_JSONL_FILE,
+                    durable=settings.get("DB_DURABILITY", "durable") == "durable",
+                )
+                if store.count() == 0:
+                    # первый запуск после переключения: переносим users.json
+                    store.append(db.load_json(USERS_FILE, default=[]))
+                _users_store = store
+    return _users_store
+
+
 def load_users() -> List[Dict[str, Any]]:
+    store = get_users_store()
+    if store is not None:
+        return list(store.iter_records())
     return db.load_json(USERS_FILE, default=[])
 
 
+def load_users_indexed() -> Tuple[List[Dict[str, Any]], Optional[Index]]:
+    # индекс «имя -> позиция» приходит из снимка warm-start, если он свежий
+    store = get_users_store()
+    if store is not None:
+        return list(store.iter_records()), None
+    return db.load_indexed(USERS_FILE, default=[])
+
+
 def save_users(users: List[Dict[str, Any]]) -> None:
+    store = get_users_store()
+    if store is not None:
+        store.rewrite(users)
+        return
     db.save_json(USERS_FILE, users)
 
 
@@ -36,7 +133,11 @@ def next_user_id(users: List[Dict[str, Any]]) -> int:
 def find_user_by_username(
     users: List[Dict[str, Any]],
     username: str,
+    index: Optional[Index] = None,
 ) -> Optional[Dict[str, Any]]:
+    if index is not None:
+        position = index.get(username)
+        return None if position is None else users[position]
     for user in users:
         if user["username"] == username:
             return user
@@ -44,7 +145,7 @@ def find_user_by_username(
 
 
 def user_from_record(record: Dict[str, Any]) -> User:
-    return User(
+    return User.from_trusted(
         user_id=record["user_id"],
         username=record["username"],
         hashed_password=record["hashed_password"],
@@ -55,43 +156,99 @@ def user_from_record(record: Dict[str, Any]) -> User:
 
 
 
+def user_to_record(user: User) -> Dict[str, Any]:
+    return {
+        "user_id": user.user_id,
+        "username": user.username,
+        "hashed_password": user.hashed_password,
+        "salt": user.salt,
+        "registration_date": user.registration_date.isoformat(),
+    }
+
+
+
+
+def iter_portfolio_records() -> Iterator[Dict[str, Any]]:
+    # обход всех шардов по очереди: в памяти только один файл шарда
+    for path in _router.portfolios_paths():
+        yield from db.load_json(path, default=[])
+
+
 def load_portfolios() -> List[Dict[str, Any]]:
-    return db.load_json(PORTFOLIOS_FILE, default=[])
+    return list(iter_portfolio_records())
 
 
 def save_portfolios(portfolios: List[Dict[str, Any]]) -> None:
-    db.save_json(PORTFOLIOS_FILE, portfolios)
+    files: Dict[str, List[Dict[str, Any]]] = {
+        path: [] for path in _router.portfolios_paths()
+    }
+    for record in portfolios:
+        files[portfolios_file(record["user_id"])].append(record)
+    db.wait(db.submit_many(files))
+
+
+def wait_durable(ticket: int) -> None:
+    db.wait(ticket)
 
 
 def find_portfolio_record(
     portfolios: List[Dict[str, Any]],
     user_id: int,
+    index: Optional[Index] = None,
 ) -> Optional[Dict[str, Any]]:
+    if index is not None:
+        position = index.get(user_id)
+        return None if position is None else portfolios[position]
     for record in portfolios:
         if record["user_id"] == user_id:
             return record
     return None
 
 
-def portfolio_from_record(record: Dict[str, Any]) -> Portfolio:
-    wallets_data = record.get("wallets", {})
-    wallets: Dict[str, Wallet] = {}
-    for code, w_data in wallets_data.items():
+def _fill_row(table: BalanceTable, row: int, record: Dict[str, Any]) -> None:
+    for code, w_data in record.get("wallets", {}).items():
+        col = table.column(code)
         balance = float(w_data.get("balance", 0.0))
-        wallets[code] = Wallet(currency_code=code, balance=balance)
-    return Portfolio(user_id=record["user_id"], wallets=wallets)
+        table.set_minor(row, col, to_minor(balance, table.precision(col)))
+
+
+def portfolio_from_record(
+    record: Dict[str, Any],
+    table: Optional[BalanceTable] = None,
+) -> Portfolio:
+    table = table if table is not None else BalanceTable()
+    row = table.add_row()
+    _fill_row(table, row, record)
+    return Portfolio.from_table(record["user_id"], table, row)
+
+
+def portfolios_from_records(
+    records: List[Dict[str, Any]],
+) -> Dict[int, Portfolio]:
+    table = BalanceTable()
+    return {
+        record["user_id"]: portfolio_from_record(record, table)
+        for record in records
+    }
+
+
+def portfolio_balances_minor(records: List[Dict[str, Any]]) -> Balances:
+    table = BalanceTable()
+    balances: Balances = {}
+    for record in records:
+        row = table.add_row()
+        _fill_row(table, row, record)
+        balances[record["user_id"]] = dict(table.row_balances(row))
+    return balances
 
 
 def portfolio_to_record(portfolio: Portfolio) -> Dict[str, Any]:
-    wallets_dict: Dict[str, Dict[str, Any]] = {}
-    for code, wallet in portfolio.wallets.items():
-        wallets_dict[code] = {
-            "currency_code": wallet.currency_code,
-            "balance": wallet.balance,
-        }
     return {
         "user_id": portfolio.user_id,
-        "wallets": wallets_dict,
+        "wallets": {
+            code: {"currency_code": code, "balance": balance}
+            for code, balance in portfolio.iter_balances()
+        },
     }
 
 
@@ -104,3 +261,87 @@ def load_rates() -> Dict[str, Any]:
 def save_rates(rates: Dict[str, Any]) -> None:
     db.save_json(RATES_FILE, rates)
 
+
+
+
+def convert_state_files(codec: str) -> List[str]:
+    converted = []
+    for path in (USERS_FILE, *_router.portfolios_paths(), RATES_FILE):
+        if db.convert(path, codec):
+            converted.append(path)
+    return converted
+
+
+
+
+def warm_start_sources() -> Dict[str, Optional[str]]:
+    # файл -> поле записи, по которому строится индекс позиций
+    sources: Dict[str, Optional[str]] = {RATES_FILE: None}
+    if get_users_store() is None:
+        sources[USERS_FILE] = "username"
+    for path in _router.portfolios_paths():
+        sources[path] = "user_id"
+    return sources
+
+
+def build_warm_start() -> int:
+    # снимок делается с диска: сначала дожидаемся отложенных записей,
+    # блокировки не дают файлам смениться посреди сборки
+    with users_lock(), portfolios_locked():
+        db.flush()
+        return write_warm_start(WARM_START_FILE, warm_start_sources())
+
+
+def drop_warm_start() -> bool:
+    return remove_warm_start(WARM_START_FILE)
+
+
+
+
+def shard_distribution() -> Dict[str, int]:
+    return {
+        path: len(db.load_json(path, default=[]))
+        for path in _router.portfolios_paths()
+    }
+
+
+def rebalance_shards(shards: List[str]) -> Tuple[int, int]:
+    global _router
+    old_router = _router
+    new_router = ShardRouter(shards, old_router.ring.vnodes)
+    paths = set(old_router.portfolios_paths()) | set(new_router.portfolios_paths())
+
+    with portfolios_locked(paths):
+        targets: Dict[str, List[Dict[str, Any]]] = {
+            path: [] for path in new_router.portfolios_paths()
+        }
+        changed = set()
+        moved = total = 0
+        for path in sorted(paths):
+            for record in db.load_json(path, default=[]):
+                target = new_router.portfolios_path(record["user_id"])
+                targets[target].append(record)
+                total += 1
+                if target != path:
+                    moved += 1
+                    changed.update((path, target))
+
+        # переписываются только затронутые шарды; раскладка — в той же группе
+        files: Dict[str, Any] = {path: targets.get(path, []) for path in changed}
+        files[SHARD_LAYOUT_FILE] = layout_record(new_router)
+        db.wait(db.submit_many(files))
+        _router = new_router
+    return moved, total
+
+
+
+
+def get_ledger() -> TradeLedger:
+    global _ledger
+    if _ledger is None:
+        with _ledger_lock:
+            if _ledger is None:
+                ledger = TradeLedger()
+                ledger.seed(lambda: portfolio_balances_minor(load_portfolios()))
+                _ledger = ledger
+    return _ledger
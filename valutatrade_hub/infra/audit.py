@@ -0,0 +1,507 @@
+from __future__ import annotations
+
+import ast
+import glob
+import json
+import os
+import re
+import shutil
+import struct
+import sys
+import threading
+import zlib
+from array import array
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from valutatrade_hub.infra.rates_snapshot import iso_to_micros
+from valutatrade_hub.infra.settings import SettingsLoader
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+# Запись индекса аудита: время (мкс), пользователь, действие, валюта,
+# результат, номер файла лога, сумма, смещение строки в файле.
+# Строки (имена, действия, коды) хранятся в таблицах meta.json.
+AUDIT_RECORD = struct.Struct("<qIHHBxHdQ")
+INDEX_FORMAT_VERSION = 3
+# Списки позиций: для каждого значения столбца — номера записей index.bin
+# по возрастанию (postings/<столбец>-<id>.bin). Столбцы идут в записи
+# сразу за временем.
+POSTING_RECORD = struct.Struct("<q")
+POSTING_COLUMNS = ("user", "action", "currency", "result")
+# список длиннее этой доли интервала выгоднее прочитать сплошным проходом
+SCAN_RATIO = 8
+RESULT_OK = 0
+RESULT_ERROR = 1
+RESULTS = {"OK": RESULT_OK, "ERROR": RESULT_ERROR}
+
+# строки, которые пишет декоратор log_action
+_ACTION_LINE = re.compile(
+    r"^\w+ \S+ (?P<action>[A-Z_]+) (?P<timestamp>\S+) "
+    r"user=(?P<user>None|'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\") "
+    r"currency=(?P<currency>None|'[^']*') "
+    r"amount=(?P<amount>\S+) result=(?P<result>OK|ERROR)"
+    r"(?: error_type=(?P<error_type>\S+) error_message=(?P<error>.*))?$",
+)
+
+
+@dataclass
+class AuditEntry:
+
+    timestamp: int
+    user: str
+    action: str
+    currency: str
+    amount: Optional[float]
+    ok: bool
+    file_no: int
+    offset: int
+
+
+def _parse_amount(value: str) -> Optional[float]:
+    # repr(float): nan и inf literal_eval не понимает; строка остаётся
+    # в индексе и тогда, когда сумму разобрать нельзя
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def parse_action_line(line: str) -> Optional[Dict[str, Any]]:
+    match = _ACTION_LINE.match(line.rstrip("\n"))
+    if match is None:
+        return None
+    try:
+        user = ast.literal_eval(match["user"])
+        currency = ast.literal_eval(match["currency"])
+        timestamp = iso_to_micros(match["timestamp"])
+    except (SyntaxError, ValueError):
+        return None
+    return {
+        "timestamp": timestamp,
+        "user": user or "",
+        "action": match["action"],
+        "currency": currency or "",
+        "amount": _parse_amount(match["amount"]),
+        "result": match["result"],
+        "error_type": match["error_type"] or "",
+        "error": match["error"] or "",
+    }
+
+
+class AuditIndex:
+
+    def __init__(
+        self,
+        log_file: Optional[str] = None,
+        index_dir: Optional[str] = None,
+    ) -> None:
+        settings = SettingsLoader()
+        self.log_file = log_file or settings.get("LOG_FILE")
+        self.index_dir = index_dir or settings.get("AUDIT_DIR")
+        self.index_path = os.path.join(self.index_dir, "index.bin")
+        self.meta_path = os.path.join(self.index_dir, "meta.json")
+        self.lock_path = os.path.join(self.index_dir, "index.lock")
+        self.postings_dir = os.path.join(self.index_dir, "postings")
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        # индекс обновляют все процессы, читающие аудит: поток блокируется
+        # своим замком, процесс — flock на index.lock
+        os.makedirs(self.index_dir, exist_ok=True)
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.lock_path, "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    # ---------- файлы лога ----------
+
+    def _log_files(self) -> List[str]:
+        # RotatingFileHandler: actions.log.3 — самый старый, actions.log — текущий
+        backups = []
+        for path in glob.glob(glob.escape(self.log_file) + ".*"):
+            suffix = path[len(self.log_file) + 1:]
+            if suffix.isdigit():
+                backups.append((int(suffix), path))
+        backups.sort(reverse=True)
+        return [path for _num, path in backups] + [self.log_file]
+
+    @staticmethod
+    def _file_key(path: str) -> Optional[str]:
+        # при ротации файл переименовывается, но inode и первая строка
+        # остаются прежними — по ним файл узнаётся под новым именем
+        try:
+            with open(path, "rb") as file:
+                first = file.readline()
+                inode = os.fstat(file.fileno()).st_ino
+        except FileNotFoundError:
+            return None
+        if not first.endswith(b"\n"):
+            return None
+        return f"{inode}:{zlib.crc32(first):08x}"
+
+    def _log_signature(self) -> List[List[int]]:
+        # (inode, размер) каждого файла: пока лог не менялся, индекс не трогаем
+        signature = []
+        for path in self._log_files():
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            signature.append([stat.st_ino, stat.st_size])
+        return signature
+
+    # ---------- метаданные ----------
+
+    def _empty_meta(self) -> Dict[str, Any]:
+        return {
+            "version": INDEX_FORMAT_VERSION,
+            "records": 0,
+            "users": [""],
+            "actions": [""],
+            "currencies": [""],
+            "files": [],
+            "logs": [],
+        }
+
+    def _load_meta(self) -> Dict[str, Any]:
+        try:
+            with open(self.meta_path, "r", encoding="utf-8") as file:
+                meta = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return self._empty_meta()
+        try:
+            size = os.path.getsize(self.index_path)
+        except FileNotFoundError:
+            size = 0
+        if (
+            not isinstance(meta, dict)
+            or meta.get("version") != INDEX_FORMAT_VERSION
+            or size < meta.get("records", 0) * AUDIT_RECORD.size
+        ):
+            # индекс не совпадает с метаданными — строим заново
+            return self._empty_meta()
+        return meta
+
+    def _save_meta(self, meta: Dict[str, Any]) -> None:
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(meta, file, ensure_ascii=False)
+        os.replace(tmp_path, self.meta_path)
+
+    @staticmethod
+    def _intern(table: List[str], positions: Dict[str, int], value: str) -> int:
+        idx = positions.get(value)
+        if idx is None:
+            idx = len(table)
+            table.append(value)
+            positions[value] = idx
+        return idx
+
+    # ---------- списки позиций ----------
+
+    def _posting_path(self, column: str, value: int) -> str:
+        return os.path.join(self.postings_dir, f"{column}-{value}.bin")
+
+    @staticmethod
+    def _read_postings(path: str) -> array:
+        try:
+            with open(path, "rb") as file:
+                packed = file.read()
+        except FileNotFoundError:
+            packed = b""
+        usable = len(packed) - len(packed) % POSTING_RECORD.size
+        positions = array("q", packed[:usable])
+        if sys.byteorder != "little":
+            positions.byteswap()
+        return positions
+
+    def _trim_postings(self, count: int) -> None:
+        # прерванное обновление могло дописать позиции записей, которые так
+        # и не попали в meta.json: они будут переписаны — отрезаем
+        try:
+            names = os.listdir(self.postings_dir)
+        except FileNotFoundError:
+            return
+        for name in names:
+            path = os.path.join(self.postings_dir, name)
+            positions = self._read_postings(path)
+            keep = bisect_left(positions, count)
+            if keep < len(positions):
+                with open(path, "r+b") as file:
+                    file.truncate(keep * POSTING_RECORD.size)
+
+    def _append_postings(self, postings: Dict[Tuple[str, int], bytearray]) -> None:
+        os.makedirs(self.postings_dir, exist_ok=True)
+        for (column, value), packed in postings.items():
+            with open(self._posting_path(column, value), "ab") as file:
+                file.write(packed)
+
+    # ---------- построение ----------
+
+    def refresh(self) -> int:
+        with self._locked():
+            signature = self._log_signature()
+            meta = self._load_meta()
+            if meta["logs"] == signature:
+                # другой процесс уже догнал лог
+                return 0
+            committed = meta["records"] * AUDIT_RECORD.size
+            try:
+                torn = os.path.getsize(self.index_path) > committed
+            except FileNotFoundError:
+                torn = False
+            if torn:
+                self._trim_postings(meta["records"])
+
+            files: List[Dict[str, Any]] = meta["files"]
+            known = {entry["key"]: idx for idx, entry in enumerate(files)}
+            tables = {
+                name: (meta[name], {value: idx for idx, value in enumerate(meta[name])})
+                for name in ("users", "actions", "currencies")
+            }
+
+            packed = bytearray()
+            postings: Dict[Tuple[str, int], bytearray] = {}
+            added = 0
+            for path in self._log_files():
+                key = self._file_key(path)
+                if key is None:
+                    continue
+                file_no = known.get(key)
+                if file_no is None:
+                    file_no = len(files)
+                    files.append({"key": key, "offset": 0})
+                    known[key] = file_no
+                state = files[file_no]
+                with open(path, "rb") as file:
+                    file.seek(state["offset"])
+                    offset = state["offset"]
+                    for raw in file:
+                        if not raw.endswith(b"\n"):
+                            # строка ещё дописывается — дочитаем в следующий раз
+                            break
+                        record = parse_action_line(raw.decode("utf-8", "replace"))
+                        if record is not None:
+                            amount = record["amount"]
+                            columns = (
+                                self._intern(*tables["users"], record["user"]),
+                                self._intern(*tables["actions"], record["action"]),
+                                self._intern(
+                                    *tables["currencies"],
+                                    record["currency"],
+                                ),
+                                RESULTS[record["result"]],
+                            )
+                            packed += AUDIT_RECORD.pack(
+                                record["timestamp"],
+                                *columns,
+                                file_no,
+                                float("nan") if amount is None else amount,
+                                offset,
+                            )
+                            number = POSTING_RECORD.pack(meta["records"] + added)
+                            for column, value in zip(POSTING_COLUMNS, columns):
+                                postings.setdefault((column, value), bytearray())
+                                postings[(column, value)] += number
+                            added += 1
+                        offset += len(raw)
+                    state["offset"] = offset
+
+            if added:
+                mode = "r+b" if os.path.exists(self.index_path) else "wb"
+                with open(self.index_path, mode) as file:
+                    # пишем сразу за подтверждённой частью: хвост от
+                    # прерванного обновления перезаписывается
+                    file.seek(committed)
+                    file.write(packed)
+                    file.truncate()
+                # позиции — после записей, фиксирует всё meta.json
+                self._append_postings(postings)
+                meta["records"] += added
+            meta["logs"] = signature
+            self._save_meta(meta)
+            return added
+
+    def rebuild(self) -> int:
+        with self._locked():
+            for path in (self.index_path, self.meta_path):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            shutil.rmtree(self.postings_dir, ignore_errors=True)
+        return self.refresh()
+
+    # ---------- чтение ----------
+
+    def _read_record(self, file: Any, idx: int) -> Tuple[Any, ...]:
+        file.seek(idx * AUDIT_RECORD.size)
+        return AUDIT_RECORD.unpack(file.read(AUDIT_RECORD.size))
+
+    def _first_at_or_after(self, file: Any, count: int, timestamp: int) -> int:
+        # записи добавляются в порядке времени: двоичный поиск по файлу
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._read_record(file, mid)[0] < timestamp:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _iter_records(
+        self,
+        file: Any,
+        start: int,
+        end: int,
+    ) -> Iterator[Tuple[Any, ...]]:
+        file.seek(start * AUDIT_RECORD.size)
+        remaining = end - start
+        while remaining > 0:
+            chunk = file.read(AUDIT_RECORD.size * min(remaining, 4096))
+            if not chunk:
+                return
+            usable = len(chunk) - len(chunk) % AUDIT_RECORD.size
+            remaining -= usable // AUDIT_RECORD.size
+            yield from AUDIT_RECORD.iter_unpack(chunk[:usable])
+
+    def _select(
+        self,
+        file: Any,
+        start: int,
+        end: int,
+        filters: List[Tuple[str, int]],
+        limit: Optional[int],
+    ) -> List[Tuple[Any, ...]]:
+        def matches(record: Tuple[Any, ...]) -> bool:
+            return all(
+                record[1 + POSTING_COLUMNS.index(column)] == value
+                for column, value in filters
+            )
+
+        # самый короткий список позиций в интервале [start, end)
+        candidates = None
+        for column, value in filters:
+            positions = self._read_postings(self._posting_path(column, value))
+            found = positions[
+                bisect_left(positions, start):bisect_left(positions, end)
+            ]
+            if candidates is None or len(found) < len(candidates):
+                candidates = found
+
+        if candidates is None or len(candidates) * SCAN_RATIO > end - start:
+            matched: deque = deque(maxlen=limit)
+            for record in self._iter_records(file, start, end):
+                if matches(record):
+                    matched.append(record)
+            return list(matched)
+
+        # с конца: для limit нужны последние записи
+        selected: List[Tuple[Any, ...]] = []
+        for number in reversed(candidates):
+            if limit is not None and len(selected) >= limit:
+                break
+            record = self._read_record(file, number)
+            if matches(record):
+                selected.append(record)
+        selected.reverse()
+        return selected
+
+    def query(
+        self,
+        user: Optional[str] = None,
+        action: Optional[str] = None,
+        currency: Optional[str] = None,
+        ok: Optional[bool] = None,
+        since: Optional[int] = None,
+        until: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> List[AuditEntry]:
+        meta = self._load_meta()
+        if meta["logs"] != self._log_signature():
+            self.refresh()
+            meta = self._load_meta()
+
+        def wanted(table: str, value: Optional[str]) -> Optional[int]:
+            if value is None:
+                return None
+            try:
+                return meta[table].index(value)
+            except ValueError:
+                return -1
+
+        user_id = wanted("users", user)
+        action_id = wanted("actions", action.upper() if action else None)
+        currency_id = wanted("currencies", currency.upper() if currency else None)
+        if -1 in (user_id, action_id, currency_id):
+            return []
+        result = None if ok is None else (RESULT_OK if ok else RESULT_ERROR)
+        filters = [
+            (column, value)
+            for column, value in zip(
+                POSTING_COLUMNS,
+                (user_id, action_id, currency_id, result),
+            )
+            if value is not None
+        ]
+
+        count = meta["records"]
+        try:
+            file = open(self.index_path, "rb")
+        except FileNotFoundError:
+            return []
+        with file:
+            start = 0 if since is None else self._first_at_or_after(file, count, since)
+            end = count
+            if until is not None:
+                end = self._first_at_or_after(file, count, until)
+            matches = self._select(file, start, max(start, end), filters, limit)
+
+        entries = []
+        for record in matches:
+            timestamp, rec_user, rec_action, rec_currency, rec_result = record[:5]
+            file_no, amount, offset = record[5:]
+            entries.append(
+                AuditEntry(
+                    timestamp=timestamp,
+                    user=meta["users"][rec_user],
+                    action=meta["actions"][rec_action],
+                    currency=meta["currencies"][rec_currency],
+                    # NaN в индексе — сумма в строке лога была None
+                    amount=None if amount != amount else amount,
+                    ok=rec_result == RESULT_OK,
+                    file_no=file_no,
+                    offset=offset,
+                ),
+            )
+        return entries
+
+    def read_lines(self, entries: List[AuditEntry]) -> List[Optional[Dict[str, Any]]]:
+        meta = self._load_meta()
+        paths = {self._file_key(path): path for path in self._log_files()}
+        lines: List[Optional[Dict[str, Any]]] = []
+        for entry in entries:
+            path = paths.get(meta["files"][entry.file_no]["key"])
+            if path is None:
+                # файл уже удалён ротацией
+                lines.append(None)
+                continue
+            with open(path, "rb") as file:
+                file.seek(entry.offset)
+                raw = file.readline().decode("utf-8", "replace")
+            lines.append(parse_action_line(raw))
+        return lines
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import json
+import marshal
+import struct
+from typing import Any, Dict
+
+# Бинарный формат: заголовок (магия, версия формата, версия marshal) + данные.
+# marshal понимает только встроенные типы — ровно то, что лежит в JSON-файлах.
+MARSHAL_MAGIC = b"VTMB"
+MARSHAL_HEADER = struct.Struct("<4sHH")
+MARSHAL_FORMAT_VERSION = 1
+
+
+class JsonCodec:
+
+    name = "json"
+
+    def encode(self, data: Any) -> bytes:
+        return json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+
+    def decode(self, payload: bytes) -> Any:
+        return json.loads(payload)
+
+
+class CompactJsonCodec(JsonCodec):
+
+    name = "json-compact"
+
+    def encode(self, data: Any) -> bytes:
+        return json.dumps(
+            data,
+            ensure_ascii=False,
+            separators=(",", ":"),
+        ).encode("utf-8")
+
+
+class MarshalCodec:
+
+    name = "marshal"
+
+    def encode(self, data: Any) -> bytes:
+        header = MARSHAL_HEADER.pack(
+            MARSHAL_MAGIC,
+            MARSHAL_FORMAT_VERSION,
+            marshal.version,
+        )
+        return header + marshal.dumps(data, marshal.version)
+
+    def decode(self, payload: bytes) -> Any:
+        try:
+            magic, version, _marshal_version = MARSHAL_HEADER.unpack_from(payload)
+        except struct.error as exc:
+            raise ValueError("Бинарное состояние повреждено") from exc
+        if magic != MARSHAL_MAGIC or version != MARSHAL_FORMAT_VERSION:
+            raise ValueError("Неизвестный формат бинарного состояния")
+        try:
+            return marshal.loads(payload[MARSHAL_HEADER.size:])
+        except (EOFError, TypeError) as exc:
+            raise ValueError("Бинарное состояние повреждено") from exc
+
+
+CODECS: Dict[str, Any] = {
+    codec.name: codec for codec in (JsonCodec(), CompactJsonCodec(), MarshalCodec())
+}
+DEFAULT_CODEC = "json"
+
+
+def get_codec(name: str) -> Any:
+    codec = CODECS.get(name)
+    if codec is None:
+        raise ValueError(
+            f"Неизвестный формат '{name}'. Доступны: {', '.join(CODECS)}",
+        )
+    return codec
+
+
+def detect_codec(payload: bytes) -> Any:
+    if payload[: len(MARSHAL_MAGIC)] == MARSHAL_MAGIC:
+        return CODECS["marshal"]
+    # сжатый и форматированный JSON читаются одинаково
+    return CODECS["json"]
+
+
+def decode_auto(payload: bytes) -> Any:
+    return detect_codec(payload).decode(payload)
+
+
+def load_file(path: str, default: Any) -> Any:
+    try:
+        with open(path, "rb") as file:
+            payload = file.read()
+    except FileNotFoundError:
+        return default
+    try:
+        return decode_auto(payload)
+    except ValueError:
+        # json.JSONDecodeError и UnicodeDecodeError — подклассы ValueError
+        return default
@@ -1,22 +1,28 @@
-
 from __future__ import annotations
 
-import json
+import atexit
 import os
-from json import JSONDecodeError
-from typing import Any
+import threading
+from typing import Any, Dict, Optional, Tuple
 
+from valutatrade_hub.infra.codecs import decode_auto, get_codec, load_file
+from valutatrade_hub.infra.group_commit import GroupCommitter
 from valutatrade_hub.infra.settings import SettingsLoader
+from valutatrade_hub.infra.warm_start import Index, WarmStart, load_warm_start
 
 
 class DatabaseManager:
 
     _instance: "DatabaseManager | None" = None
+    _lock = threading.Lock()
 
     def __new__(cls) -> "DatabaseManager":
         if cls._instance is None:
-            cls._instance = super().__new__(cls)
-            cls._instance._init_paths()
+            with cls._lock:
+                if cls._instance is None:
+                    instance = super().__new__(cls)
+                    instance._init_paths()
+                    cls._instance = instance
         return cls._instance
 
     def _init_paths(self) -> None:
@@ -24,16 +30,69 @@ class DatabaseManager:
         data_dir = settings.get("DATA_DIR")
         os.makedirs(data_dir, exist_ok=True)
         self.data_dir = data_dir
+        self._locks: Dict[str, threading.RLock] = {}
+        self.codec = get_codec(settings.get("DB_CODEC", "json"))
+        self.committer = GroupCommitter(
+            settings.get("DB_DURABILITY", "durable"),
+            settings.get("DB_COMMIT_WINDOW_MS", 5),
+            os.path.join(data_dir, ".commit-journal.json"),
+        )
+        atexit.register(self.committer.flush)
+        self.warm: Optional[WarmStart] = None
+        if settings.get("WARM_START_ENABLED", True):
+            self.warm = load_warm_start(settings.get("WARM_START_FILE"))
+
+    def lock(self, name: str) -> threading.RLock:
+        # именованные блокировки: файл целиком или отдельный пользователь
+        lock = self._locks.get(name)
+        if lock is None:
+            with self._lock:
+                lock = self._locks.setdefault(name, threading.RLock())
+        return lock
+
+    def load_indexed(self, path: str, default: Any) -> Tuple[Any, Optional[Index]]:
+        # запись могла ещё не дойти до диска: читаем свою же версию
+        pending = self.committer.read_pending(path)
+        if pending is not None:
+            return decode_auto(pending), None
+        if self.warm is not None:
+            # первое чтение файла после запуска — из снимка, если он не устарел
+            warm = self.warm.take(path)
+            if warm is not None:
+                return warm
+        # формат определяется по содержимому: старые JSON-файлы читаются всегда
+        return load_file(path, default), None
 
     def load_json(self, path: str, default: Any) -> Any:
-        try:
-            with open(path, "r", encoding="utf-8") as file:
-                return json.load(file)
-        except (FileNotFoundError, JSONDecodeError):
-            return default
+        return self.load_indexed(path, default)[0]
+
+    def submit_json(self, path: str, data: Any) -> int:
+        return self.submit_many({path: data})
+
+    def submit_many(self, files: Dict[str, Any]) -> int:
+        return self.committer.submit_many(
+            {path: self.codec.encode(data) for path, data in files.items()},
+        )
+
+    def version(self, path: str) -> int:
+        return self.committer.version(path)
+
+    def wait(self, ticket: int) -> None:
+        self.committer.wait(ticket)
 
     def save_json(self, path: str, data: Any) -> None:
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        with open(path, "w", encoding="utf-8") as file:
-            json.dump(data, file, ensure_ascii=False, indent=2)
+        # temp-файл + fsync + os.replace; близкие по времени записи
+        # объединяются в одну группу, вызывающий ждёт её фиксации
+        self.wait(self.submit_json(path, data))
+
+    def convert(self, path: str, codec_name: str) -> bool:
+        codec = get_codec(codec_name)
+        with self.lock(path):
+            data = self.load_json(path, None)
+            if data is None:
+                return False
+            self.committer.write(path, codec.encode(data))
+        return True
 
+    def flush(self) -> None:
+        self.committer.flush()
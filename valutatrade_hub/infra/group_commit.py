@@ -0,0 +1,240 @@
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+DURABLE = "durable"
+RELAXED = "relaxed"
+ASYNC = "async"
+MODES = (DURABLE, RELAXED, ASYNC)
+
+
+def fsync_directory(directory: str) -> None:
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def write_temp_file(path: str, payload: bytes, sync: bool) -> str:
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(
+        prefix=os.path.basename(path) + ".",
+        suffix=".tmp",
+        dir=directory,
+    )
+    try:
+        # mkstemp создаёт файл с правами 0600: сохраняем права исходного файла
+        try:
+            mode = os.stat(path).st_mode & 0o777
+        except FileNotFoundError:
+            mode = 0o644
+        os.fchmod(fd, mode)
+        with os.fdopen(fd, "wb") as file:
+            file.write(payload)
+            if sync:
+                file.flush()
+                os.fsync(file.fileno())
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return tmp_path
+
+
+def write_file_atomic(path: str, payload: bytes, sync: bool) -> None:
+    tmp_path = write_temp_file(path, payload, sync)
+    try:
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def recover_journal(journal_path: str) -> int:
+    # журнал появляется только когда все временные файлы уже записаны:
+    # довершаем переименования, иначе группа не применялась вовсе
+    try:
+        with open(journal_path, "r", encoding="utf-8") as file:
+            renames = json.load(file)
+    except FileNotFoundError:
+        return 0
+    except json.JSONDecodeError:
+        os.remove(journal_path)
+        return 0
+    applied = 0
+    for tmp_path, path in renames:
+        if os.path.exists(tmp_path):
+            os.replace(tmp_path, path)
+            applied += 1
+    os.remove(journal_path)
+    return applied
+
+
+class GroupCommitter:
+
+    def __init__(
+        self,
+        mode: str = DURABLE,
+        window_ms: float = 5.0,
+        journal_path: Optional[str] = None,
+    ) -> None:
+        if mode not in MODES:
+            raise ValueError(f"Неизвестный режим записи '{mode}'")
+        self.mode = mode
+        self.window = max(0.0, float(window_ms)) / 1000
+        self.journal_path = journal_path
+        if journal_path is not None:
+            recover_journal(journal_path)
+        self._cond = threading.Condition()
+        # последняя версия каждого файла, ещё не попавшая на диск
+        self._pending: Dict[str, bytes] = {}
+        self._inflight: Dict[str, bytes] = {}
+        self._generation = 0
+        self._committed = 0
+        self._versions: Dict[str, int] = {}
+        self._failures: List[Tuple[int, int, BaseException]] = []
+        self._thread: Optional[threading.Thread] = None
+        self.batches = 0
+        self.files_written = 0
+
+    # ---------- запись ----------
+
+    def submit(self, path: str, payload: bytes) -> int:
+        return self.submit_many({path: payload})
+
+    def submit_many(self, files: Dict[str, bytes]) -> int:
+        # файлы одного вызова всегда попадают в одну группу и
+        # применяются атомарно (через журнал переименований)
+        with self._cond:
+            self._generation += 1
+            for path, payload in files.items():
+                self._pending[path] = payload
+                self._versions[path] = self._generation
+            self._ensure_thread()
+            self._cond.notify_all()
+            return self._generation
+
+    def version(self, path: str) -> int:
+        with self._cond:
+            return self._versions.get(path, 0)
+
+    def wait(self, ticket: int) -> None:
+        if self.mode == ASYNC:
+            return
+        with self._cond:
+            while self._committed < ticket:
+                self._cond.wait()
+            for low, high, exc in self._failures:
+                if low <= ticket <= high:
+                    raise exc
+
+    def write(self, path: str, payload: bytes) -> None:
+        self.wait(self.submit(path, payload))
+
+    def read_pending(self, path: str) -> Optional[bytes]:
+        with self._cond:
+            payload = self._pending.get(path)
+            if payload is None:
+                payload = self._inflight.get(path)
+            return payload
+
+    def flush(self) -> None:
+        with self._cond:
+            ticket = self._generation
+            while self._committed < ticket:
+                self._cond.wait()
+
+    # ---------- фоновый поток ----------
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._run,
+                name="group-commit",
+                daemon=True,
+            )
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+            if self.window:
+                # окно группировки: записи, пришедшие за это время, уйдут вместе
+                time.sleep(self.window)
+            with self._cond:
+                batch = self._pending
+                self._pending = {}
+                self._inflight = batch
+                low, high = self._committed + 1, self._generation
+
+            try:
+                error = self._write_batch(batch)
+            except Exception as exc:  # noqa: BLE001
+                # поток записи один на процесс: ошибка достаётся ожидающим
+                # этой группы, а поток продолжает обслуживать следующие
+                error = exc
+
+            with self._cond:
+                self._inflight = {}
+                if error is not None:
+                    self._failures = self._failures[-15:] + [(low, high, error)]
+                self._committed = high
+                self.batches += 1
+                self.files_written += len(batch)
+                self._cond.notify_all()
+
+    def _write_batch(self, batch: Dict[str, bytes]) -> Optional[BaseException]:
+        sync = self.mode == DURABLE
+        directories = {os.path.dirname(path) or "." for path in batch}
+        if len(batch) == 1 or self.journal_path is None:
+            try:
+                for path, payload in batch.items():
+                    write_file_atomic(path, payload, sync)
+                if sync:
+                    for directory in directories:
+                        fsync_directory(directory)
+            except Exception as exc:  # noqa: BLE001
+                return exc
+            return None
+
+        renames: List[Tuple[str, str]] = []
+        try:
+            for path, payload in batch.items():
+                renames.append((write_temp_file(path, payload, sync), path))
+            if sync:
+                for directory in directories:
+                    fsync_directory(directory)
+            journal = json.dumps(renames).encode("utf-8")
+            write_file_atomic(self.journal_path, journal, sync)
+            if sync:
+                fsync_directory(os.path.dirname(self.journal_path) or ".")
+        except Exception as exc:  # noqa: BLE001
+            for tmp_path, _path in renames:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            return exc
+
+        try:
+            for tmp_path, path in renames:
+                os.replace(tmp_path, path)
+            if sync:
+                for directory in directories:
+                    fsync_directory(directory)
+            os.remove(self.journal_path)
+        except Exception as exc:  # noqa: BLE001
+            # журнал остался: группа будет довершена при следующем запуске
+            return exc
+        return None
@@ -0,0 +1,444 @@
+from __future__ import annotations
+
+import json
+import os
+import struct
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from valutatrade_hub.infra.group_commit import fsync_directory
+from valutatrade_hub.infra.settings import SettingsLoader
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+# Запись индекса: user_id, номер сегмента, смещение строки в сегменте
+INDEX_RECORD = struct.Struct("<qIQ")
+# Запись индекса пользователя: номер записи в index.bin
+USER_RECORD = struct.Struct("<Q")
+# длинная пачка сбрасывается на диск частями: сначала сегмент, потом индекс
+FLUSH_BYTES = 1 << 20
+
+Balances = Dict[int, Dict[str, int]]
+
+
+class TradeLedger:
+
+    def __init__(self, ledger_dir: Optional[str] = None) -> None:
+        settings = SettingsLoader()
+        self.ledger_dir = ledger_dir or settings.get("LEDGER_DIR")
+        self.segment_max_bytes = int(
+            settings.get("LEDGER_SEGMENT_MAX_BYTES", 1_000_000),
+        )
+        self.checkpoint_interval = int(
+            settings.get("LEDGER_CHECKPOINT_INTERVAL", 100),
+        )
+        # журнал пишется раньше портфеля и должен дойти до диска первым
+        self.durable = settings.get("DB_DURABILITY", "durable") == "durable"
+        self.users_dir = os.path.join(self.ledger_dir, "users")
+        os.makedirs(self.users_dir, exist_ok=True)
+        self.index_path = os.path.join(self.ledger_dir, "index.bin")
+        # до какой записи index.bin разнесены индексы пользователей
+        self.users_mark_path = os.path.join(self.ledger_dir, "users.mark")
+        self.checkpoint_path = os.path.join(self.ledger_dir, "checkpoint.json")
+        self.lock_path = os.path.join(self.ledger_dir, "ledger.lock")
+        self._lock = threading.Lock()
+        with self._locked():
+            self._segment, self._last_seq = self._sync()
+
+    # ---------- файлы ----------
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.ledger_dir, f"segment-{segment:06d}.jsonl")
+
+    def _user_path(self, user_id: int) -> str:
+        return os.path.join(self.users_dir, f"{user_id}.bin")
+
+    def _read_raw(self, segment: int, offset: int) -> bytes:
+        with open(self._segment_path(segment), "rb") as file:
+            file.seek(offset)
+            return file.readline()
+
+    def _read_line(self, segment: int, offset: int) -> Dict[str, Any]:
+        return json.loads(self._read_raw(segment, offset))
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        # журнал пишут несколько процессов (CLI, сервер, импорт):
+        # поток блокируется своим замком, процесс — flock на ledger.lock
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.lock_path, "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    # ---------- восстановление головы (под блокировкой) ----------
+
+    def _index_count(self) -> int:
+        try:
+            size = os.path.getsize(self.index_path)
+        except FileNotFoundError:
+            return 0
+        usable = size - size % INDEX_RECORD.size
+        if usable != size:
+            # недописанная запись индекса после сбоя
+            with open(self.index_path, "r+b") as file:
+                file.truncate(usable)
+        return usable // INDEX_RECORD.size
+
+    def _index_record(self, number: int) -> Tuple[int, int, int]:
+        with open(self.index_path, "rb") as file:
+            file.seek(number * INDEX_RECORD.size)
+            return INDEX_RECORD.unpack(file.read(INDEX_RECORD.size))
+
+    def _scan_tail(
+        self,
+        segment: int,
+        offset: int,
+        seq: int,
+    ) -> Tuple[int, int, bytearray]:
+        # строки сегментов после последней записи индекса: сбой между
+        # записью в сегмент и в индекс. Недописанная строка обрезается
+        index = bytearray()
+        while os.path.exists(self._segment_path(segment)):
+            path = self._segment_path(segment)
+            with open(path, "r+b") as file:
+                file.seek(offset)
+                for raw in file:
+                    if not raw.endswith(b"\n"):
+                        file.truncate(offset)
+                        break
+                    entry = json.loads(raw)
+                    index += INDEX_RECORD.pack(entry["user_id"], segment, offset)
+                    seq = int(entry["seq"])
+                    offset += len(raw)
+            if not os.path.exists(self._segment_path(segment + 1)):
+                break
+            segment, offset = segment + 1, 0
+        return segment, seq, index
+
+    def _sync(self) -> Tuple[int, int]:
+        # голова журнала всегда выводится заново с диска: другой процесс
+        # мог дописать записи с прошлого раза
+        count = self._index_count()
+        if count == 0:
+            segment, offset, seq = 1, 0, 0
+        else:
+            _user_id, segment, offset = self._index_record(count - 1)
+            raw = self._read_raw(segment, offset)
+            seq = int(json.loads(raw)["seq"])
+            offset += len(raw)
+        segment, seq, repaired = self._scan_tail(segment, offset, seq)
+        if repaired:
+            with open(self.index_path, "ab") as file:
+                file.write(repaired)
+            count += len(repaired) // INDEX_RECORD.size
+        self._sync_users(count)
+        return segment, seq
+
+    def _read_mark(self) -> int:
+        try:
+            with open(self.users_mark_path, "r", encoding="utf-8") as file:
+                return int(file.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _sync_users(self, count: int) -> None:
+        # разносим записи index.bin по файлам пользователей; сбой посреди
+        # оставляет повторы, их отбрасывает чтение
+        mark = self._read_mark()
+        if mark >= count:
+            return
+        by_user: Dict[int, bytearray] = {}
+        for number, (user_id, _segment, _offset) in enumerate(
+            self._iter_index(start=mark, stop=count),
+            start=mark,
+        ):
+            by_user.setdefault(user_id, bytearray()).extend(
+                USER_RECORD.pack(number),
+            )
+        for user_id, packed in by_user.items():
+            with open(self._user_path(user_id), "ab") as file:
+                file.write(packed)
+                # отметка не должна опередить файлы пользователей на диске
+                self._flush(file)
+        if self.durable:
+            fsync_directory(self.users_dir)
+        tmp_path = self.users_mark_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            file.write(str(count))
+        os.replace(tmp_path, self.users_mark_path)
+
+    # ---------- запись ----------
+
+    def append(
+        self,
+        user_id: int,
+        action: str,
+        currency: str,
+        amount_minor: int,
+        precision: int,
+        rate: float,
+        balance_after_minor: int,
+        **extra: Any,
+    ) -> Dict[str, Any]:
+        return self.append_many(
+            [
+                {
+                    "user_id": user_id,
+                    "action": action,
+                    "currency": currency,
+                    "amount_minor": amount_minor,
+                    "precision": precision,
+                    "rate": rate,
+                    "balance_after_minor": balance_after_minor,
+                    **extra,
+                },
+            ],
+        )[0]
+
+    def append_many(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        entries: List[Dict[str, Any]] = []
+        self._write_entries(items, entries.append)
+        return entries
+
+    def extend(self, items: Iterable[Dict[str, Any]]) -> int:
+        # потоковая запись (импорт): записи не копятся в памяти,
+        # чекпоинт — один раз в конце
+        return self._write_entries(items, None)
+
+    def _write_entries(
+        self,
+        items: Iterable[Dict[str, Any]],
+        collect: Optional[Callable[[Dict[str, Any]], None]],
+    ) -> int:
+        # пачка записей дописывается крупными write на сегмент и индекс
+        with self._locked():
+            self._segment, self._last_seq = self._sync()
+            first_number = self._index_count()
+            written = 0
+            index = bytearray()
+            path = self._segment_path(self._segment)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            segment = self._open_segment(path)
+            try:
+                pending = bytearray()
+                for item in items:
+                    if size >= self.segment_max_bytes:
+                        segment.write(pending)
+                        self._flush(segment)
+                        segment.close()
+                        pending = bytearray()
+                        self._segment += 1
+                        path = self._segment_path(self._segment)
+                        segment = self._open_segment(path)
+                        size = segment.tell()
+
+                    entry = {
+                        "seq": self._last_seq + written + 1,
+                        "timestamp": datetime.now().isoformat(),
+                        **item,
+                    }
+                    line = (json.dumps(entry, ensure_ascii=False) + "\n").encode(
+                        "utf-8",
+                    )
+                    index += INDEX_RECORD.pack(entry["user_id"], self._segment, size)
+                    pending += line
+                    size += len(line)
+                    written += 1
+                    if collect is not None:
+                        collect(entry)
+                    if len(pending) >= FLUSH_BYTES:
+                        segment.write(pending)
+                        self._flush(segment)
+                        pending = bytearray()
+                        self._append_index(index)
+                        index = bytearray()
+                segment.write(pending)
+                self._flush(segment)
+            finally:
+                segment.close()
+            # индекс пишется только после fsync сегмента: после сбоя между
+            # ними _sync достроит индекс по сегменту
+            self._append_index(index)
+            self._sync_users(first_number + written)
+
+            checkpoint_due = (
+                self._last_seq // self.checkpoint_interval
+                != (self._last_seq + written) // self.checkpoint_interval
+            )
+            self._last_seq += written
+            if checkpoint_due:
+                self._save_checkpoint(*self._replay())
+            return written
+
+    def _append_index(self, index: bytes) -> None:
+        if index:
+            with open(self.index_path, "ab") as file:
+                file.write(index)
+                self._flush(file)
+
+    def _open_segment(self, path: str) -> Any:
+        exists = os.path.exists(path)
+        segment = open(path, "ab")
+        if self.durable and not exists:
+            # новый сегмент: его запись в каталоге тоже должна дойти до диска
+            fsync_directory(self.ledger_dir)
+        return segment
+
+    def _flush(self, file: Any) -> None:
+        file.flush()
+        if self.durable:
+            os.fsync(file.fileno())
+
+    def void(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        # сторно: запись сделки, которая не дошла до портфеля, отменяется
+        # при реплее (журнал пишется раньше портфеля)
+        delta = entry["amount_minor"]
+        if entry["action"] == "SELL":
+            delta = -delta
+        return self.append(
+            user_id=entry["user_id"],
+            action="VOID",
+            currency=entry["currency"],
+            amount_minor=entry["amount_minor"],
+            precision=entry["precision"],
+            rate=entry["rate"],
+            balance_after_minor=entry["balance_after_minor"] - delta,
+            voids=entry["seq"],
+            voided_action=entry["action"],
+        )
+
+    # ---------- чтение ----------
+
+    def _iter_index(
+        self,
+        start: int = 0,
+        stop: Optional[int] = None,
+    ) -> Iterator[Tuple[int, int, int]]:
+        try:
+            file = open(self.index_path, "rb")
+        except FileNotFoundError:
+            return
+        with file:
+            file.seek(start * INDEX_RECORD.size)
+            remaining = None if stop is None else (stop - start) * INDEX_RECORD.size
+            while remaining is None or remaining > 0:
+                size = INDEX_RECORD.size * 4096
+                if remaining is not None:
+                    size = min(size, remaining)
+                chunk = file.read(size)
+                if not chunk:
+                    return
+                usable = len(chunk) - len(chunk) % INDEX_RECORD.size
+                if remaining is not None:
+                    remaining -= usable
+                yield from INDEX_RECORD.iter_unpack(chunk[:usable])
+
+    def _user_positions(self, user_id: int) -> List[int]:
+        try:
+            with open(self._user_path(user_id), "rb") as file:
+                packed = file.read()
+        except FileNotFoundError:
+            return []
+        usable = len(packed) - len(packed) % USER_RECORD.size
+        positions: List[int] = []
+        for (number,) in USER_RECORD.iter_unpack(packed[:usable]):
+            # повторы после сбоя посреди разнесения — номера только растут
+            if not positions or number > positions[-1]:
+                positions.append(number)
+        return positions
+
+    def user_entries(
+        self,
+        user_id: int,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        # индекс пользователя — номера его записей в index.bin:
+        # читаются только они, а не весь журнал
+        with self._locked():
+            self._segment, self._last_seq = self._sync()
+        numbers = self._user_positions(user_id)
+        if limit is not None:
+            numbers = numbers[-limit:] if limit > 0 else []
+        entries = []
+        for number in numbers:
+            _user_id, segment, offset = self._index_record(number)
+            entries.append(self._read_line(segment, offset))
+        return entries
+
+    def _iter_entries_after(self, seq: int) -> Iterator[Dict[str, Any]]:
+        # запись индекса с номером N соответствует seq N + 1
+        for _user_id, segment, offset in self._iter_index(start=seq):
+            yield self._read_line(segment, offset)
+
+    # ---------- чекпоинты и реплей ----------
+
+    def has_checkpoint(self) -> bool:
+        return os.path.exists(self.checkpoint_path)
+
+    def load_checkpoint(self) -> Tuple[int, Balances]:
+        try:
+            with open(self.checkpoint_path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return 0, {}
+        balances = {
+            int(user_id): dict(wallets)
+            for user_id, wallets in data.get("balances", {}).items()
+        }
+        return int(data.get("seq", 0)), balances
+
+    def _save_checkpoint(self, seq: int, balances: Balances) -> None:
+        data = {
+            "seq": seq,
+            "created_at": datetime.now().isoformat(),
+            "balances": {
+                str(user_id): wallets for user_id, wallets in balances.items()
+            },
+        }
+        tmp_path = self.checkpoint_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(data, file, ensure_ascii=False)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def seed(self, balances_loader: Callable[[], Balances]) -> None:
+        with self._locked():
+            if not self.has_checkpoint():
+                self._segment, self._last_seq = self._sync()
+                self._save_checkpoint(self._last_seq, balances_loader())
+
+    def _replay(self) -> Tuple[int, Balances]:
+        seq, balances = self.load_checkpoint()
+        for entry in self._iter_entries_after(seq):
+            wallets = balances.setdefault(entry["user_id"], {})
+            code = entry["currency"]
+            delta = entry["amount_minor"]
+            action = entry["action"]
+            if action == "VOID":
+                # сторно действует противоположно отменённой записи
+                action = "SELL" if entry.get("voided_action") != "SELL" else "BUY"
+            if action == "SELL":
+                delta = -delta
+            wallets[code] = wallets.get(code, 0) + delta
+            seq = entry["seq"]
+        return seq, balances
+
+    def replay(self) -> Tuple[int, Balances]:
+        with self._locked():
+            self._segment, self._last_seq = self._sync()
+            return self._replay()
+
+    def write_checkpoint(self) -> None:
+        with self._locked():
+            self._segment, self._last_seq = self._sync()
+            self._save_checkpoint(*self._replay())
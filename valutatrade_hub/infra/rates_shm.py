@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import struct
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .rates_snapshot import RatesSnapshotReader
+
+# Сегмент общей памяти со снимком курсов:
+#   заголовок (магия, формат, флаги, счётчик seqlock, размер снимка)
+#   | снимок в формате rates.bin (таблица пар + float64 курсы + время)
+# Писатель делает счётчик нечётным, копирует снимок и делает его чётным;
+# читатель повторяет чтение, если счётчик нечётный или изменился.
+SHM_MAGIC = b"VTSM"
+SHM_FORMAT_VERSION = 1
+SHM_HEADER = struct.Struct("<4sHHQI4x")
+SEQ = struct.Struct("<Q")
+SEQ_OFFSET = 8
+FLAGS = struct.Struct("<H")
+FLAGS_OFFSET = 6
+# сегмент заменён более крупным: читатели переподключаются по имени
+FLAG_RETIRED = 1
+MIN_SEGMENT_SIZE = 64 * 1024
+# сначала короткие повторы без сна (запись занимает микросекунды), потом —
+# с нарастающей паузой; писатель, упавший посреди записи, оставляет счётчик
+# нечётным навсегда — тогда читатель сдаётся через READ_TIMEOUT_SECONDS
+READ_SPINS = 100
+READ_BACKOFF_SECONDS = (0.0005, 0.01)
+READ_TIMEOUT_SECONDS = 0.2
+
+
+class SharedRatesUnavailable(RuntimeError):
+    pass
+
+
+def segment_name_for(snapshot_path: str) -> str:
+    # имя выводится из пути rates.bin: процессы с одним каталогом данных
+    # находят один и тот же сегмент, разные установки не пересекаются
+    digest = hashlib.blake2b(
+        os.path.abspath(snapshot_path).encode("utf-8"),
+        digest_size=8,
+    ).hexdigest()
+    return f"vt_rates_{digest}"
+
+
+def _untrack(shm: shared_memory.SharedMemory) -> None:
+    # resource_tracker удаляет сегмент при выходе процесса, который его
+    # открыл; снимок должен переживать и писателя, и читателей
+    try:
+        resource_tracker.unregister(shm._name, "shared_memory")  # type: ignore[attr-defined]
+    except Exception:  # noqa: BLE001
+        pass
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    shm = shared_memory.SharedMemory(name=name)
+    _untrack(shm)
+    return shm
+
+
+def _create(name: str, size: int) -> shared_memory.SharedMemory:
+    shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+    _untrack(shm)
+    SHM_HEADER.pack_into(shm.buf, 0, SHM_MAGIC, SHM_FORMAT_VERSION, 0, 0, 0)
+    return shm
+
+
+def _unlink(shm: shared_memory.SharedMemory) -> None:
+    # unlink() снимает сегмент с учёта resource_tracker — возвращаем его туда,
+    # иначе трекер ругается на незнакомое имя
+    resource_tracker.register(shm._name, "shared_memory")  # type: ignore[attr-defined]
+    shm.unlink()
+
+
+def _close(shm: shared_memory.SharedMemory) -> None:
+    try:
+        shm.close()
+    except BufferError:
+        # на буфер ещё ссылается чей-то memoryview — закроется сборщиком
+        pass
+
+
+def publish_rates_snapshot(name: str, payload: bytes) -> None:
+    needed = SHM_HEADER.size + len(payload)
+    try:
+        shm = _attach(name)
+    except FileNotFoundError:
+        shm = None
+
+    if shm is not None and shm.size < needed:
+        # размер сегмента не меняется: помечаем старый и создаём новый
+        FLAGS.pack_into(shm.buf, FLAGS_OFFSET, FLAG_RETIRED)
+        _unlink(shm)
+        _close(shm)
+        shm = None
+
+    if shm is None:
+        try:
+            shm = _create(name, max(MIN_SEGMENT_SIZE, needed * 2))
+        except FileExistsError:
+            shm = _attach(name)
+
+    try:
+        buf = shm.buf
+        (seq,) = SEQ.unpack_from(buf, SEQ_OFFSET)
+        # нечётный счётчик остаётся после упавшего писателя — начинаем с него
+        begin = seq + 1 if seq % 2 == 0 else seq + 2
+        SEQ.pack_into(buf, SEQ_OFFSET, begin)
+        buf[SHM_HEADER.size:needed] = payload
+        SHM_HEADER.pack_into(
+            buf,
+            0,
+            SHM_MAGIC,
+            SHM_FORMAT_VERSION,
+            0,
+            begin + 1,
+            len(payload),
+        )
+    finally:
+        _close(shm)
+
+
+def unlink_rates_shm(name: str) -> bool:
+    try:
+        shm = _attach(name)
+    except FileNotFoundError:
+        return False
+    FLAGS.pack_into(shm.buf, FLAGS_OFFSET, FLAG_RETIRED)
+    _unlink(shm)
+    _close(shm)
+    return True
+
+
+class SharedRatesSnapshot:
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._shm = _attach(name)
+        magic, fmt, _flags, _seq, size = SHM_HEADER.unpack_from(self._shm.buf)
+        if magic != SHM_MAGIC or fmt != SHM_FORMAT_VERSION or size == 0:
+            _close(self._shm)
+            raise ValueError("Сегмент курсов пуст или имеет неизвестный формат")
+
+    def _reattach(self) -> bool:
+        try:
+            shm = _attach(self.name)
+        except FileNotFoundError:
+            # новый сегмент ещё не создан — дочитываем старый
+            return False
+        _close(self._shm)
+        self._shm = shm
+        return True
+
+    def _read(self, func: Callable[[RatesSnapshotReader], Any]) -> Any:
+        deadline = None
+        pause = READ_BACKOFF_SECONDS[0]
+        attempt = 0
+        while True:
+            if attempt >= READ_SPINS:
+                now = time.monotonic()
+                if deadline is None:
+                    deadline = now + READ_TIMEOUT_SECONDS
+                elif now >= deadline:
+                    raise SharedRatesUnavailable(
+                        f"Сегмент курсов {self.name} не удаётся прочитать целиком",
+                    )
+                time.sleep(pause)
+                pause = min(pause * 2, READ_BACKOFF_SECONDS[1])
+            attempt += 1
+            buf = self._shm.buf
+            _magic, _fmt, flags, before, size = SHM_HEADER.unpack_from(buf)
+            if flags & FLAG_RETIRED and self._reattach():
+                continue
+            if before % 2:
+                continue
+            view = buf[SHM_HEADER.size:SHM_HEADER.size + size]
+            try:
+                result = func(RatesSnapshotReader(view))
+            except (ValueError, struct.error):
+                # снимок переписывается прямо сейчас
+                result = None
+            finally:
+                view.release()
+            (after,) = SEQ.unpack_from(buf, SEQ_OFFSET)
+            if before == after:
+                return result
+
+    def get(self, pair: str) -> Optional[Tuple[float, str]]:
+        return self._read(lambda reader: reader.get(pair))
+
+    def items(self) -> List[Tuple[str, Tuple[float, str]]]:
+        return self._read(lambda reader: list(reader.items()))
+
+    def copy(self) -> Tuple[str, Dict[str, Tuple[float, str]]]:
+        # время обновления и курсы одной версии снимка — за одно чтение
+        result = self._read(
+            lambda reader: (reader.last_refresh, dict(reader.items())),
+        )
+        if result is None:
+            raise SharedRatesUnavailable(f"Сегмент курсов {self.name} повреждён")
+        return result
+
+    @property
+    def last_refresh(self) -> str:
+        return self._read(lambda reader: reader.last_refresh)
+
+    @property
+    def version(self) -> int:
+        return self._read(lambda reader: reader.version)
+
+    def close(self) -> None:
+        _close(self._shm)
+
+
+def open_rates_shm(name: str) -> Optional[SharedRatesSnapshot]:
+    try:
+        return SharedRatesSnapshot(name)
+    except (FileNotFoundError, ValueError, struct.error):
+        return None
+
@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, Optional, Tuple
+
+from .group_commit import fsync_directory, write_file_atomic
+
+# Бинарный снимок курсов:
+#   заголовок | отсортированная таблица кодов пар | float64 курсы | int64 время (мкс)
+MAGIC = b"VTRS"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sHHQqI4x")
+CODE_SIZE = 16
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def iso_to_micros(value: str) -> int:
+    if not value:
+        return 0
+    moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    delta = moment - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def micros_to_iso(value: int) -> str:
+    if not value:
+        return ""
+    moment = _EPOCH + timedelta(microseconds=value)
+    return moment.isoformat().replace("+00:00", "Z")
+
+
+def _encode_code(pair: str) -> bytes:
+    raw = pair.upper().encode("ascii")
+    if len(raw) > CODE_SIZE:
+        raise ValueError(f"Слишком длинный код пары '{pair}'")
+    return raw.ljust(CODE_SIZE, b"\0")
+
+
+def fits_snapshot(pair: str) -> bool:
+    try:
+        _encode_code(pair)
+    except ValueError:
+        # UnicodeEncodeError — подкласс ValueError
+        return False
+    return True
+
+
+def encode_rates_snapshot(
+    pairs: Dict[str, Tuple[float, str]],
+    last_refresh: str,
+    version: Optional[int] = None,
+) -> bytes:
+    items = sorted((_encode_code(pair), value) for pair, value in pairs.items())
+    count = len(items)
+    stamp = version if version is not None else time.time_ns()
+
+    header = HEADER.pack(
+        MAGIC,
+        FORMAT_VERSION,
+        0,
+        stamp,
+        iso_to_micros(last_refresh),
+        count,
+    )
+    codes = b"".join(code for code, _ in items)
+    rates = struct.pack(f"<{count}d", *(float(rate) for _, (rate, _) in items))
+    updated = struct.pack(
+        f"<{count}q",
+        *(iso_to_micros(updated_at) for _, (_, updated_at) in items),
+    )
+    return header + codes + rates + updated
+
+
+def write_rates_snapshot(
+    path: str,
+    pairs: Dict[str, Tuple[float, str]],
+    last_refresh: str,
+) -> int:
+    return write_snapshot_payload(path, encode_rates_snapshot(pairs, last_refresh))
+
+
+def write_snapshot_payload(path: str, payload: bytes) -> int:
+    # уникальный временный файл и fsync до os.replace: два обновлятеля
+    # не пишут в один .tmp, после сбоя не остаётся пустого rates.bin
+    write_file_atomic(path, payload, sync=True)
+    fsync_directory(os.path.dirname(path) or ".")
+    return HEADER.unpack_from(payload)[3]
+
+
+def read_snapshot_version(path: str) -> Optional[int]:
+    try:
+        with open(path, "rb") as file:
+            head = file.read(HEADER.size)
+    except FileNotFoundError:
+        return None
+    if len(head) < HEADER.size:
+        return None
+    magic, fmt, _flags, version, _refresh, _count = HEADER.unpack(head)
+    if magic != MAGIC or fmt != FORMAT_VERSION:
+        return None
+    return version
+
+
+class RatesSnapshotReader:
+
+    def __init__(self, buffer: object) -> None:
+        self._buf = buffer
+        magic, fmt, _flags, version, refresh, count = HEADER.unpack_from(buffer)
+        if magic != MAGIC or fmt != FORMAT_VERSION:
+            raise ValueError("Неизвестный формат бинарного снимка курсов")
+        self.version: int = version
+        self.count: int = count
+        self._last_refresh_us = refresh
+        self._codes_off = HEADER.size
+        self._rates_off = self._codes_off + count * CODE_SIZE
+        self._updated_off = self._rates_off + count * 8
+        if len(buffer) < self._updated_off + count * 8:  # type: ignore[arg-type]
+            raise ValueError("Бинарный снимок курсов повреждён")
+
+    @property
+    def last_refresh(self) -> str:
+        return micros_to_iso(self._last_refresh_us)
+
+    def _code_at(self, idx: int) -> bytes:
+        start = self._codes_off + idx * CODE_SIZE
+        return bytes(self._buf[start:start + CODE_SIZE])  # type: ignore[index]
+
+    def _find(self, pair: str) -> int:
+        key = _encode_code(pair)
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            code = self._code_at(mid)
+            if code < key:
+                lo = mid + 1
+            elif code > key:
+                hi = mid
+            else:
+                return mid
+        return -1
+
+    def _entry(self, idx: int) -> Tuple[float, str]:
+        (rate,) = struct.unpack_from("<d", self._buf, self._rates_off + idx * 8)
+        (updated,) = struct.unpack_from(
+            "<q",
+            self._buf,
+            self._updated_off + idx * 8,
+        )
+        return rate, micros_to_iso(updated)
+
+    def get(self, pair: str) -> Optional[Tuple[float, str]]:
+        try:
+            idx = self._find(pair)
+        except (UnicodeEncodeError, ValueError):
+            return None
+        if idx < 0:
+            return None
+        return self._entry(idx)
+
+    def items(self) -> Iterator[Tuple[str, Tuple[float, str]]]:
+        for idx in range(self.count):
+            code = self._code_at(idx).rstrip(b"\0").decode("ascii")
+            yield code, self._entry(idx)
+
+
+class MappedRatesSnapshot(RatesSnapshotReader):
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as file:
+            self._mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            super().__init__(self._mm)
+        except ValueError:
+            self._mm.close()
+            raise
+
+    def is_current(self) -> bool:
+        return read_snapshot_version(self.path) == self.version
+
+    def close(self) -> None:
+        self._mm.close()
+
+
+def open_rates_snapshot(path: str) -> Optional[MappedRatesSnapshot]:
+    try:
+        return MappedRatesSnapshot(path)
+    except (FileNotFoundError, ValueError, struct.error):
+        return None
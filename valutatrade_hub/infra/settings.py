@@ -3,46 +3,81 @@ from __future__ import annotations
 
 import json
 import os
+import threading
 from typing import Any, Dict, Optional
 
 
 class SettingsLoader:
 
     _instance: Optional["SettingsLoader"] = None
+    _lock = threading.Lock()
 
     def __new__(cls) -> "SettingsLoader":
         if cls._instance is None:
-            cls._instance = super().__new__(cls)
-            cls._instance._init_settings()
+            with cls._lock:
+                if cls._instance is None:
+                    instance = super().__new__(cls)
+                    instance._init_settings()
+                    cls._instance = instance
         return cls._instance
 
     def _init_settings(self) -> None:
         base_dir = os.path.dirname(os.path.abspath(__file__))
         base_dir = os.path.dirname(os.path.dirname(base_dir))
         config_path = os.path.join(base_dir, "config.json")
+        data_dir = os.getenv("VALUTATRADE_DATA_DIR", os.path.join(base_dir, "data"))
+        log_dir = os.getenv("VALUTATRADE_LOG_DIR", os.path.join(base_dir, "logs"))
 
         defaults: Dict[str, Any] = {
-            "DATA_DIR": os.path.join(base_dir, "data"),
+            "DATA_DIR": data_dir,
             "RATES_TTL_SECONDS": 31536000,  # 1 год — кэш почти не протухает
+            "RATES_CACHE_TTL_SECONDS": 5,
+            "RATES_REFRESH_RETRY_SECONDS": 60,
+            # читать курсы из общей памяти, которую заполняет обновлятель
+            "RATES_SHM_ENABLED": os.getenv("VALUTATRADE_RATES_SHM", "1") != "0",
             "BASE_CURRENCY": "USD",
-            "LOG_DIR": os.path.join(base_dir, "logs"),
-            "LOG_FILE": os.path.join(base_dir, "logs", "actions.log"),
+            "LOG_DIR": log_dir,
+            "LOG_FILE": os.path.join(log_dir, "actions.log"),
             "LOG_LEVEL": "INFO",
+            # индекс аудита по actions.log и его ротированным копиям
+            "AUDIT_DIR": os.path.join(log_dir, "audit"),
+            "LEDGER_DIR": os.path.join(data_dir, "ledger"),
+            "LEDGER_SEGMENT_MAX_BYTES": 1_000_000,
+            "LEDGER_CHECKPOINT_INTERVAL": 100,
+            # durable — fsync перед ответом, relaxed — без fsync,
+            # async — не ждать записи (максимальная пропускная способность)
+            "DB_DURABILITY": "durable",
+            "DB_COMMIT_WINDOW_MS": 5,
+            # json | json-compact | marshal; при чтении формат определяется сам
+            "DB_CODEC": "json",
+            # json — users.json целиком; jsonl — users.jsonl с индексом смещений
+            "USERS_STORE": "json",
+            # процессы для хэширования паролей в import-users; 0 — по числу CPU
+            "IMPORT_HASH_WORKERS": 0,
+            # снимок разобранного состояния для быстрого запуска CLI;
+            # строится командой warm-start, устаревшие файлы читаются заново
+            "WARM_START_ENABLED": os.getenv("VALUTATRADE_WARM_START", "1") != "0",
+            "WARM_START_FILE": os.path.join(data_dir, ".warm-start.bin"),
+            # каталоги-шарды для портфелей; пусто — всё в DATA_DIR
+            "DATA_SHARDS": [],
+            "SHARD_VNODES": 128,
         }
 
-        self._settings: Dict[str, Any] = defaults
-
         if os.path.exists(config_path):
             try:
                 with open(config_path, "r", encoding="utf-8") as file:
                     loaded = json.load(file)
-                self._settings.update(loaded)
+                defaults.update(loaded)
             except Exception:
                 pass
 
+        # словарь подменяется целиком: читатели не видят его наполовину
+        self._settings: Dict[str, Any] = defaults
+
     def get(self, key: str, default: Any = None) -> Any:
         return self._settings.get(key, default)
 
     def reload(self) -> None:
-        self._init_settings()
+        with self._lock:
+            self._init_settings()
 
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import hashlib
+import os
+from bisect import bisect_right
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from valutatrade_hub.infra.codecs import load_file
+
+PORTFOLIOS_FILE_NAME = "portfolios.json"
+DEFAULT_VNODES = 128
+
+
+def _point(key: str) -> int:
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+class HashRing:
+
+    def __init__(self, shards: Sequence[str], vnodes: int = DEFAULT_VNODES) -> None:
+        if not shards:
+            raise ValueError("Нужен хотя бы один шард")
+        self.shards: Tuple[str, ...] = tuple(dict.fromkeys(shards))
+        self.vnodes = vnodes
+        # у каждого шарда vnodes точек на кольце: при добавлении шарда
+        # к нему переходит примерно 1/N ключей, остальные остаются на месте
+        ring = sorted(
+            (_point(f"{shard}#{idx}"), shard)
+            for shard in self.shards
+            for idx in range(vnodes)
+        )
+        self._points = [point for point, _shard in ring]
+        self._owners = [shard for _point_, shard in ring]
+
+    def shard_for(self, key: object) -> str:
+        idx = bisect_right(self._points, _point(str(key)))
+        return self._owners[idx % len(self._owners)]
+
+    def distribution(self, keys: Iterable[object]) -> Dict[str, int]:
+        counts = {shard: 0 for shard in self.shards}
+        for key in keys:
+            counts[self.shard_for(key)] += 1
+        return counts
+
+
+class ShardRouter:
+
+    def __init__(self, shards: Sequence[str], vnodes: int = DEFAULT_VNODES) -> None:
+        self.ring = HashRing([os.path.abspath(shard) for shard in shards], vnodes)
+
+    @property
+    def shards(self) -> Tuple[str, ...]:
+        return self.ring.shards
+
+    def path_for_shard(self, shard: str) -> str:
+        return os.path.join(shard, PORTFOLIOS_FILE_NAME)
+
+    def portfolios_path(self, user_id: int) -> str:
+        return self.path_for_shard(self.ring.shard_for(user_id))
+
+    def portfolios_paths(self) -> List[str]:
+        return [self.path_for_shard(shard) for shard in self.shards]
+
+
+def layout_record(router: ShardRouter) -> Dict[str, Any]:
+    return {"shards": list(router.shards), "vnodes": router.ring.vnodes}
+
+
+def load_layout(path: str) -> Optional[ShardRouter]:
+    data = load_file(path, None)
+    if not isinstance(data, dict):
+        return None
+    shards = data.get("shards")
+    if not isinstance(shards, list) or not shards:
+        return None
+    return ShardRouter(
+        [str(shard) for shard in shards],
+        int(data.get("vnodes", DEFAULT_VNODES)),
+    )
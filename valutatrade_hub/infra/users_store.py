@@ -0,0 +1,269 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import struct
+import sys
+import threading
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Запись индекса: user_id, хэш имени, смещение строки, длина строки.
+# Индекс только ускоряет поиск: его всегда можно построить заново по users.jsonl.
+INDEX_RECORD = struct.Struct("<q8sQI4x")
+
+Position = Tuple[int, int]
+
+
+def _name_key(username: str) -> bytes:
+    return hashlib.blake2b(username.encode("utf-8"), digest_size=8).digest()
+
+
+class JsonLinesUsersStore:
+
+    def __init__(
+        self,
+        path: str,
+        index_path: Optional[str] = None,
+        durable: bool = True,
+    ) -> None:
+        self.path = path
+        self.index_path = index_path or path + ".idx"
+        self.durable = durable
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        # индекс держится в памяти как есть, без словарей: поиск имени —
+        # это bytes.find по 8-байтовому хэшу, он быстрее разбора записей
+        self._raw = bytearray()
+        self._max_id = 0
+        # сколько байт индекса прочитано и до какого места в данных он доходит
+        self._index_pos = 0
+        self._end = 0
+        # строки данных без записи в индексе (сбой между двумя записями)
+        self._unindexed = bytearray()
+
+    # ---------- индекс ----------
+
+    def _add_entries(self, packed: bytes) -> None:
+        if not packed:
+            return
+        self._raw += packed
+        # запись индекса — четыре int64: id, хэш, смещение, длина
+        words = array("q", packed)
+        if sys.byteorder != "little":
+            words.byteswap()
+        self._max_id = max(self._max_id, max(words[0::4]))
+        self._end = max(
+            self._end,
+            max(offset + length for offset, length in zip(words[2::4], words[3::4])),
+        )
+
+    def _scan_data(self, start: int) -> None:
+        try:
+            file = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+        packed = bytearray()
+        with file:
+            file.seek(start)
+            offset = start
+            for raw in file:
+                if not raw.endswith(b"\n"):
+                    # недописанная строка после сбоя
+                    break
+                try:
+                    record = json.loads(raw)
+                    packed += INDEX_RECORD.pack(
+                        int(record["user_id"]),
+                        _name_key(record["username"]),
+                        offset,
+                        len(raw),
+                    )
+                except (ValueError, KeyError, TypeError):
+                    pass
+                offset += len(raw)
+        self._end = max(self._end, offset)
+        self._add_entries(bytes(packed))
+        self._unindexed += packed
+
+    def _sync(self) -> None:
+        # догоняем записи, добавленные с прошлого раза (в том числе другими
+        # процессами), и строки данных, до которых индекс не дошёл
+        try:
+            with open(self.index_path, "rb") as file:
+                file.seek(self._index_pos)
+                chunk = file.read()
+        except FileNotFoundError:
+            chunk = b""
+        usable = len(chunk) - len(chunk) % INDEX_RECORD.size
+        self._add_entries(chunk[:usable])
+        self._index_pos += usable
+
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            size = 0
+        if size > self._end:
+            self._scan_data(self._end)
+
+    def _write_index(self, packed: bytes = b"") -> None:
+        packed = bytes(self._unindexed) + packed
+        self._unindexed = bytearray()
+        if not packed:
+            return
+        with open(self.index_path, "ab") as file:
+            file.write(packed)
+        self._index_pos += len(packed)
+
+    def rebuild_index(self) -> int:
+        with self._lock:
+            try:
+                os.remove(self.index_path)
+            except FileNotFoundError:
+                pass
+            self._reset()
+            self._scan_data(0)
+            self._write_index()
+            return len(self._raw) // INDEX_RECORD.size
+
+    def _positions(self, needle: bytes, field_offset: int) -> List[Position]:
+        positions = []
+        start = 0
+        while True:
+            found = self._raw.find(needle, start)
+            if found < 0:
+                return positions
+            start = found + 1
+            if found % INDEX_RECORD.size != field_offset:
+                continue
+            record_start = found - field_offset
+            _user_id, _key, offset, length = INDEX_RECORD.unpack_from(
+                self._raw,
+                record_start,
+            )
+            positions.append((offset, length))
+
+    # ---------- чтение ----------
+
+    def _read(self, position: Position) -> Optional[Dict[str, Any]]:
+        offset, length = position
+        with open(self.path, "rb") as file:
+            file.seek(offset)
+            raw = file.read(length)
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return None
+
+    def find_by_username(self, username: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._sync()
+            positions = self._positions(_name_key(username), 8)
+        for position in positions:
+            record = self._read(position)
+            # у разных имён может совпасть хэш — сверяем само имя
+            if record is not None and record.get("username") == username:
+                return record
+        return None
+
+    def find_by_id(self, user_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._sync()
+            positions = self._positions(struct.pack("<q", user_id), 0)
+        for position in positions:
+            record = self._read(position)
+            if record is not None and record.get("user_id") == user_id:
+                return record
+        return None
+
+    def next_user_id(self) -> int:
+        with self._lock:
+            self._sync()
+            return self._max_id + 1
+
+    def count(self) -> int:
+        with self._lock:
+            self._sync()
+            return len(self._raw) // INDEX_RECORD.size
+
+    def iter_records(self) -> Iterator[Dict[str, Any]]:
+        try:
+            file = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+        with file:
+            for raw in file:
+                if not raw.endswith(b"\n"):
+                    return
+                try:
+                    yield json.loads(raw)
+                except ValueError:
+                    continue
+
+    # ---------- запись ----------
+
+    def _encode(
+        self,
+        records: Iterable[Dict[str, Any]],
+    ) -> List[Tuple[Dict[str, Any], bytes]]:
+        return [
+            (record, (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+            for record in records
+        ]
+
+    def append(self, records: Iterable[Dict[str, Any]]) -> None:
+        encoded = self._encode(records)
+        if not encoded:
+            return
+        with self._lock:
+            self._sync()
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "ab") as file:
+                start = file.tell()
+                prefix = b""
+                if start > self._end:
+                    # хвост от прерванной записи: начинаем с новой строки,
+                    # обрывок останется отдельной (пропускаемой) строкой
+                    prefix = b"\n"
+                file.write(prefix + b"".join(line for _record, line in encoded))
+                if self.durable:
+                    file.flush()
+                    os.fsync(file.fileno())
+            offset = start + len(prefix)
+            packed = bytearray()
+            for record, line in encoded:
+                packed += INDEX_RECORD.pack(
+                    int(record["user_id"]),
+                    _name_key(record["username"]),
+                    offset,
+                    len(line),
+                )
+                offset += len(line)
+            self._add_entries(bytes(packed))
+            self._write_index(bytes(packed))
+
+    def rewrite(self, records: Iterable[Dict[str, Any]]) -> None:
+        encoded = self._encode(records)
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "wb") as file:
+                file.write(b"".join(line for _record, line in encoded))
+                if self.durable:
+                    file.flush()
+                    os.fsync(file.fileno())
+            os.replace(tmp_path, self.path)
+            try:
+                os.remove(self.index_path)
+            except FileNotFoundError:
+                pass
+            self._reset()
+            self._scan_data(0)
+            self._write_index()
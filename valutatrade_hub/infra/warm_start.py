@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+import hashlib
+import marshal
+import os
+import struct
+import sys
+from array import array
+from collections.abc import Sequence
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .codecs import decode_auto
+
+# Снимок для быстрого запуска: заголовок (магия, версия формата, версия marshal,
+# версия Python, длина оглавления) + оглавление + данные файлов.
+# Оглавление: {путь: (подпись, начало, конец, смещения записей, ключи, поле)}.
+# Каждая запись массива лежит отдельным marshal-блоком: при запуске разбирается
+# только оглавление, записи — по мере обращения к ним. Смещения — int64 подряд,
+# ключи — 8-байтовые хэши поля записи в порядке записей (как в users_store:
+# без словарей, поиск — bytes.find).
+# Источник истины — сами файлы состояния: снимок лишь избавляет от их разбора.
+WARM_MAGIC = b"VTWS"
+WARM_HEADER = struct.Struct("<4sHHIQ")
+WARM_FORMAT_VERSION = 1
+
+# (inode, mtime в нс, размер): запись через os.replace всегда меняет inode
+Signature = Tuple[int, int, int]
+Entry = Tuple[Signature, int, int, Optional[bytes], Optional[bytes], Optional[str]]
+KEY_SIZE = 8
+
+
+def file_signature(path: str) -> Optional[Signature]:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def _key_hash(value: Any) -> bytes:
+    return hashlib.blake2b(repr(value).encode("utf-8"), digest_size=KEY_SIZE).digest()
+
+
+def _int64(packed: bytes) -> array:
+    words = array("q", packed)
+    if sys.byteorder != "little":
+        words.byteswap()
+    return words
+
+
+def _header(toc_size: int) -> bytes:
+    # marshal меняется между версиями Python: чужой снимок просто не читается
+    return WARM_HEADER.pack(
+        WARM_MAGIC,
+        WARM_FORMAT_VERSION,
+        marshal.version,
+        sys.hexversion >> 16,
+        toc_size,
+    )
+
+
+class WarmRecords(Sequence):
+    # массив записей из снимка: запись разбирается при первом обращении
+
+    def __init__(self, payload: memoryview, offsets: bytes) -> None:
+        self._payload = payload
+        self._offsets = _int64(offsets)
+        self._decoded: Dict[int, Any] = {}
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, position: Any) -> Any:
+        if isinstance(position, slice):
+            return [self[idx] for idx in range(*position.indices(len(self)))]
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError(position)
+        record = self._decoded.get(position)
+        if record is None:
+            start, end = self._offsets[position], self._offsets[position + 1]
+            record = marshal.loads(self._payload[start:end])
+            self._decoded[position] = record
+        return record
+
+    def __iter__(self) -> Iterator[Any]:
+        for position in range(len(self)):
+            yield self[position]
+
+    def __add__(self, other: Any) -> List[Any]:
+        return list(self) + list(other)
+
+
+class Index:
+    # значение поля записи -> позиция в массиве снимка
+
+    def __init__(self, records: WarmRecords, keys: bytes, field: str) -> None:
+        self._records = records
+        self._keys = keys
+        self._field = field
+
+    def get(self, value: Any) -> Optional[int]:
+        needle = _key_hash(value)
+        start = 0
+        while True:
+            found = self._keys.find(needle, start)
+            if found < 0:
+                return None
+            start = found + 1
+            if found % KEY_SIZE:
+                continue
+            position = found // KEY_SIZE
+            # у разных значений может совпасть хэш — сверяем само поле
+            record = self._records[position]
+            if isinstance(record, dict) and record.get(self._field) == value:
+                return position
+
+
+class WarmStart:
+
+    def __init__(self, payload: memoryview, entries: Dict[str, Entry]) -> None:
+        self._payload = payload
+        self._entries = entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def take(self, path: str) -> Optional[Tuple[Any, Optional[Index]]]:
+        # каждая запись отдаётся один раз: дальше файл читается как обычно
+        entry = self._entries.pop(path, None)
+        if entry is None:
+            return None
+        signature, start, end, offsets, keys, field = entry
+        if file_signature(path) != signature:
+            # файл изменился после снимка — разбираем его заново
+            return None
+        payload = self._payload[start:end]
+        if offsets is None:
+            return marshal.loads(payload), None
+        records = WarmRecords(payload, offsets)
+        if keys is None or field is None:
+            return records, None
+        return records, Index(records, keys, field)
+
+
+def load_warm_start(path: str) -> Optional[WarmStart]:
+    # одно чтение; любой сбой — значит, снимка нет
+    try:
+        with open(path, "rb") as file:
+            payload = file.read()
+    except FileNotFoundError:
+        return None
+    if len(payload) < WARM_HEADER.size:
+        return None
+    toc_size = WARM_HEADER.unpack_from(payload)[-1]
+    if payload[: WARM_HEADER.size] != _header(toc_size):
+        return None
+    view = memoryview(payload)
+    toc_end = WARM_HEADER.size + toc_size
+    try:
+        entries = marshal.loads(view[WARM_HEADER.size:toc_end])
+    except (EOFError, ValueError, TypeError):
+        return None
+    if not isinstance(entries, dict):
+        return None
+    return WarmStart(view[toc_end:], entries)
+
+
+def _encode(
+    data: Any,
+    field: Optional[str],
+) -> Tuple[bytes, Optional[bytes], Optional[bytes]]:
+    if not isinstance(data, list):
+        return marshal.dumps(data, marshal.version), None, None
+    blocks = [marshal.dumps(record, marshal.version) for record in data]
+    offsets = array("q", [0])
+    for block in blocks:
+        offsets.append(offsets[-1] + len(block))
+    if sys.byteorder != "little":
+        offsets.byteswap()
+    keys = None
+    if field is not None:
+        # запись без поля получает пустой хэш: позиции не сдвигаются
+        keys = b"".join(
+            _key_hash(record[field])
+            if isinstance(record, dict) and field in record
+            else bytes(KEY_SIZE)
+            for record in data
+        )
+    return b"".join(blocks), offsets.tobytes(), keys
+
+
+def write_warm_start(path: str, sources: Dict[str, Optional[str]]) -> int:
+    # sources: путь файла -> поле записи для индекса позиций (или None)
+    entries: Dict[str, Entry] = {}
+    chunks: List[bytes] = []
+    position = 0
+    for source, field in sources.items():
+        signature = file_signature(source)
+        if signature is None:
+            continue
+        try:
+            with open(source, "rb") as file:
+                data = decode_auto(file.read())
+        except (FileNotFoundError, ValueError):
+            continue
+        if file_signature(source) != signature:
+            # файл заменили во время чтения: лучше без него, чем с чужой подписью
+            continue
+        blob, offsets, keys = _encode(data, field)
+        end = position + len(blob)
+        entries[source] = (signature, position, end, offsets, keys, field)
+        chunks.append(blob)
+        position += len(blob)
+
+    toc = marshal.dumps(entries, marshal.version)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(_header(len(toc)) + toc)
+        file.writelines(chunks)
+    os.replace(tmp_path, path)
+    return len(entries)
+
+
+def remove_warm_start(path: str) -> bool:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        return False
+    return True
@@ -3,11 +3,13 @@ from __future__ import annotations
 
 import logging
 import os
+import threading
 from logging.handlers import RotatingFileHandler
 
 from valutatrade_hub.infra.settings import SettingsLoader
 
 _LOGGER_NAME = "valutatrade"
+_setup_lock = threading.Lock()
 
 
 def _setup_logging() -> logging.Logger:
@@ -46,5 +48,9 @@ def _setup_logging() -> logging.Logger:
 
 
 def get_logger() -> logging.Logger:
-    return _setup_logging()
+    logger = logging.getLogger(_LOGGER_NAME)
+    if logger.handlers:
+        return logger
+    with _setup_lock:
+        return _setup_logging()
 
@@ -1,16 +1,24 @@
 from abc import ABC, abstractmethod
-from typing import Dict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
 
 import requests
 
 from valutatrade_hub.core.exceptions import ApiRequestError
 
 from .config import ParserConfig
+from .http_fixtures import build_transport
 
 
 class BaseApiClient(ABC):
     def __init__(self, config: ParserConfig) -> None:
         self.config = config
+        self.timeout: float = config.REQUEST_TIMEOUT
+        self.transport = build_transport(config)
+        self.chunk_errors: List[str] = []
+
+    def _get(self, url: str, params: Optional[Dict[str, str]] = None) -> Any:
+        return self.transport.get(url, params=params, timeout=self.timeout)
 
     @property
     @abstractmethod
@@ -21,23 +29,30 @@ class BaseApiClient(ABC):
     def fetch_rates(self) -> Dict[str, float]:
         raise NotImplementedError
 
+    def request_cost(self) -> int:
+        return 1
+
 
 class CoinGeckoClient(BaseApiClient):
     @property
     def name(self) -> str:
         return "CoinGecko"
 
-    def fetch_rates(self) -> Dict[str, float]:
-        ids = ",".join(self.config.CRYPTO_ID_MAP.values())
+    def _chunks(self) -> List[List[Tuple[str, str]]]:
+        items = list(self.config.CRYPTO_ID_MAP.items())
+        size = max(1, self.config.COINGECKO_CHUNK_SIZE)
+        return [items[start:start + size] for start in range(0, len(items), size)]
+
+    def request_cost(self) -> int:
+        return max(1, len(self._chunks()))
+
+    def _fetch_chunk(self, chunk: List[Tuple[str, str]]) -> Dict[str, float]:
+        ids = ",".join(sorted({coin_id for _code, coin_id in chunk}))
         vs_currency = self.config.BASE_CURRENCY.lower()
         params = {"ids": ids, "vs_currencies": vs_currency}
 
         try:
-            response = requests.get(
-                self.config.COINGECKO_URL,
-                params=params,
-                timeout=self.config.REQUEST_TIMEOUT,
-            )
+            response = self._get(self.config.COINGECKO_URL, params=params)
         except requests.exceptions.RequestException as exc:  # noqa: TRY003
             raise ApiRequestError(f"CoinGecko: ошибка сети: {exc}") from exc
 
@@ -50,7 +65,7 @@ class CoinGeckoClient(BaseApiClient):
             raise ApiRequestError("CoinGecko: некорректный JSON") from exc
 
         rates: Dict[str, float] = {}
-        for code, coin_id in self.config.CRYPTO_ID_MAP.items():
+        for code, coin_id in chunk:
             coin_info = data.get(coin_id)
             if not isinstance(coin_info, dict):
                 continue
@@ -66,6 +81,29 @@ class CoinGeckoClient(BaseApiClient):
 
         return rates
 
+    def fetch_rates(self) -> Dict[str, float]:
+        self.chunk_errors = []
+        chunks = self._chunks()
+        if len(chunks) <= 1:
+            return self._fetch_chunk(chunks[0] if chunks else [])
+
+        rates: Dict[str, float] = {}
+        workers = max(1, min(self.config.COINGECKO_MAX_WORKERS, len(chunks)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(self._fetch_chunk, chunk) for chunk in chunks]
+            for future in futures:
+                try:
+                    rates.update(future.result())
+                except ApiRequestError as exc:
+                    self.chunk_errors.append(str(exc))
+
+        if not rates and self.chunk_errors:
+            raise ApiRequestError(
+                f"CoinGecko: все {len(chunks)} пакетов завершились ошибкой "
+                f"({self.chunk_errors[0]})",
+            )
+        return rates
+
 
 class ExchangeRateApiClient(BaseApiClient):
     @property
@@ -83,7 +121,7 @@ class ExchangeRateApiClient(BaseApiClient):
         )
 
         try:
-            response = requests.get(url, timeout=self.config.REQUEST_TIMEOUT)
+            response = self._get(url)
         except requests.exceptions.RequestException as exc:  # noqa: TRY003
             raise ApiRequestError(f"ExchangeRate-API: ошибка сети: {exc}") from exc
 
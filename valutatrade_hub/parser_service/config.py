@@ -1,31 +1,112 @@
 
 from __future__ import annotations
 
+import json
 import os
 from dataclasses import dataclass, field
 
+CRYPTO_IDS_FILE = os.getenv("CRYPTO_IDS_FILE", "data/crypto_ids.json")
+
+DEFAULT_CRYPTO_ID_MAP = {
+    "BTC": "bitcoin",
+    "ETH": "ethereum",
+    "SOL": "solana",
+}
+
+
+def load_crypto_id_map(path: str = CRYPTO_IDS_FILE) -> dict[str, str]:
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            data = json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return dict(DEFAULT_CRYPTO_ID_MAP)
+    if not isinstance(data, dict) or not data:
+        return dict(DEFAULT_CRYPTO_ID_MAP)
+    return {str(code).upper(): str(coin_id) for code, coin_id in data.items()}
+
 
 @dataclass
 class ParserConfig:
 
     EXCHANGERATE_API_KEY: str = os.getenv("EXCHANGERATE_API_KEY", "")
 
-    COINGECKO_URL: str = "https://api.coingecko.com/api/v3/simple/price"
-    EXCHANGERATE_API_URL: str = "https://v6.exchangerate-api.com/v6"
+    COINGECKO_URL: str = os.getenv(
+        "COINGECKO_URL",
+        "https://api.coingecko.com/api/v3/simple/price",
+    )
+    EXCHANGERATE_API_URL: str = os.getenv(
+        "EXCHANGERATE_API_URL",
+        "https://v6.exchangerate-api.com/v6",
+    )
+
+    # live | record | replay
+    HTTP_MODE: str = os.getenv("VALUTATRADE_HTTP_MODE", "live")
+    FIXTURES_DIR: str = "data/fixtures"
+    REPLAY_LATENCY: bool = False
 
     BASE_CURRENCY: str = "USD"
     FIAT_CURRENCIES: tuple[str, ...] = ("EUR", "GBP", "RUB")
     CRYPTO_CURRENCIES: tuple[str, ...] = ("BTC", "ETH", "SOL")
-    CRYPTO_ID_MAP: dict[str, str] = field(
+    CRYPTO_IDS_FILE: str = CRYPTO_IDS_FILE
+    # пустая карта — читается из CRYPTO_IDS_FILE этого конфига
+    CRYPTO_ID_MAP: dict[str, str] = field(default_factory=dict)
+
+    COINGECKO_CHUNK_SIZE: int = 50
+    COINGECKO_MAX_WORKERS: int = 4
+
+    # формат rates.json: json | json-compact | marshal
+    STATE_CODEC: str = os.getenv("VALUTATRADE_STATE_CODEC", "json")
+
+    RATES_FILE_PATH: str = "data/rates.json"
+    RATES_BINARY_PATH: str = "data/rates.bin"
+    # публиковать снимок в общую память для других процессов
+    RATES_SHM_ENABLED: bool = os.getenv("VALUTATRADE_RATES_SHM", "1") != "0"
+    HISTORY_FILE_PATH: str = "data/exchange_rates.json"
+    HISTORY_BARS_PATH: str = "data/exchange_rates_bars.json"
+    HISTORY_SEGMENT_PATH: str = "data/exchange_rates.seg"
+
+    HISTORY_RAW_RETENTION_SECONDS: int = 86400
+    HISTORY_BAR_RETENTION_SECONDS: dict[str, int] = field(
         default_factory=lambda: {
-            "BTC": "bitcoin",
-            "ETH": "ethereum",
-            "SOL": "solana",
+            "1m": 7 * 86400,
+            "1h": 90 * 86400,
         },
     )
 
-    RATES_FILE_PATH: str = "data/rates.json"
-    HISTORY_FILE_PATH: str = "data/exchange_rates.json"
+    # одно обновление на все процессы: lock-файл с арендой и общий результат
+    UPDATE_LOCK_PATH: str = "data/update.lock"
+    UPDATE_RESULT_PATH: str = "data/update_result.json"
+    UPDATE_LEASE_SECONDS: float = 30.0
+    UPDATE_HEARTBEAT_SECONDS: float = 5.0
+    UPDATE_POLL_SECONDS: float = 0.2
 
     REQUEST_TIMEOUT: int = 10
+    MIN_REQUEST_TIMEOUT: float = 1.0
+    TIMEOUT_LATENCY_FACTOR: float = 4.0
+
+    HEALTH_FILE_PATH: str = "data/source_health.json"
+    HEALTH_EWMA_ALPHA: float = 0.3
+    BREAKER_FAILURE_THRESHOLD: int = 3
+    BREAKER_COOLDOWN_SECONDS: int = 600
+
+    QUOTA_FILE_PATH: str = "data/source_quota.json"
+    # (запросов, окно в секундах) — бесплатные тарифы провайдеров
+    SOURCE_QUOTAS: dict[str, tuple[int, int]] = field(
+        default_factory=lambda: {
+            "CoinGecko": (10000, 30 * 86400),
+            "ExchangeRate-API": (1500, 30 * 86400),
+        },
+    )
+    QUOTA_SPREAD_FACTOR: float = 0.5
+
+    SOURCE_TTL_SECONDS: dict[str, int] = field(
+        default_factory=lambda: {
+            "CoinGecko": 300,
+            "ExchangeRate-API": 3600,
+        },
+    )
+    DEFAULT_SOURCE_TTL_SECONDS: int = 300
 
+    def __post_init__(self) -> None:
+        if not self.CRYPTO_ID_MAP:
+            self.CRYPTO_ID_MAP = load_crypto_id_map(self.CRYPTO_IDS_FILE)
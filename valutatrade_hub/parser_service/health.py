@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import json
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional
+
+from .config import ParserConfig
+from .storage import _atomic_write
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+@dataclass
+class SourceHealth:
+
+    name: str
+    state: str = CLOSED
+    latency_ewma: Optional[float] = None
+    error_rate: float = 0.0
+    consecutive_failures: int = 0
+    opened_at: Optional[float] = None
+    last_error: str = ""
+
+
+class HealthTracker:
+
+    def __init__(self, config: ParserConfig) -> None:
+        self.config = config
+        self.path = config.HEALTH_FILE_PATH
+        self.sources: Dict[str, SourceHealth] = {}
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        for name, record in data.items():
+            try:
+                self.sources[name] = SourceHealth(**record)
+            except TypeError:
+                continue
+
+    def save(self) -> None:
+        _atomic_write(
+            self.path,
+            {name: asdict(health) for name, health in self.sources.items()},
+        )
+
+    def get(self, name: str) -> SourceHealth:
+        health = self.sources.get(name)
+        if health is None:
+            health = SourceHealth(name=name)
+            self.sources[name] = health
+        return health
+
+    # ---------- решения перед запросом ----------
+
+    def timeout_for(self, name: str) -> float:
+        health = self.get(name)
+        ceiling = float(self.config.REQUEST_TIMEOUT)
+        if health.latency_ewma is None:
+            return ceiling
+        adaptive = health.latency_ewma * self.config.TIMEOUT_LATENCY_FACTOR
+        return min(ceiling, max(self.config.MIN_REQUEST_TIMEOUT, adaptive))
+
+    def allow_request(self, name: str, now: Optional[float] = None) -> bool:
+        health = self.get(name)
+        if health.state != OPEN:
+            return True
+        now = now if now is not None else time.time()
+        if now - (health.opened_at or 0.0) >= self.config.BREAKER_COOLDOWN_SECONDS:
+            # пробный запрос: при успехе размыкатель закроется
+            health.state = HALF_OPEN
+            return True
+        return False
+
+    # ---------- результаты запроса ----------
+
+    def _update_latency(self, health: SourceHealth, latency: float) -> None:
+        alpha = self.config.HEALTH_EWMA_ALPHA
+        if health.latency_ewma is None:
+            health.latency_ewma = latency
+        else:
+            health.latency_ewma = alpha * latency + (1 - alpha) * health.latency_ewma
+
+    def record_success(self, name: str, latency: float) -> None:
+        health = self.get(name)
+        alpha = self.config.HEALTH_EWMA_ALPHA
+        self._update_latency(health, latency)
+        health.error_rate = (1 - alpha) * health.error_rate
+        health.consecutive_failures = 0
+        health.state = CLOSED
+        health.opened_at = None
+        health.last_error = ""
+
+    def record_failure(
+        self,
+        name: str,
+        error: str,
+        latency: Optional[float] = None,
+        now: Optional[float] = None,
+    ) -> None:
+        health = self.get(name)
+        alpha = self.config.HEALTH_EWMA_ALPHA
+        if latency is not None:
+            self._update_latency(health, latency)
+        health.error_rate = alpha + (1 - alpha) * health.error_rate
+        health.consecutive_failures += 1
+        health.last_error = error
+
+        should_open = (
+            health.state == HALF_OPEN
+            or health.consecutive_failures >= self.config.BREAKER_FAILURE_THRESHOLD
+        )
+        if should_open:
+            health.state = OPEN
+            health.opened_at = now if now is not None else time.time()
+
+    def summary(self) -> List[str]:
+        lines = []
+        for name in sorted(self.sources):
+            health = self.sources[name]
+            latency = (
+                f"{health.latency_ewma:.2f}s"
+                if health.latency_ewma is not None
+                else "n/a"
+            )
+            lines.append(
+                f"{name}: {health.state}, latency~{latency}, "
+                f"errors {health.error_rate:.0%}, "
+                f"timeout {self.timeout_for(name):.1f}s",
+            )
+        return lines
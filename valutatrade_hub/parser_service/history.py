@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import json
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from valutatrade_hub.logging_config import get_logger
+
+from .config import ParserConfig
+from .history_reader import iter_history, parse_timestamp
+from .single_flight import rates_update_flight
+from .storage import _atomic_write
+
+# (имя, длительность бара в секундах) от мелкого к крупному
+RESOLUTIONS: Tuple[Tuple[str, int], ...] = (
+    ("1m", 60),
+    ("1h", 3600),
+    ("1d", 86400),
+)
+RESOLUTION_SECONDS = dict(RESOLUTIONS)
+
+# бар: [начало (epoch, с), open, high, low, close, count]
+Bar = List[Any]
+Bars = Dict[str, Dict[str, List[Bar]]]
+# отметка в файле баров: тики старше неё уже свёрнуты в бары
+ROLLED_UNTIL = "rolled_until"
+
+
+def _merge_bar(bars: Dict[int, Bar], bar: Bar) -> None:
+    start = bar[0]
+    current = bars.get(start)
+    if current is None:
+        bars[start] = list(bar)
+        return
+    # бары сливаются в хронологическом порядке: open остаётся, close — новый
+    current[2] = max(current[2], bar[2])
+    current[3] = min(current[3], bar[3])
+    current[4] = bar[4]
+    current[5] += bar[5]
+
+
+def _aggregate(bars: Iterable[Bar], seconds: int) -> Dict[int, Bar]:
+    result: Dict[int, Bar] = {}
+    for bar in sorted(bars, key=lambda item: item[0]):
+        start = int(bar[0]) // seconds * seconds
+        _merge_bar(result, [start, bar[1], bar[2], bar[3], bar[4], bar[5]])
+    return result
+
+
+def _tick_bar(timestamp: float, rate: float) -> Bar:
+    return [timestamp, rate, rate, rate, rate, 1]
+
+
+class RatesHistory:
+
+    def __init__(self, config: ParserConfig) -> None:
+        self.config = config
+        self.history_path = config.HISTORY_FILE_PATH
+        self.bars_path = config.HISTORY_BARS_PATH
+        self.single_flight = rates_update_flight(config)
+
+    def iter_ticks(
+        self,
+        pair: Optional[str] = None,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        return iter_history(self.history_path, pair, start, end)
+
+    def load_bars(self) -> Bars:
+        return self._read_bars()[0]
+
+    def _read_bars(self) -> Tuple[Bars, float]:
+        try:
+            with open(self.bars_path, "r", encoding="utf-8") as file:
+                bars = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            bars = {}
+        rolled_until = float(bars.pop(ROLLED_UNTIL, 0) or 0)
+        for name, _seconds in RESOLUTIONS:
+            bars.setdefault(name, {})
+        return bars, rolled_until
+
+    # ---------- компактация ----------
+
+    def compact(self, now: Optional[float] = None) -> Dict[str, int]:
+        # под арендой обновления курсов: иначе дописанные обновлятелем тики
+        # пропадут при перезаписи exchange_rates.json. Параллельные компактации
+        # получают результат уже идущей
+        return self.single_flight.run(
+            lambda: self._compact(now),
+            key="compact-history",
+        )
+
+    def _compact(self, now: Optional[float]) -> Dict[str, int]:
+        now = now if now is not None else datetime.now(timezone.utc).timestamp()
+        bars, rolled_until = self._read_bars()
+        stats = {"ticks_rolled": 0}
+
+        raw_cutoff = now - self.config.HISTORY_RAW_RETENTION_SECONDS
+        kept: List[Dict[str, Any]] = []
+        # уже свёрнуты прошлой компактацией, упавшей до перезаписи истории
+        already_rolled = 0
+        rolled: Dict[str, List[Bar]] = {}
+        try:
+            for entry in self.iter_ticks():
+                try:
+                    timestamp = parse_timestamp(entry["timestamp"])
+                    pair = f"{entry['from_currency']}_{entry['to_currency']}"
+                    rate = float(entry["rate"])
+                except (KeyError, TypeError, ValueError):
+                    kept.append(entry)
+                    continue
+                if timestamp < rolled_until:
+                    already_rolled += 1
+                    continue
+                if timestamp >= raw_cutoff:
+                    kept.append(entry)
+                    continue
+                rolled.setdefault(pair, []).append(_tick_bar(timestamp, rate))
+                stats["ticks_rolled"] += 1
+        except ValueError as exc:
+            # повреждённую историю не перезаписываем частично прочитанной
+            get_logger().error("History compaction aborted: %s", exc)
+            return {"ticks_rolled": 0}
+
+        finest = RESOLUTIONS[0][0]
+        self._merge_into(bars, finest, rolled)
+
+        for (name, _seconds), (coarser, _coarser_seconds) in zip(
+            RESOLUTIONS,
+            RESOLUTIONS[1:],
+        ):
+            retention = self.config.HISTORY_BAR_RETENTION_SECONDS.get(name)
+            if retention is None:
+                continue
+            cutoff = now - retention
+            moved: Dict[str, List[Bar]] = {}
+            for pair, pair_bars in bars[name].items():
+                old = [bar for bar in pair_bars if bar[0] < cutoff]
+                if old:
+                    moved[pair] = old
+                    bars[name][pair] = [bar for bar in pair_bars if bar[0] >= cutoff]
+            stats[f"{name}_rolled"] = sum(len(items) for items in moved.values())
+            self._merge_into(bars, coarser, moved)
+
+        # сначала бары с отметкой, потом история: после сбоя между записями
+        # тики старше отметки не свернутся второй раз и не попадут в запросы
+        _atomic_write(
+            self.bars_path,
+            {**bars, ROLLED_UNTIL: max(rolled_until, raw_cutoff)},
+        )
+        if stats["ticks_rolled"] or already_rolled:
+            _atomic_write(self.history_path, kept)
+        return stats
+
+    def _merge_into(
+        self,
+        bars: Bars,
+        resolution: str,
+        source: Dict[str, List[Bar]],
+    ) -> None:
+        seconds = RESOLUTION_SECONDS[resolution]
+        for pair, items in source.items():
+            merged = {bar[0]: bar for bar in bars[resolution].get(pair, [])}
+            for bar in _aggregate(items, seconds).values():
+                _merge_bar(merged, bar)
+            bars[resolution][pair] = [merged[key] for key in sorted(merged)]
+
+    # ---------- запросы по диапазону ----------
+
+    def pick_resolution(self, step_seconds: int) -> str:
+        chosen = RESOLUTIONS[0][0]
+        for name, seconds in RESOLUTIONS:
+            if seconds <= step_seconds:
+                chosen = name
+        return chosen
+
+    def query_range(
+        self,
+        pair: str,
+        start: float,
+        end: float,
+        step_seconds: int,
+    ) -> Tuple[str, List[Bar]]:
+        resolution = self.pick_resolution(step_seconds)
+        seconds = RESOLUTION_SECONDS[resolution]
+        pair = pair.upper()
+        bars, rolled_until = self._read_bars()
+
+        as_is: List[Bar] = []
+        finer: List[Bar] = []
+        for name, _seconds in RESOLUTIONS:
+            in_range = [
+                bar
+                for bar in bars[name].get(pair, [])
+                if start <= bar[0] < end
+            ]
+            if RESOLUTION_SECONDS[name] < seconds:
+                finer.extend(in_range)
+            else:
+                # более крупные бары старых данных отдаются как есть
+                as_is.extend(list(bar) for bar in in_range)
+
+        try:
+            for entry in self.iter_ticks(pair, start, end):
+                try:
+                    timestamp = parse_timestamp(entry["timestamp"])
+                    rate = float(entry["rate"])
+                except (KeyError, TypeError, ValueError):
+                    continue
+                if timestamp < rolled_until:
+                    continue
+                finer.append(_tick_bar(timestamp, rate))
+        except ValueError as exc:
+            get_logger().error("Failed to read rates history: %s", exc)
+
+        result: Dict[int, Bar] = {}
+        combined = as_is + list(_aggregate(finer, seconds).values())
+        for bar in sorted(combined, key=lambda item: item[0]):
+            _merge_bar(result, bar)
+        return resolution, [result[key] for key in sorted(result)]
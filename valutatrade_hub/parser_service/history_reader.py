@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import json
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, Optional, TextIO
+
+_DECODER = json.JSONDecoder()
+_WHITESPACE = " \t\r\n"
+
+CHUNK_SIZE = 64 * 1024
+
+
+def parse_timestamp(value: str) -> float:
+    moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+def _iter_json_array(file: TextIO, chunk_size: int) -> Iterator[Any]:
+    buffer = ""
+    pos = 0
+    started = False
+    eof = False
+
+    while True:
+        while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+            pos += 1
+        if pos >= len(buffer):
+            if eof:
+                return
+            buffer = file.read(chunk_size)
+            pos = 0
+            eof = not buffer
+            continue
+
+        char = buffer[pos]
+        if not started:
+            if char != "[":
+                raise ValueError("Ожидался JSON-массив")
+            started = True
+            pos += 1
+            continue
+        if char == "]":
+            return
+        if char == ",":
+            pos += 1
+            continue
+
+        try:
+            item, end = _DECODER.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            # объект не поместился в буфер — дочитываем
+            if eof:
+                raise
+            chunk = file.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+        # число на границе буфера могло быть прочитано не полностью:
+        # за значением обязан следовать разделитель
+        after = end
+        while after < len(buffer) and buffer[after] in _WHITESPACE:
+            after += 1
+        if (after == len(buffer) or buffer[after] not in ",]") and not eof:
+            chunk = file.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+        yield item
+        pos = end
+
+
+def _iter_json_lines(file: TextIO) -> Iterator[Any]:
+    for line in file:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def iter_history(
+    path: str,
+    pair: Optional[str] = None,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> Iterator[Dict[str, Any]]:
+    try:
+        file = open(path, "r", encoding="utf-8")
+    except FileNotFoundError:
+        return
+
+    with file:
+        head = file.read(chunk_size)
+        stripped = head.lstrip(_WHITESPACE)
+        file.seek(0)
+        if not stripped:
+            return
+        if stripped[0] == "[":
+            entries = _iter_json_array(file, chunk_size)
+        else:
+            entries = _iter_json_lines(file)
+
+        wanted_pair = pair.upper() if pair else None
+        for entry in entries:
+            if not isinstance(entry, dict):
+                continue
+            if wanted_pair is not None:
+                entry_pair = f"{entry.get('from_currency')}_{entry.get('to_currency')}"
+                if entry_pair != wanted_pair:
+                    continue
+            if start is not None or end is not None:
+                try:
+                    timestamp = parse_timestamp(entry["timestamp"])
+                except (KeyError, TypeError, ValueError):
+                    continue
+                if start is not None and timestamp < start:
+                    continue
+                if end is not None and timestamp >= end:
+                    continue
+            yield entry
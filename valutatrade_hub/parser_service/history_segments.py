@@ -0,0 +1,301 @@
+from __future__ import annotations
+
+import json
+import lzma
+import os
+import struct
+import sys
+import zlib
+from array import array
+from itertools import accumulate
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from valutatrade_hub.infra.rates_snapshot import iso_to_micros, micros_to_iso
+
+from .history_reader import iter_history
+
+# Сегмент истории:
+#   заголовок | сжатые блоки (по одной паре) | индекс блоков | хвост
+# Блок хранит колонки: дельты времени (int64), битовую маску смены курса,
+# только изменившиеся курсы (float64) и источники в виде RLE.
+MAGIC = b"VTHS"
+FORMAT_VERSION = 1
+FILE_HEADER = struct.Struct("<4sHB1x")
+FOOTER = struct.Struct("<QI4s")
+INDEX_ENTRY = struct.Struct("<16sqqQII")
+# имя пары в индексе — ASCII до 16 байт, дополненное нулями
+PAIR_SIZE = 16
+BLOCK_HEADER = struct.Struct("<III")
+
+CODECS = {"zlib": 0, "lzma": 1}
+_CODEC_NAMES = {value: name for name, value in CODECS.items()}
+
+BLOCK_TICKS = 4096
+
+_LITTLE_ENDIAN = sys.byteorder == "little"
+
+
+def _to_le(values: array) -> bytes:
+    if not _LITTLE_ENDIAN:
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_le(typecode: str, raw: bytes) -> array:
+    values = array(typecode)
+    values.frombytes(raw)
+    if not _LITTLE_ENDIAN:
+        values.byteswap()
+    return values
+
+
+def _compress(codec: int, payload: bytes) -> bytes:
+    if codec == CODECS["lzma"]:
+        return lzma.compress(payload, preset=6)
+    return zlib.compress(payload, 6)
+
+
+def _decompress(codec: int, payload: bytes) -> bytes:
+    if codec == CODECS["lzma"]:
+        return lzma.decompress(payload)
+    return zlib.decompress(payload)
+
+
+def _encode_block(ticks: List[Tuple[int, float, str]]) -> bytes:
+    ticks.sort(key=lambda tick: tick[0])
+    count = len(ticks)
+
+    deltas = array("q")
+    previous = 0
+    for timestamp, _rate, _source in ticks:
+        deltas.append(timestamp - previous)
+        previous = timestamp
+
+    bitmap = bytearray((count + 7) // 8)
+    changed = array("d")
+    last_rate: Optional[float] = None
+    for idx, (_timestamp, rate, _source) in enumerate(ticks):
+        if rate != last_rate:
+            bitmap[idx // 8] |= 1 << (idx % 8)
+            changed.append(rate)
+            last_rate = rate
+
+    runs: List[List[Any]] = []
+    for _timestamp, _rate, source in ticks:
+        if runs and runs[-1][1] == source:
+            runs[-1][0] += 1
+        else:
+            runs.append([1, source])
+    sources = json.dumps(runs, ensure_ascii=False).encode("utf-8")
+
+    return b"".join(
+        (
+            BLOCK_HEADER.pack(count, len(changed), len(sources)),
+            _to_le(deltas),
+            bytes(bitmap),
+            _to_le(changed),
+            sources,
+        ),
+    )
+
+
+def _decode_block(payload: bytes) -> Iterator[Tuple[int, float, str]]:
+    count, n_changed, sources_len = BLOCK_HEADER.unpack_from(payload)
+    pos = BLOCK_HEADER.size
+    timestamps = accumulate(_from_le("q", payload[pos:pos + count * 8]))
+    pos += count * 8
+    bitmap = payload[pos:pos + (count + 7) // 8]
+    pos += len(bitmap)
+    changed = _from_le("d", payload[pos:pos + n_changed * 8])
+    pos += n_changed * 8
+    runs = json.loads(payload[pos:pos + sources_len].decode("utf-8"))
+
+    sources: List[str] = []
+    for run, source in runs:
+        sources.extend([source] * run)
+
+    rate_idx = -1
+    for idx, timestamp in enumerate(timestamps):
+        if bitmap[idx // 8] & (1 << (idx % 8)):
+            rate_idx += 1
+        yield timestamp, changed[rate_idx], sources[idx]
+
+
+class HistorySegmentWriter:
+
+    def __init__(
+        self,
+        path: str,
+        codec: str = "zlib",
+        block_ticks: int = BLOCK_TICKS,
+    ) -> None:
+        if codec not in CODECS:
+            raise ValueError(f"Неизвестный кодек сжатия '{codec}'")
+        self.path = path
+        self.codec = CODECS[codec]
+        self.block_ticks = block_ticks
+        self._pending: Dict[str, List[Tuple[int, float, str]]] = {}
+        self._index: List[Tuple[bytes, int, int, int, int, int]] = []
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._tmp_path = path + ".tmp"
+        self._file = open(self._tmp_path, "wb")
+        self._file.write(FILE_HEADER.pack(MAGIC, FORMAT_VERSION, self.codec))
+
+    @staticmethod
+    def _check_pair(pair: str) -> str:
+        # поле индекса фиксированной длины: длинное имя обрезалось бы
+        # и совпало с другой парой, не-ASCII упало бы уже при записи блока
+        pair = pair.upper()
+        if not pair.isascii() or "\0" in pair or not 0 < len(pair) <= PAIR_SIZE:
+            raise ValueError(
+                f"Имя пары '{pair}' должно быть ASCII длиной до {PAIR_SIZE} символов",
+            )
+        return pair
+
+    def add(self, pair: str, timestamp: int, rate: float, source: str) -> None:
+        pair = self._check_pair(pair)
+        ticks = self._pending.setdefault(pair, [])
+        ticks.append((timestamp, float(rate), source))
+        if len(ticks) >= self.block_ticks:
+            self._flush(pair)
+
+    def add_entry(self, entry: Dict[str, Any]) -> bool:
+        try:
+            pair = self._check_pair(
+                f"{entry['from_currency']}_{entry['to_currency']}",
+            )
+            timestamp = iso_to_micros(entry["timestamp"])
+            rate = float(entry["rate"])
+        except (KeyError, TypeError, ValueError):
+            return False
+        self.add(pair, timestamp, rate, str(entry.get("source", "")))
+        return True
+
+    def _flush(self, pair: str) -> None:
+        ticks = self._pending.pop(pair, [])
+        if not ticks:
+            return
+        payload = _compress(self.codec, _encode_block(ticks))
+        offset = self._file.tell()
+        self._file.write(payload)
+        self._index.append(
+            (
+                pair.encode("ascii").ljust(PAIR_SIZE, b"\0"),
+                ticks[0][0],
+                ticks[-1][0],
+                offset,
+                len(payload),
+                len(ticks),
+            ),
+        )
+
+    def close(self) -> None:
+        for pair in list(self._pending):
+            self._flush(pair)
+        index_offset = self._file.tell()
+        for item in self._index:
+            self._file.write(INDEX_ENTRY.pack(*item))
+        self._file.write(FOOTER.pack(index_offset, len(self._index), MAGIC))
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+
+    def __enter__(self) -> "HistorySegmentWriter":
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+            os.remove(self._tmp_path)
+
+
+class HistorySegmentReader:
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as file:
+            magic, version, codec = FILE_HEADER.unpack(file.read(FILE_HEADER.size))
+            if magic != MAGIC or version != FORMAT_VERSION:
+                raise ValueError("Неизвестный формат сегмента истории")
+            file.seek(-FOOTER.size, os.SEEK_END)
+            index_offset, count, tail = FOOTER.unpack(file.read(FOOTER.size))
+            if tail != MAGIC:
+                raise ValueError("Сегмент истории повреждён")
+            file.seek(index_offset)
+            raw_index = file.read(count * INDEX_ENTRY.size)
+        self.codec = codec
+        self.codec_name = _CODEC_NAMES.get(codec, "zlib")
+        self.blocks = [
+            (pair.rstrip(b"\0").decode("ascii"), t_start, t_end, offset, length, n)
+            for pair, t_start, t_end, offset, length, n in INDEX_ENTRY.iter_unpack(
+                raw_index,
+            )
+        ]
+
+    def iter_ticks(
+        self,
+        pair: Optional[str] = None,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+    ) -> Iterator[Tuple[str, int, float, str]]:
+        wanted = pair.upper() if pair else None
+        start_us = int(start * 1_000_000) if start is not None else None
+        end_us = int(end * 1_000_000) if end is not None else None
+
+        with open(self.path, "rb") as file:
+            for block_pair, t_start, t_end, offset, length, _n in self.blocks:
+                if wanted is not None and block_pair != wanted:
+                    continue
+                if start_us is not None and t_end < start_us:
+                    continue
+                if end_us is not None and t_start >= end_us:
+                    continue
+                file.seek(offset)
+                payload = _decompress(self.codec, file.read(length))
+                for timestamp, rate, source in _decode_block(payload):
+                    if start_us is not None and timestamp < start_us:
+                        continue
+                    if end_us is not None and timestamp >= end_us:
+                        continue
+                    yield block_pair, timestamp, rate, source
+
+    def iter_entries(
+        self,
+        pair: Optional[str] = None,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        for block_pair, timestamp, rate, source in self.iter_ticks(pair, start, end):
+            from_code, to_code = block_pair.split("_", 1)
+            iso = micros_to_iso(timestamp)
+            yield {
+                "id": f"{block_pair}_{iso}",
+                "from_currency": from_code,
+                "to_currency": to_code,
+                "rate": rate,
+                "timestamp": iso,
+                "source": source,
+                "meta": {"source_client": source},
+            }
+
+
+def write_segment(
+    path: str,
+    entries: Iterable[Dict[str, Any]],
+    codec: str = "zlib",
+    block_ticks: int = BLOCK_TICKS,
+) -> int:
+    written = 0
+    with HistorySegmentWriter(path, codec, block_ticks) as writer:
+        for entry in entries:
+            if writer.add_entry(entry):
+                written += 1
+    return written
+
+
+def convert_history(source_path: str, target_path: str, codec: str = "zlib") -> int:
+    return write_segment(target_path, iter_history(source_path), codec)
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+
+from .config import ParserConfig
+
+API_KEY_PLACEHOLDER = "<API_KEY>"
+
+
+class FixtureResponse:
+
+    def __init__(self, status_code: int, text: str) -> None:
+        self.status_code = status_code
+        self.text = text
+
+    def json(self) -> Any:
+        return json.loads(self.text)
+
+
+class LiveTransport:
+
+    def get(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+    ) -> Any:
+        return requests.get(url, params=params, timeout=timeout)
+
+
+class FixtureStore:
+
+    def __init__(self, config: ParserConfig) -> None:
+        self.directory = config.FIXTURES_DIR
+        self.api_key = config.EXCHANGERATE_API_KEY
+
+    def _redact(self, url: str) -> str:
+        if self.api_key:
+            url = url.replace(self.api_key, API_KEY_PLACEHOLDER)
+        return url
+
+    def key(self, url: str, params: Optional[Dict[str, Any]]) -> str:
+        # хост не входит в ключ: фикстуры подходят и для стаб-сервера
+        path = urlsplit(self._redact(url)).path
+        query = "&".join(f"{k}={v}" for k, v in sorted((params or {}).items()))
+        return f"{path}?{query}"
+
+    def path_for(self, key: str) -> str:
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def save(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]],
+        status_code: int,
+        text: str,
+        elapsed: float,
+    ) -> None:
+        key = self.key(url, params)
+        os.makedirs(self.directory, exist_ok=True)
+        record = {
+            "key": key,
+            "url": self._redact(url),
+            "params": params or {},
+            "status_code": status_code,
+            "body": self._redact(text),
+            "elapsed": elapsed,
+            "recorded_at": time.time(),
+        }
+        with open(self.path_for(key), "w", encoding="utf-8") as file:
+            json.dump(record, file, ensure_ascii=False, indent=2)
+
+    def load(self, url: str, params: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        key = self.key(url, params)
+        try:
+            with open(self.path_for(key), "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError) as exc:
+            raise requests.exceptions.ConnectionError(
+                f"нет записанной фикстуры для {key}",
+            ) from exc
+
+
+class RecordingTransport:
+
+    def __init__(self, store: FixtureStore, inner: Optional[LiveTransport] = None):
+        self.store = store
+        self.inner = inner or LiveTransport()
+
+    def get(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+    ) -> Any:
+        started = time.monotonic()
+        response = self.inner.get(url, params=params, timeout=timeout)
+        self.store.save(
+            url,
+            params,
+            response.status_code,
+            response.text,
+            time.monotonic() - started,
+        )
+        return response
+
+
+class ReplayTransport:
+
+    def __init__(self, store: FixtureStore, simulate_latency: bool = False):
+        self.store = store
+        self.simulate_latency = simulate_latency
+
+    def get(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+    ) -> FixtureResponse:
+        record = self.store.load(url, params)
+        if self.simulate_latency:
+            elapsed = float(record.get("elapsed", 0.0))
+            if timeout is not None and elapsed > timeout:
+                time.sleep(timeout)
+                raise requests.exceptions.Timeout("таймаут (воспроизведение)")
+            time.sleep(elapsed)
+        return FixtureResponse(int(record["status_code"]), record["body"])
+
+
+def build_transport(config: ParserConfig) -> Any:
+    mode = config.HTTP_MODE.lower()
+    if mode == "record":
+        return RecordingTransport(FixtureStore(config))
+    if mode == "replay":
+        return ReplayTransport(FixtureStore(config), config.REPLAY_LATENCY)
+    return LiveTransport()
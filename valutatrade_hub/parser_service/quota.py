@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import json
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional
+
+from .config import ParserConfig
+from .storage import _atomic_write
+
+
+@dataclass
+class QuotaState:
+
+    name: str
+    tokens: float
+    updated_at: float
+    last_call_at: Optional[float] = None
+    calls_total: int = 0
+    deferred_total: int = 0
+
+
+class QuotaTracker:
+
+    def __init__(self, config: ParserConfig) -> None:
+        self.config = config
+        self.path = config.QUOTA_FILE_PATH
+        self.states: Dict[str, QuotaState] = {}
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        for name, record in data.items():
+            try:
+                self.states[name] = QuotaState(**record)
+            except TypeError:
+                continue
+
+    def save(self) -> None:
+        _atomic_write(
+            self.path,
+            {name: asdict(state) for name, state in self.states.items()},
+        )
+
+    def limits(self, name: str) -> Optional[tuple[int, int]]:
+        quota = self.config.SOURCE_QUOTAS.get(name)
+        if quota is None:
+            return None
+        return int(quota[0]), int(quota[1])
+
+    def _refill(self, name: str, now: float) -> Optional[QuotaState]:
+        limits = self.limits(name)
+        if limits is None:
+            return None
+        capacity, window = limits
+        state = self.states.get(name)
+        if state is None:
+            state = QuotaState(name=name, tokens=float(capacity), updated_at=now)
+            self.states[name] = state
+        elapsed = max(0.0, now - state.updated_at)
+        state.tokens = min(float(capacity), state.tokens + elapsed * capacity / window)
+        state.updated_at = now
+        return state
+
+    def min_interval(self, name: str) -> float:
+        limits = self.limits(name)
+        if limits is None:
+            return 0.0
+        capacity, window = limits
+        return window / capacity
+
+    def try_acquire(
+        self,
+        name: str,
+        cost: int = 1,
+        now: Optional[float] = None,
+    ) -> bool:
+        now = now if now is not None else time.time()
+        state = self._refill(name, now)
+        if state is None:
+            return True
+
+        # равномерно распределяем запросы по окну квоты
+        spread = self.min_interval(name) * self.config.QUOTA_SPREAD_FACTOR
+        too_soon = (
+            state.last_call_at is not None
+            and now - state.last_call_at < spread * cost
+        )
+        if state.tokens < cost or too_soon:
+            state.deferred_total += 1
+            return False
+
+        state.tokens -= cost
+        state.last_call_at = now
+        state.calls_total += cost
+        return True
+
+    def remaining(self, name: str, now: Optional[float] = None) -> Optional[int]:
+        state = self._refill(name, now if now is not None else time.time())
+        if state is None:
+            return None
+        return int(state.tokens)
+
+    def summary(self) -> List[str]:
+        lines = []
+        for name in sorted(self.config.SOURCE_QUOTAS):
+            capacity, window = self.limits(name) or (0, 0)
+            remaining = self.remaining(name)
+            lines.append(
+                f"{name}: quota {remaining}/{capacity} requests left "
+                f"per {window // 3600}h window",
+            )
+        return lines
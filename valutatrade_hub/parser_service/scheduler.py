@@ -2,12 +2,20 @@
 from __future__ import annotations
 
 import time
+from typing import Optional
 
+from .history import RatesHistory
 from .updater import RatesUpdater
 
 
-def run_periodic(updater: RatesUpdater, interval_seconds: int) -> None:
+def run_periodic(
+    updater: RatesUpdater,
+    interval_seconds: int,
+    history: Optional[RatesHistory] = None,
+) -> None:
     while True:
         updater.run_update()
+        if history is not None:
+            history.compact()
         time.sleep(interval_seconds)
 
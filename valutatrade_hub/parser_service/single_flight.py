@@ -0,0 +1,263 @@
+from __future__ import annotations
+
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, Optional
+
+from valutatrade_hub.core.exceptions import ApiRequestError
+from valutatrade_hub.logging_config import get_logger
+
+from .config import ParserConfig
+from .storage import _atomic_write
+
+
+@dataclass
+class Lease:
+
+    token: str
+    owner: str
+    started_at: float
+    heartbeat_at: float
+    # что именно обновляется: результат чужого ключа ожидающему не подходит
+    key: str = ""
+
+
+# Одно обновление курсов на все процессы: остальные ждут его результат.
+# Лидер держит lock-файл с арендой и продлевает её из фонового потока;
+# аренду, которую давно не продлевали, забирает первый заметивший её
+# ожидающий (владелец, скорее всего, упал).
+class SingleFlight:
+
+    def __init__(
+        self,
+        lock_path: str,
+        result_path: str,
+        lease_seconds: float = 30.0,
+        heartbeat_seconds: float = 5.0,
+        poll_seconds: float = 0.2,
+    ) -> None:
+        self.lock_path = lock_path
+        self.result_path = result_path
+        self.lease_seconds = lease_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.poll_seconds = poll_seconds
+        self.logger = get_logger()
+
+    # ---------- аренда ----------
+
+    def _new_lease(self, key: str) -> Lease:
+        now = time.time()
+        return Lease(
+            token=uuid.uuid4().hex,
+            owner=f"{socket.gethostname()}:{os.getpid()}",
+            started_at=now,
+            heartbeat_at=now,
+            key=key,
+        )
+
+    def read_lease(self) -> Optional[Lease]:
+        try:
+            with open(self.lock_path, "r", encoding="utf-8") as file:
+                return Lease(**json.load(file))
+        except (FileNotFoundError, json.JSONDecodeError, TypeError):
+            return None
+
+    def _replace_lease(self, lease: Lease) -> None:
+        # у каждого владельца свой временный файл: записи не пересекаются
+        tmp_path = f"{self.lock_path}.{lease.token}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(asdict(lease), file)
+        os.replace(tmp_path, self.lock_path)
+
+    def _try_create(self, key: str) -> Optional[Lease]:
+        lease = self._new_lease(key)
+        directory = os.path.dirname(self.lock_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        try:
+            fd = os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return None
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            json.dump(asdict(lease), file)
+        return lease
+
+    def is_expired(self, lease: Lease, now: Optional[float] = None) -> bool:
+        now = time.time() if now is None else now
+        return now - lease.heartbeat_at > self.lease_seconds
+
+    def _try_steal(self, expired: Lease, key: str) -> Optional[Lease]:
+        # маркер создаётся атомарно: забрать конкретную аренду может только один
+        marker = f"{self.lock_path}.steal-{expired.token}"
+        try:
+            fd = os.open(marker, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(marker) > self.lease_seconds:
+                    # забиравший сам упал посреди перехвата
+                    os.remove(marker)
+            except FileNotFoundError:
+                pass
+            return None
+        os.close(fd)
+        try:
+            current = self.read_lease()
+            if current is None or current.token != expired.token:
+                return None
+            lease = self._new_lease(key)
+            self._replace_lease(lease)
+            self.logger.warning(
+                "Rates update lease of %s expired, taking over",
+                expired.owner,
+            )
+            return lease
+        finally:
+            os.remove(marker)
+
+    def _remove_broken(self) -> None:
+        # пустой или битый lock-файл: владелец упал между созданием файла
+        # и записью аренды. Свежий файл может ещё дописываться — ждём,
+        # старше срока аренды — удаляем (под тем же маркером, что и перехват)
+        try:
+            age = time.time() - os.path.getmtime(self.lock_path)
+        except FileNotFoundError:
+            return
+        if age <= self.lease_seconds:
+            return
+        marker = f"{self.lock_path}.steal-broken"
+        try:
+            fd = os.open(marker, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(marker) > self.lease_seconds:
+                    os.remove(marker)
+            except FileNotFoundError:
+                pass
+            return
+        os.close(fd)
+        try:
+            if self.read_lease() is not None:
+                return
+            try:
+                if time.time() - os.path.getmtime(self.lock_path) > self.lease_seconds:
+                    os.remove(self.lock_path)
+                    self.logger.warning("Removed broken rates update lock file")
+            except FileNotFoundError:
+                pass
+        finally:
+            os.remove(marker)
+
+    def _release(self, lease: Lease) -> None:
+        current = self.read_lease()
+        if current is not None and current.token == lease.token:
+            os.remove(self.lock_path)
+
+    def _heartbeat(self, lease: Lease, stop: threading.Event) -> None:
+        while not stop.wait(self.heartbeat_seconds):
+            current = self.read_lease()
+            if current is None or current.token != lease.token:
+                self.logger.warning("Rates update lease was lost")
+                return
+            lease.heartbeat_at = time.time()
+            self._replace_lease(lease)
+
+    # ---------- результат ----------
+
+    def _write_result(self, lease: Lease, record: Dict[str, Any]) -> None:
+        record.update({"token": lease.token, "finished_at": time.time()})
+        _atomic_write(self.result_path, record)
+
+    def _read_result(self, token: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.result_path, "r", encoding="utf-8") as file:
+                record = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if not isinstance(record, dict) or record.get("token") != token:
+            return None
+        return record
+
+    def _lead(self, lease: Lease, func: Callable[[], Any]) -> Any:
+        stop = threading.Event()
+        heartbeat = threading.Thread(
+            target=self._heartbeat,
+            args=(lease, stop),
+            name="rates-update-lease",
+            daemon=True,
+        )
+        heartbeat.start()
+        try:
+            try:
+                result = func()
+            except Exception as exc:
+                reason = exc.reason if isinstance(exc, ApiRequestError) else str(exc)
+                self._write_result(lease, {"ok": False, "error": reason})
+                raise
+            self._write_result(lease, {"ok": True, "result": result})
+            return result
+        finally:
+            stop.set()
+            heartbeat.join()
+            self._release(lease)
+
+    def run(self, func: Callable[[], Any], key: str = "") -> Any:
+        announced: Optional[str] = None
+        while True:
+            lease = self._try_create(key)
+            if lease is not None:
+                return self._lead(lease, func)
+
+            current = self.read_lease()
+            if current is None:
+                # лидер только что закончил, ещё пишет lock-файл или упал,
+                # не дописав его
+                self._remove_broken()
+                time.sleep(self.poll_seconds)
+                continue
+            if self.is_expired(current):
+                lease = self._try_steal(current, key)
+                if lease is not None:
+                    return self._lead(lease, func)
+                time.sleep(self.poll_seconds)
+                continue
+
+            if announced != current.token:
+                announced = current.token
+                self.logger.info(
+                    "Rates update already running (%s), waiting for it",
+                    current.owner,
+                )
+            shared = self._wait(current)
+            if current.key != key:
+                # идёт обновление другого набора источников: дождались его
+                # конца и пробуем снова сами
+                continue
+            if shared is not None:
+                if not shared.get("ok"):
+                    raise ApiRequestError(shared.get("error", "обновление не удалось"))
+                return shared.get("result")
+
+    def _wait(self, lease: Lease) -> Optional[Dict[str, Any]]:
+        while True:
+            time.sleep(self.poll_seconds)
+            current = self.read_lease()
+            if current is None or current.token != lease.token:
+                return self._read_result(lease.token)
+            if self.is_expired(current):
+                return None
+
+
+def rates_update_flight(config: ParserConfig) -> SingleFlight:
+    # общая аренда для всего, что переписывает файлы курсов и истории
+    return SingleFlight(
+        config.UPDATE_LOCK_PATH,
+        config.UPDATE_RESULT_PATH,
+        config.UPDATE_LEASE_SECONDS,
+        config.UPDATE_HEARTBEAT_SECONDS,
+        config.UPDATE_POLL_SECONDS,
+    )
@@ -4,16 +4,25 @@ from __future__ import annotations
 import json
 import os
 from datetime import datetime, timezone
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
+
+from valutatrade_hub.infra.codecs import get_codec, load_file
+from valutatrade_hub.infra.rates_shm import publish_rates_snapshot, segment_name_for
+from valutatrade_hub.infra.rates_snapshot import (
+    encode_rates_snapshot,
+    fits_snapshot,
+    write_snapshot_payload,
+)
+from valutatrade_hub.logging_config import get_logger
 
 from .config import ParserConfig
 
 
-def _atomic_write(path: str, data: Any) -> None:
+def _atomic_write(path: str, data: Any, codec: str = "json") -> None:
     os.makedirs(os.path.dirname(path), exist_ok=True)
     tmp_path = path + ".tmp"
-    with open(tmp_path, "w", encoding="utf-8") as file:
-        json.dump(data, file, ensure_ascii=False, indent=2)
+    with open(tmp_path, "wb") as file:
+        file.write(get_codec(codec).encode(data))
     os.replace(tmp_path, path)
 
 
@@ -21,16 +30,17 @@ class RatesStorage:
 
     def __init__(self, config: ParserConfig) -> None:
         self.rates_path = config.RATES_FILE_PATH
+        self.binary_path = config.RATES_BINARY_PATH
         self.history_path = config.HISTORY_FILE_PATH
+        self.codec = config.STATE_CODEC
+        self.shm_name = (
+            segment_name_for(self.binary_path) if config.RATES_SHM_ENABLED else ""
+        )
 
     # ---------- snapshot (rates.json) ----------
 
     def load_snapshot(self) -> Dict[str, Any]:
-        try:
-            with open(self.rates_path, "r", encoding="utf-8") as file:
-                return json.load(file)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {}
+        return load_file(self.rates_path, {})
 
     def save_snapshot(
         self,
@@ -38,17 +48,57 @@ class RatesStorage:
         sources: Dict[str, str],
     ) -> str:
         now = datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
-        data: Dict[str, Any] = {"pairs": {}, "last_refresh": now}
+        existing = self.load_snapshot().get("pairs", {})
+        # код пары проверяется до записи: rates.json и rates.bin
+        # содержат одни и те же пары
+        data: Dict[str, Any] = {
+            "pairs": {
+                pair: info for pair, info in existing.items() if fits_snapshot(pair)
+            },
+            "last_refresh": now,
+        }
         for pair, rate in pairs_rates.items():
+            if not fits_snapshot(pair):
+                get_logger().warning("Rate %s skipped: pair code is too long", pair)
+                continue
             src = sources.get(pair, "ParserService")
             data["pairs"][pair] = {
                 "rate": rate,
                 "updated_at": now,
                 "source": src,
             }
-        _atomic_write(self.rates_path, data)
+        _atomic_write(self.rates_path, data, self.codec)
+        payload = encode_rates_snapshot(
+            {
+                pair: (float(info["rate"]), info.get("updated_at", ""))
+                for pair, info in data["pairs"].items()
+            },
+            now,
+        )
+        write_snapshot_payload(self.binary_path, payload)
+        if self.shm_name:
+            try:
+                publish_rates_snapshot(self.shm_name, payload)
+            except OSError:
+                # общая память — только ускорение, файл уже записан
+                pass
         return now
 
+    def source_updated_at(self, source: str) -> Optional[datetime]:
+        oldest: Optional[datetime] = None
+        for info in self.load_snapshot().get("pairs", {}).values():
+            if info.get("source") != source:
+                continue
+            try:
+                updated = datetime.fromisoformat(
+                    info.get("updated_at", "").replace("Z", "+00:00"),
+                )
+            except ValueError:
+                return None
+            if oldest is None or updated < oldest:
+                oldest = updated
+        return oldest
+
 
     def append_history(
         self,
@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+import requests
+
+from .config import ParserConfig
+from .http_fixtures import API_KEY_PLACEHOLDER, FixtureStore
+
+SYNTHETIC_FIAT = {"EUR": 0.92, "GBP": 0.79, "RUB": 92.5, "JPY": 151.3, "CNY": 7.2}
+
+
+@dataclass
+class StubOptions:
+
+    latency: float = 0.0
+    latency_jitter: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = 500
+    payload_padding: int = 0
+    fixtures_dir: Optional[str] = None
+
+
+def _synthetic_price(coin_id: str) -> float:
+    seed = sum(ord(char) for char in coin_id)
+    return round(10 + (seed * 7919) % 100000 * random.uniform(0.99, 1.01), 4)
+
+
+class StubRatesServer:
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        options: Optional[StubOptions] = None,
+    ) -> None:
+        self.options = options or StubOptions()
+        self.requests_served = 0
+        self._lock = threading.Lock()
+        self._fixtures: Optional[FixtureStore] = None
+        if self.options.fixtures_dir:
+            config = ParserConfig(FIXTURES_DIR=self.options.fixtures_dir)
+            self._fixtures = FixtureStore(config)
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def configure(self, config: ParserConfig) -> ParserConfig:
+        config.COINGECKO_URL = f"{self.base_url}/api/v3/simple/price"
+        config.EXCHANGERATE_API_URL = f"{self.base_url}/v6"
+        if not config.EXCHANGERATE_API_KEY:
+            config.EXCHANGERATE_API_KEY = "stub-key"
+        return config
+
+    def start(self) -> "StubRatesServer":
+        self._thread = threading.Thread(
+            target=self._httpd.serve_forever,
+            name="stub-rates-server",
+            daemon=True,
+        )
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        self._httpd.serve_forever()
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "StubRatesServer":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+    # ---------- ответы ----------
+
+    def respond(self, raw_path: str) -> Tuple[int, Dict[str, Any]]:
+        with self._lock:
+            self.requests_served += 1
+
+        options = self.options
+        delay = options.latency + random.uniform(0, options.latency_jitter)
+        if delay > 0:
+            time.sleep(delay)
+        if options.error_rate and random.random() < options.error_rate:
+            return options.error_status, {"error": "stub failure"}
+
+        parts = urlsplit(raw_path)
+        params = dict(parse_qsl(parts.query))
+
+        segments = [segment for segment in parts.path.split("/") if segment]
+        if self._fixtures is not None:
+            lookup = list(segments)
+            if len(lookup) >= 3 and lookup[-2] == "latest":
+                lookup[-3] = API_KEY_PLACEHOLDER
+            try:
+                record = self._fixtures.load("/" + "/".join(lookup), params)
+            except requests.exceptions.RequestException:
+                record = None
+            if record is not None:
+                return int(record["status_code"]), json.loads(record["body"])
+
+        if parts.path.endswith("/simple/price"):
+            vs_currency = params.get("vs_currencies", "usd")
+            ids = [coin for coin in params.get("ids", "").split(",") if coin]
+            body: Dict[str, Any] = {
+                coin: {vs_currency: _synthetic_price(coin)} for coin in ids
+            }
+        elif len(segments) >= 2 and segments[-2] == "latest":
+            rates = dict(SYNTHETIC_FIAT)
+            rates[segments[-1].upper()] = 1.0
+            body = {
+                "result": "success",
+                "base_code": segments[-1].upper(),
+                "conversion_rates": rates,
+            }
+        else:
+            return 404, {"error": "not found"}
+
+        if options.payload_padding:
+            body["_padding"] = "x" * options.payload_padding
+        return 200, body
+
+    def _make_handler(self) -> type:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:  # noqa: N802
+                status, body = server.respond(self.path)
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+                return
+
+        return Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Локальный стаб API курсов")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--payload-padding", type=int, default=0)
+    parser.add_argument("--fixtures", default=None)
+    args = parser.parse_args()
+
+    options = StubOptions(
+        latency=args.latency,
+        latency_jitter=args.jitter,
+        error_rate=args.error_rate,
+        payload_padding=args.payload_padding,
+        fixtures_dir=args.fixtures,
+    )
+    server = StubRatesServer(args.host, args.port, options)
+    print(f"Стаб API курсов: {server.base_url}")
+    print(f"  COINGECKO_URL={server.base_url}/api/v3/simple/price")
+    print(f"  EXCHANGERATE_API_URL={server.base_url}/v6")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,17 @@
 from __future__ import annotations
 
-from typing import Dict, Iterable, Tuple
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Tuple
 
 from valutatrade_hub.core.exceptions import ApiRequestError
 from valutatrade_hub.logging_config import get_logger
 
-from .api_clients import BaseApiClient
+from .api_clients import BaseApiClient, CoinGeckoClient, ExchangeRateApiClient
+from .config import ParserConfig
+from .health import HealthTracker
+from .quota import QuotaTracker
+from .single_flight import rates_update_flight
 from .storage import RatesStorage
 
 
@@ -14,41 +20,125 @@ class RatesUpdater:
         self,
         clients: Iterable[BaseApiClient],
         storage: RatesStorage,
+        config: ParserConfig | None = None,
     ) -> None:
         self.clients = list(clients)
         self.storage = storage
+        self.config = config or ParserConfig()
+        self.health = HealthTracker(self.config)
+        self.quota = QuotaTracker(self.config)
+        self.single_flight = rates_update_flight(self.config)
         self.logger = get_logger()
 
-    def run_update(self) -> Tuple[str, int, str]:
+    def health_report(self) -> List[str]:
+        return self.health.summary() + self.quota.summary()
+
+    def is_fresh(self, client: BaseApiClient) -> bool:
+        updated_at = self.storage.source_updated_at(client.name)
+        if updated_at is None:
+            return False
+        ttl = self.config.SOURCE_TTL_SECONDS.get(
+            client.name,
+            self.config.DEFAULT_SOURCE_TTL_SECONDS,
+        )
+        age = (datetime.now(timezone.utc) - updated_at).total_seconds()
+        return age < ttl
+
+    def run_update(self, force: bool = False) -> Tuple[str, int, str]:
+        # параллельные вызовы из других процессов получают результат
+        # уже идущего обновления вместо собственных запросов к API
+        # ключ — источники и force: ожидающий получает только результат
+        # такого же обновления
+        sources = ",".join(sorted(client.name for client in self.clients))
+        message, total, last_refresh = self.single_flight.run(
+            lambda: self._run_update(force),
+            key=f"{sources}:{'force' if force else 'stale'}",
+        )
+        return message, total, last_refresh
+
+    def _run_update(self, force: bool) -> Tuple[str, int, str]:
         self.logger.info("Starting rates update...")
 
         all_pairs: Dict[str, float] = {}
         sources: Dict[str, str] = {}
         errors: Dict[str, str] = {}
+        deferred: List[str] = []
 
+        stale_clients = [
+            client
+            for client in self.clients
+            if force or not self.is_fresh(client)
+        ]
         for client in self.clients:
-            self.logger.info("Fetching from %s...", client.name)
+            if client not in stale_clients:
+                self.logger.info("Skipping %s: rates are fresh", client.name)
+
+        if not stale_clients:
+            last_refresh = self.storage.load_snapshot().get("last_refresh", "")
+            return "Rates are fresh, nothing to update.", 0, last_refresh
+
+        for client in stale_clients:
+            if not self.health.allow_request(client.name):
+                self.logger.warning(
+                    "Skipping %s: circuit breaker is open",
+                    client.name,
+                )
+                errors[client.name] = "circuit breaker is open"
+                continue
+            if not self.quota.try_acquire(client.name, client.request_cost()):
+                self.logger.warning(
+                    "Deferring %s: request quota would be exceeded",
+                    client.name,
+                )
+                deferred.append(client.name)
+                continue
+
+            client.timeout = self.health.timeout_for(client.name)
+            self.logger.info(
+                "Fetching from %s (timeout %.1fs)...",
+                client.name,
+                client.timeout,
+            )
+            started = time.monotonic()
             try:
                 rates = client.fetch_rates()
+                self.health.record_success(client.name, time.monotonic() - started)
                 self.logger.info(
                     "Fetching from %s... OK (%d rates)",
                     client.name,
                     len(rates),
                 )
+                for chunk_error in client.chunk_errors:
+                    self.logger.warning(
+                        "Partial failure from %s: %s",
+                        client.name,
+                        chunk_error,
+                    )
                 for pair, rate in rates.items():
                     all_pairs[pair] = rate
                     sources[pair] = client.name
             except ApiRequestError as exc:
                 msg = str(exc)
                 errors[client.name] = msg
+                self.health.record_failure(
+                    client.name,
+                    msg,
+                    latency=time.monotonic() - started,
+                )
                 self.logger.error(
                     "Failed to fetch from %s: %s",
                     client.name,
                     msg,
                 )
 
+        self.health.save()
+        self.quota.save()
+
         if not all_pairs and errors:
             raise ApiRequestError("Не удалось получить курсы ни от одного источника.")
+        if not all_pairs:
+            last_refresh = self.storage.load_snapshot().get("last_refresh", "")
+            return "Update deferred to stay within request quotas.", 0, last_refresh
 
         last_refresh = self.storage.save_snapshot(all_pairs, sources)
 
@@ -69,6 +159,8 @@ class RatesUpdater:
             )
         else:
             message = "Update successful."
+        if deferred:
+            message += f" Deferred by quota: {', '.join(deferred)}."
 
         self.logger.info(
             "Rates update finished: %d pairs, last_refresh=%s",
@@ -77,3 +169,8 @@ class RatesUpdater:
         )
         return message, total, last_refresh
 
+
+def build_default_updater(config: ParserConfig | None = None) -> RatesUpdater:
+    config = config or ParserConfig()
+    clients = [CoinGeckoClient(config), ExchangeRateApiClient(config)]
+    return RatesUpdater(clients, RatesStorage(config), config)
@@ -0,0 +1,334 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+from valutatrade_hub.core.exceptions import (
+    ApiRequestError,
+    CurrencyNotFoundError,
+    InsufficientFundsError,
+)
+from valutatrade_hub.core.models import User
+from valutatrade_hub.core.usecases import (
+    buy_currency,
+    get_rate_pair,
+    login_user,
+    register_user,
+    sell_currency,
+    show_portfolio,
+)
+from valutatrade_hub.logging_config import get_logger
+
+MAX_BODY_BYTES = 64 * 1024
+PERSISTENCE_WORKERS = 4
+
+_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    401: "Unauthorized",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+Response = Tuple[int, Dict[str, Any]]
+
+
+class HttpError(Exception):
+
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+class Request:
+
+    __slots__ = ("method", "path", "query", "headers", "body")
+
+    def __init__(
+        self,
+        method: str,
+        target: str,
+        headers: Dict[str, str],
+        body: bytes,
+    ) -> None:
+        parts = urlsplit(target)
+        self.method = method
+        self.path = parts.path
+        self.query = dict(parse_qsl(parts.query))
+        self.headers = headers
+        self.body = body
+
+    def json(self) -> Dict[str, Any]:
+        if not self.body:
+            return {}
+        try:
+            data = json.loads(self.body)
+        except (UnicodeDecodeError, json.JSONDecodeError) as exc:
+            raise HttpError(400, "Тело запроса должно быть JSON-объектом") from exc
+        if not isinstance(data, dict):
+            raise HttpError(400, "Тело запроса должно быть JSON-объектом")
+        return data
+
+    @property
+    def keep_alive(self) -> bool:
+        return self.headers.get("connection", "").lower() != "close"
+
+
+async def read_request(reader: asyncio.StreamReader) -> Optional[Request]:
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError:
+        return None
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, _version = lines[0].split(" ", 2)
+    except ValueError as exc:
+        raise HttpError(400, "Некорректная строка запроса") from exc
+
+    headers: Dict[str, str] = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get("content-length", "0"))
+    except ValueError as exc:
+        raise HttpError(400, "Некорректный Content-Length") from exc
+    if length < 0:
+        raise HttpError(400, "Некорректный Content-Length")
+    if length > MAX_BODY_BYTES:
+        raise HttpError(413, "Слишком большое тело запроса")
+    body = await reader.readexactly(length) if length else b""
+    return Request(method.upper(), target, headers, body)
+
+
+def encode_response(status: int, payload: Dict[str, Any], keep_alive: bool) -> bytes:
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    head = (
+        f"HTTP/1.1 {status} {_REASONS.get(status, 'OK')}\r\n"
+        "Content-Type: application/json; charset=utf-8\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+        "\r\n"
+    )
+    return head.encode("latin-1") + body
+
+
+class TradeServer:
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8080,
+        workers: int = PERSISTENCE_WORKERS,
+    ) -> None:
+        self.host = host
+        self.port = port
+        # use cases читают и пишут JSON-файлы: выполняем их вне цикла событий
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers,
+            thread_name_prefix="persistence",
+        )
+        self.sessions: Dict[str, User] = {}
+        self.requests_served = 0
+        self.logger = get_logger()
+        self._server: Optional[asyncio.base_events.Server] = None
+        self._routes: Dict[Tuple[str, str], Callable[[Request], Any]] = {
+            ("POST", "/register"): self.handle_register,
+            ("POST", "/login"): self.handle_login,
+            ("POST", "/logout"): self.handle_logout,
+            ("POST", "/buy"): self.handle_buy,
+            ("POST", "/sell"): self.handle_sell,
+            ("GET", "/portfolio"): self.handle_portfolio,
+            ("GET", "/rate"): self.handle_rate,
+        }
+
+    async def _offload(self, func: Callable[..., Any], *args: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(func, *args))
+
+    # ---------- обработчики ----------
+
+    def _current_user(self, request: Request) -> User:
+        auth = request.headers.get("authorization", "")
+        token = auth[7:] if auth.lower().startswith("bearer ") else ""
+        user = self.sessions.get(token)
+        if user is None:
+            raise HttpError(401, "Сначала выполните login.")
+        return user
+
+    @staticmethod
+    def _required(data: Dict[str, Any], *names: str) -> Tuple[Any, ...]:
+        missing = [name for name in names if data.get(name) in (None, "")]
+        if missing:
+            raise HttpError(400, f"Укажите поля: {', '.join(missing)}")
+        return tuple(data[name] for name in names)
+
+    @staticmethod
+    def _amount(value: Any) -> float:
+        try:
+            return float(value)
+        except (TypeError, ValueError) as exc:
+            raise HttpError(400, "'amount' должен быть числом.") from exc
+
+    async def handle_register(self, request: Request) -> Response:
+        username, password = self._required(request.json(), "username", "password")
+        message = await self._offload(register_user, str(username), str(password))
+        return 200, {"message": message}
+
+    async def handle_login(self, request: Request) -> Response:
+        username, password = self._required(request.json(), "username", "password")
+        user, message = await self._offload(login_user, str(username), str(password))
+        if user is None:
+            return 401, {"error": message}
+        token = secrets.token_urlsafe(24)
+        self.sessions[token] = user
+        return 200, {"message": message, "token": token, "user_id": user.user_id}
+
+    async def handle_logout(self, request: Request) -> Response:
+        self._current_user(request)
+        token = request.headers["authorization"][7:]
+        self.sessions.pop(token, None)
+        return 200, {"message": "Сессия завершена"}
+
+    async def _trade(self, request: Request, usecase: Callable[..., str]) -> Response:
+        user = self._current_user(request)
+        currency, amount = self._required(request.json(), "currency", "amount")
+        message = await self._offload(
+            usecase,
+            user,
+            str(currency).upper(),
+            self._amount(amount),
+        )
+        return 200, {"message": message}
+
+    async def handle_buy(self, request: Request) -> Response:
+        return await self._trade(request, buy_currency)
+
+    async def handle_sell(self, request: Request) -> Response:
+        return await self._trade(request, sell_currency)
+
+    async def handle_portfolio(self, request: Request) -> Response:
+        user = self._current_user(request)
+        base = request.query.get("base", "USD").upper()
+        message = await self._offload(show_portfolio, user, base)
+        return 200, {"message": message}
+
+    async def handle_rate(self, request: Request) -> Response:
+        from_code, to_code = self._required(request.query, "from", "to")
+        # обычно это снимок в памяти, но раз в RATES_CACHE_TTL_SECONDS rate_cache
+        # перечитывает rates.bin/общую память — это тоже не для цикла событий
+        rate, message = await self._offload(get_rate_pair, str(from_code), str(to_code))
+        if rate is None:
+            return 404, {"error": message}
+        return 200, {"rate": rate, "message": message}
+
+    # ---------- транспорт ----------
+
+    async def dispatch(self, request: Request) -> Response:
+        handler = self._routes.get((request.method, request.path))
+        if handler is None:
+            if any(path == request.path for _method, path in self._routes):
+                return 405, {"error": "Метод не поддерживается"}
+            return 404, {"error": f"Неизвестный путь '{request.path}'"}
+        try:
+            return await handler(request)
+        except HttpError as exc:
+            return exc.status, {"error": str(exc)}
+        except (InsufficientFundsError, CurrencyNotFoundError, ValueError) as exc:
+            return 400, {"error": str(exc)}
+        except ApiRequestError as exc:
+            return 503, {"error": str(exc)}
+        except Exception as exc:  # noqa: BLE001
+            self.logger.error("Server error on %s: %s", request.path, exc)
+            return 500, {"error": "Внутренняя ошибка сервера"}
+
+    async def handle_connection(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ) -> None:
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except HttpError as exc:
+                    payload = {"error": str(exc)}
+                    writer.write(encode_response(exc.status, payload, False))
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+                status, payload = await self.dispatch(request)
+                self.requests_served += 1
+                writer.write(encode_response(status, payload, request.keep_alive))
+                await writer.drain()
+                if not request.keep_alive:
+                    break
+        except (ConnectionError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(
+            self.handle_connection,
+            self.host,
+            self.port,
+        )
+        sockname = self._server.sockets[0].getsockname()
+        self.port = sockname[1]
+
+    async def serve_forever(self) -> None:
+        if self._server is None:
+            await self.start()
+        assert self._server is not None
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        self.executor.shutdown(wait=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="JSON API валютного кошелька")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=PERSISTENCE_WORKERS)
+    args = parser.parse_args()
+
+    server = TradeServer(args.host, args.port, args.workers)
+
+    async def run() -> None:
+        await server.start()
+        print(f"API сервер слушает http://{server.host}:{server.port}")
+        try:
+            await server.serve_forever()
+        finally:
+            await server.stop()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        print("\nСервер остановлен.")
+
+
+if __name__ == "__main__":
+    main()